@@ -0,0 +1,50 @@
+from openpyxl import Workbook
+
+from tools.price_stats import get_price_matrix
+
+
+def make_side_by_side_sheet(rows):
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = "Combined Pricing"
+    for row in rows:
+        sheet.append(row)
+    return sheet
+
+
+def test_price_matrix_reads_the_supplier_headers_of_row_1():
+    # side_by_side_combine writes the field headers in row 1 as "<supplier>  <header>"
+    sheet = make_side_by_side_sheet(
+        [
+            [
+                "Item",
+                "Acme  Qty",
+                "Acme  Unit Price",
+                "Globex  Qty",
+                "Globex  Unit Price",
+            ],
+            ["Widget", 10, 5.0, 10, 6.0],
+            ["Gadget", 20, 7.0, 20, 8.0],
+        ]
+    )
+
+    fields = get_price_matrix(sheet, ["Acme", "Globex"])
+
+    assert [field["field"] for field in fields] == ["Unit Price"]
+    assert fields[0]["items"] == ["Widget", "Gadget"]
+    assert fields[0]["prices"].tolist() == [[5.0, 6.0], [7.0, 8.0]]
+
+
+def test_price_matrix_reads_the_headers_above_the_line_items():
+    sheet = make_side_by_side_sheet(
+        [
+            ["Item", "Acme", "Acme", "Globex", "Globex"],
+            [None, "Quantity", "Total Cost", "Quantity", "Total Cost"],
+            ["Widget", 10, 50.0, 10, 60.0],
+        ]
+    )
+
+    fields = get_price_matrix(sheet, ["Acme", "Globex"])
+
+    assert [field["field"] for field in fields] == ["Total Cost"]
+    assert fields[0]["prices"].tolist() == [[50.0, 60.0]]
@@ -0,0 +1,349 @@
+import re
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from openpyxl.cell.rich_text import CellRichText
+from openpyxl.styles import Font, PatternFill
+
+from tools.cell_text import get_cell_text
+from tools.consolidation import get_side_by_side_columns, get_unique_sheet_title
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+# Two answers at least this similar are near duplicates (copied boilerplate)
+DUPLICATE_THRESHOLD = 0.9
+# Shorter answers ("Yes", "N/A") are expected to be identical and are not flagged
+MIN_ANSWER_TOKENS = 5
+# An answer is divergent when its average similarity to the other answers is below
+# DIVERGENT_THRESHOLD while the answers of the question mostly agree (their median
+# average similarity is at least CONSENSUS_THRESHOLD)
+DIVERGENT_THRESHOLD = 0.1
+CONSENSUS_THRESHOLD = 0.3
+MIN_DIVERGENT_ANSWERS = 3
+
+HEADER_FILL = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
+HEADER_FONT = Font(b=True, color="FFFFFF")
+DUPLICATE_FILL = PatternFill(
+    start_color="FFEB9C", end_color="FFEB9C", fill_type="solid"
+)
+DIVERGENT_FILL = PatternFill(
+    start_color="FFC7CE", end_color="FFC7CE", fill_type="solid"
+)
+
+
+def get_answers(sheet, supplier_names, skip_rows=None, max_row=None):
+    """
+    Read the supplier answers of a side-by-side combined questionnaire sheet.
+
+    The k-th column of each supplier holds the same answer field (see
+    ``get_side_by_side_columns``). A question is a row and field with a text answer
+    from at least two suppliers.
+
+    Args:
+        sheet (openpyxl.Worksheet): The combined sheet.
+        supplier_names (list): The supplier names.
+        skip_rows (list): The header rows of the template, left out of the questions.
+        max_row (int): The last row of the questions, the rows below (such as the
+            summaries) are left out. None for all rows.
+
+    Returns:
+        tuple: A list of questions (dictionaries with the keys row, question and field)
+            and a list of answers (tuples of the question index, the supplier index and
+            the answer text).
+    """
+    rows = list(sheet.iter_rows(values_only=True))
+    if not rows:
+        return [], []
+    supplier_cols, label_cols = get_side_by_side_columns(rows[0], supplier_names)
+    skip_rows = {1} | set(skip_rows or ())
+    n_fields = max((len(cols) for cols in supplier_cols.values()), default=0)
+    questions = []
+    answers = []
+    for field_idx in range(n_fields):
+        columns = [
+            cols[field_idx] if field_idx < len(cols) else None
+            for cols in supplier_cols.values()
+        ]
+        first_col = next(col for col in columns if col is not None)
+        field = next(
+            (
+                get_cell_text(rows[row - 1][first_col])
+                for row in sorted(skip_rows - {1})
+                if row <= len(rows)
+                and isinstance(rows[row - 1][first_col], (str, CellRichText))
+            ),
+            f"Answer {field_idx + 1}",
+        )
+        for row in range(2, min(len(rows), max_row or len(rows)) + 1):
+            if row in skip_rows:
+                continue
+            values = rows[row - 1]
+            texts = [
+                (supplier_idx, get_cell_text(values[col]))
+                for supplier_idx, col in enumerate(columns)
+                if col is not None
+                and col < len(values)
+                and isinstance(values[col], (str, CellRichText))
+                and get_cell_text(values[col])
+            ]
+            if len(texts) < 2:
+                continue
+            question = next(
+                (
+                    get_cell_text(values[col])
+                    for col in label_cols
+                    if col < len(values) and get_cell_text(values[col])
+                ),
+                "",
+            )
+            questions.append({"row": row, "question": question, "field": field})
+            answers.extend(
+                (len(questions) - 1, supplier_idx, text) for supplier_idx, text in texts
+            )
+    return questions, answers
+
+
+def build_tfidf_matrix(question_ids, texts):
+    """
+    Build the TF-IDF matrix of the answers, one row per answer.
+
+    Each (question, term) pair gets its own column, so answers to different questions
+    share no column and the product of the matrix with its transpose only holds the
+    pairs of answers to the same question. The IDF of a term is taken over all the
+    answers, so the wording common to every answer of the sheet weighs little while
+    the vocabulary of a question still counts.
+
+    Args:
+        question_ids (np.ndarray): The question index of each answer.
+        texts (list): The text of each answer.
+
+    Returns:
+        tuple: The L2-normalized TF-IDF matrix (scipy.sparse.csr_matrix) and the number
+            of words of each answer (np.ndarray).
+    """
+    columns = {}
+    terms = {}
+    indptr = [0]
+    indices = []
+    term_indices = []
+    counts = []
+    n_tokens = []
+    for question_id, text in zip(question_ids.tolist(), texts):
+        answer_terms = Counter(TOKEN_RE.findall(text.lower()))
+        n_tokens.append(sum(answer_terms.values()))
+        for term, count in answer_terms.items():
+            indices.append(columns.setdefault((question_id, term), len(columns)))
+            term_indices.append(terms.setdefault(term, len(terms)))
+            counts.append(count)
+        indptr.append(len(indices))
+    indices = np.array(indices, dtype=np.int64)
+    term_indices = np.array(term_indices, dtype=np.int64)
+    matrix = sp.csr_matrix(
+        (np.array(counts, dtype=float), indices, np.array(indptr, dtype=np.int64)),
+        shape=(len(texts), len(columns)),
+    )
+    # Sublinear term frequency and smoothed IDF
+    document_frequency = np.bincount(term_indices, minlength=len(terms))
+    idf = np.log((1 + len(texts)) / (1 + document_frequency)) + 1
+    matrix.data = (1 + np.log(matrix.data)) * idf[term_indices]
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    matrix = sp.diags(1 / np.where(norms > 0, norms, 1)) @ matrix
+    return matrix.tocsr(), np.array(n_tokens)
+
+
+def compute_answer_similarity(question_ids, supplier_ids, texts, n_suppliers):
+    """
+    Compare the answers of the suppliers to each question.
+
+    The cosine similarity of all the answer pairs of all the questions is one sparse
+    product of the TF-IDF matrix with its transpose, block diagonal by question.
+
+    Args:
+        question_ids (np.ndarray): The question index of each answer.
+        supplier_ids (np.ndarray): The supplier index of each answer.
+        texts (list): The text of each answer.
+        n_suppliers (int): The number of suppliers.
+
+    Returns:
+        dict: Arrays with one value per answer (best_match, the index of the most
+            similar answer to the same question or -1, best_similarity,
+            mean_similarity, the average similarity to the other answers of the
+            question, duplicate and divergent, the flags) and supplier_similarity,
+            the average similarity of the answers of each pair of suppliers.
+    """
+    n_answers = len(texts)
+    matrix, n_tokens = build_tfidf_matrix(question_ids, texts)
+    similarity = (matrix @ matrix.T).tocoo()
+    others = similarity.row != similarity.col
+    rows = similarity.row[others]
+    cols = similarity.col[others]
+    values = np.minimum(similarity.data[others], 1.0)
+
+    # Most similar answer of each answer
+    best_match = np.full(n_answers, -1)
+    best_similarity = np.zeros(n_answers)
+    order = np.lexsort((-values, rows))
+    answer_idx, first = np.unique(rows[order], return_index=True)
+    best_match[answer_idx] = cols[order][first]
+    best_similarity[answer_idx] = values[order][first]
+
+    # Average similarity to the other answers of the same question
+    answers_per_question = np.bincount(question_ids)[question_ids]
+    similarity_sum = np.bincount(rows, weights=values, minlength=n_answers)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_similarity = np.where(
+            answers_per_question > 1, similarity_sum / (answers_per_question - 1), 0
+        )
+    question_median = (
+        pd.Series(mean_similarity).groupby(question_ids).transform("median").to_numpy()
+    )
+
+    duplicate = (best_similarity >= DUPLICATE_THRESHOLD) & (
+        n_tokens >= MIN_ANSWER_TOKENS
+    )
+    divergent = (
+        (answers_per_question >= MIN_DIVERGENT_ANSWERS)
+        & (mean_similarity < DIVERGENT_THRESHOLD)
+        & (question_median >= CONSENSUS_THRESHOLD)
+    )
+
+    # Average similarity of each pair of suppliers over the questions both answered
+    answered = sp.csr_matrix(
+        (np.ones(n_answers), (question_ids, supplier_ids)),
+        shape=(question_ids.max() + 1 if n_answers else 0, n_suppliers),
+    )
+    both_answered = (answered.T @ answered).toarray()
+    pair_sum = np.zeros((n_suppliers, n_suppliers))
+    np.add.at(pair_sum, (supplier_ids[rows], supplier_ids[cols]), values)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        supplier_similarity = np.where(
+            both_answered > 0, pair_sum / both_answered, np.nan
+        )
+    np.fill_diagonal(supplier_similarity, np.nan)
+
+    return {
+        "best_match": best_match,
+        "best_similarity": best_similarity,
+        "mean_similarity": mean_similarity,
+        "duplicate": duplicate,
+        "divergent": divergent,
+        "supplier_similarity": supplier_similarity,
+    }
+
+
+def write_answer_similarity(
+    similarity_sheet, supplier_names, questions, answers, result
+):
+    """
+    Write the supplier similarity table and the flagged answers.
+
+    Args:
+        similarity_sheet (openpyxl.Worksheet): The sheet to write to.
+        supplier_names (list): The supplier names.
+        questions (list): The questions returned by ``get_answers``.
+        answers (list): The answers returned by ``get_answers``.
+        result (dict): The result of ``compute_answer_similarity``.
+    """
+    similarity_sheet.append(["Average similarity of the answers (0 to 1)"])
+    similarity_sheet.append(["Supplier"] + list(supplier_names))
+    header_rows = [2]
+    matrix = np.round(result["supplier_similarity"], 2)
+    for supplier, values in zip(supplier_names, matrix.tolist()):
+        similarity_sheet.append(
+            [supplier] + [None if np.isnan(value) else value for value in values]
+        )
+
+    similarity_sheet.append([])
+    similarity_sheet.append(
+        [
+            "Row",
+            "Question",
+            "Field",
+            "Supplier",
+            "Flag",
+            "Most Similar",
+            "Similarity",
+            "Avg Similarity",
+            "Answer",
+        ]
+    )
+    header_rows.append(similarity_sheet.max_row)
+    flagged = np.flatnonzero(result["duplicate"] | result["divergent"])
+    for answer_idx in flagged.tolist():
+        question_idx, supplier_idx, text = answers[answer_idx]
+        question = questions[question_idx]
+        best_match = result["best_match"][answer_idx]
+        flag = "Near duplicate" if result["duplicate"][answer_idx] else "Divergent"
+        similarity_sheet.append(
+            [
+                question["row"],
+                question["question"],
+                question["field"],
+                supplier_names[supplier_idx],
+                flag,
+                supplier_names[answers[best_match][1]] if best_match >= 0 else None,
+                round(float(result["best_similarity"][answer_idx]), 2),
+                round(float(result["mean_similarity"][answer_idx]), 2),
+                text,
+            ]
+        )
+        similarity_sheet.cell(row=similarity_sheet.max_row, column=5).fill = (
+            DUPLICATE_FILL if flag == "Near duplicate" else DIVERGENT_FILL
+        )
+
+    similarity_sheet.cell(row=1, column=1).font = Font(b=True)
+    for row in header_rows:
+        for cell in similarity_sheet[row]:
+            cell.fill = HEADER_FILL
+            cell.font = HEADER_FONT
+    similarity_sheet.column_dimensions["A"].width = 20
+    similarity_sheet.column_dimensions["B"].width = 40
+    similarity_sheet.column_dimensions["I"].width = 60
+
+
+def add_answer_similarity(workbook, supplier_names, header_rows=None, max_rows=None):
+    """
+    Add an answer similarity sheet after each combined sheet of a side-by-side
+    questionnaire workbook.
+
+    Args:
+        workbook (openpyxl.Workbook): The side-by-side consolidated workbook.
+        supplier_names (list): The supplier names.
+        header_rows (dict): A dictionary mapping the combined sheet titles to the header
+            rows of their template, or None.
+        max_rows (dict): A dictionary mapping the combined sheet titles to the last row
+            of their template, or None.
+
+    Returns:
+        openpyxl.Workbook: The workbook with the similarity sheets.
+    """
+    header_rows = header_rows or {}
+    max_rows = max_rows or {}
+    for sheet in list(workbook.worksheets):
+        if not sheet.title.startswith("Combined"):
+            continue
+        questions, answers = get_answers(
+            sheet,
+            supplier_names,
+            header_rows.get(sheet.title),
+            max_rows.get(sheet.title),
+        )
+        if not answers:
+            continue
+        question_ids = np.array([answer[0] for answer in answers])
+        supplier_ids = np.array([answer[1] for answer in answers])
+        result = compute_answer_similarity(
+            question_ids,
+            supplier_ids,
+            [answer[2] for answer in answers],
+            len(supplier_names),
+        )
+        similarity_sheet = workbook.create_sheet(
+            title=get_unique_sheet_title(workbook, f"Similarity {sheet.title}"),
+            index=workbook.worksheets.index(sheet) + 1,
+        )
+        write_answer_similarity(
+            similarity_sheet, supplier_names, questions, answers, result
+        )
+    return workbook
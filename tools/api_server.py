@@ -0,0 +1,564 @@
+"""
+Local HTTP API to run consolidations from other tools.
+
+Run it from the project folder with ``python -m tools.api_server``. Endpoints:
+
+    POST /jobs                 Submit a consolidation, returns the job status (202).
+    GET  /jobs/<job_id>        Return the job status.
+    GET  /jobs/<job_id>/file   Download the consolidated file once the job is done.
+
+The body of ``POST /jobs`` is a JSON object with the keys:
+
+    template: {"path": ...} or {"name": ..., "data": <base64>}, the template file.
+    suppliers: A list of {"name": ..., "path": ...} or {"name": ..., "data": <base64>}.
+    sheets: The template sheet names to consolidate, all visible sheets by default.
+    mode: "side_by_side" (default) or "separate".
+    summary: Whether to summarize the supplier answers (side by side only).
+    price_summary: Whether to add the price summary sheets (side by side only).
+    price_stats: Whether to add the line item price statistics (side by side only).
+    similarity: Whether to add the answer similarity analysis (side by side only).
+    question_summary: Whether to summarize the answers to each question (side by side
+        only).
+    threshold: The fuzzy matching threshold, 80 by default.
+    output_format: One of the keys of ``OUTPUT_FORMATS``, "xlsx" by default.
+    compression_level: The zip compression level (0-9), None for the default.
+    event_name: The name used for the downloaded file.
+"""
+
+import argparse
+import base64
+import binascii
+import io
+import json
+import os
+import queue
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import openpyxl
+from openpyxl import load_workbook
+
+from tools.answer_similarity import add_answer_similarity
+from tools.consolidation import (
+    OUTPUT_FORMATS,
+    add_price_summaries,
+    get_combined_sheet_titles,
+    get_worker_count,
+    save_consolidated_file,
+    separate_sheet_combine,
+    side_by_side_combine,
+)
+from tools.file_server import (
+    DOWNLOAD_MAX_AGE,
+    cleanup_downloads,
+    new_download_path,
+    stream_file,
+)
+from tools.job_admission import (
+    admitted,
+    estimate_job_memory,
+    get_admission_queue,
+    get_file_size,
+)
+from tools.price_stats import add_price_statistics
+from tools.question_summary import add_question_summaries
+from tools.workbook_probe import map_supplier_sheets, probe_workbook
+
+# Largest accepted request body, uploaded files included. The body is read into
+# memory, larger files should be passed by path
+API_MAX_BODY_SIZE = 64 * 1024 * 1024
+COMBINE_MODES = ("side_by_side", "separate")
+
+
+class JobError(ValueError):
+    """A consolidation request that cannot be run."""
+
+
+def read_job_file(spec):
+    """
+    Open a file given in a job request, by path or as base64 content.
+
+    Args:
+        spec (dict): A dictionary with either a "path" or a "data" key.
+
+    Returns:
+        A path or a file-like object that ``load_workbook`` can read.
+    """
+    if spec.get("path"):
+        if not isinstance(spec["path"], str) or not os.path.isfile(spec["path"]):
+            raise JobError(f"File not found: {spec['path']}")
+        return spec["path"]
+    if spec.get("data"):
+        if not isinstance(spec["data"], str):
+            raise JobError("File data must be a base64 string.")
+        try:
+            return io.BytesIO(base64.b64decode(spec["data"], validate=True))
+        except (binascii.Error, ValueError):
+            raise JobError("File data is not valid base64.")
+    raise JobError("Each file needs a 'path' or 'data' key.")
+
+
+def get_int_option(request, key, default, minimum, maximum):
+    """
+    Read an integer option of a job request.
+
+    Args:
+        request (dict): The job request.
+        key (str): The name of the option.
+        default (int): The value if the option is missing, may be None.
+        minimum (int): The smallest accepted value.
+        maximum (int): The largest accepted value.
+
+    Returns:
+        int: The value of the option.
+    """
+    value = request.get(key, default)
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise JobError(f"'{key}' must be an integer.")
+    try:
+        value = int(value)
+    except ValueError:
+        raise JobError(f"'{key}' must be an integer.")
+    if not minimum <= value <= maximum:
+        raise JobError(f"'{key}' must be between {minimum} and {maximum}.")
+    return value
+
+
+def parse_job_request(body):
+    """
+    Check a job request and fill in the default options.
+
+    Args:
+        body (bytes): The JSON body of the request.
+
+    Returns:
+        dict: The job options.
+
+    Raises:
+        JobError: If the request is not valid.
+    """
+    try:
+        request = json.loads(body)
+    except ValueError:
+        raise JobError("The request body is not valid JSON.")
+    if not isinstance(request, dict):
+        raise JobError("The request body must be a JSON object.")
+    if not isinstance(request.get("template"), dict):
+        raise JobError("A 'template' file is required.")
+    suppliers = request.get("suppliers")
+    if not suppliers or not isinstance(suppliers, list):
+        raise JobError("At least one supplier file is required.")
+    if not all(isinstance(supplier, dict) for supplier in suppliers):
+        raise JobError("Each supplier must be a JSON object.")
+    names = [supplier.get("name") for supplier in suppliers]
+    if not all(name and isinstance(name, str) for name in names) or len(
+        set(names)
+    ) != len(names):
+        raise JobError("Each supplier needs a unique 'name'.")
+    sheets = request.get("sheets")
+    if sheets is not None and (
+        not isinstance(sheets, list)
+        or not all(isinstance(sheet, str) for sheet in sheets)
+    ):
+        raise JobError("'sheets' must be a list of sheet names.")
+    mode = request.get("mode", "side_by_side")
+    if mode not in COMBINE_MODES:
+        raise JobError(f"Unknown mode: {mode}")
+    output_format = request.get("output_format", "xlsx")
+    if output_format not in OUTPUT_FORMATS:
+        raise JobError(f"Unknown output format: {output_format}")
+    return {
+        "template": request["template"],
+        "suppliers": suppliers,
+        "sheets": sheets,
+        "mode": mode,
+        "summary": bool(request.get("summary", False)),
+        "price_summary": bool(request.get("price_summary", False)),
+        "price_stats": bool(request.get("price_stats", False)),
+        "similarity": bool(request.get("similarity", False)),
+        "question_summary": bool(request.get("question_summary", False)),
+        "threshold": get_int_option(request, "threshold", 80, 0, 100),
+        "output_format": output_format,
+        "compression_level": get_int_option(request, "compression_level", None, 0, 9),
+        "event_name": str(request.get("event_name", "RFP")),
+    }
+
+
+def get_visible_sheets(workbook):
+    """
+    Return the visible sheets of a workbook, in order.
+
+    Args:
+        workbook (openpyxl.Workbook): The workbook.
+
+    Returns:
+        list: The visible worksheets.
+    """
+    return [sheet for sheet in workbook.worksheets if sheet.sheet_state == "visible"]
+
+
+def run_consolidation_job(options):
+    """
+    Run one consolidation job and write the result to the download folder.
+
+    Supplier sheets are mapped to the template sheets on their name, header rows and
+    dimensions before loading, as in the app (see ``map_supplier_sheets``).
+
+    Args:
+        options (dict): The job options returned by ``parse_job_request``.
+
+    Returns:
+        str: The path of the consolidated file.
+    """
+    template_file = read_job_file(options["template"])
+    template_probe = probe_workbook(template_file)
+    template = load_workbook(template_file, rich_text=True, data_only=True)
+    template_visible = [sheet.title for sheet in get_visible_sheets(template)]
+    sheet_names = options["sheets"] or template_visible
+    unknown = [name for name in sheet_names if name not in template_visible]
+    if unknown:
+        raise JobError(f"Sheets not found in the template: {', '.join(unknown)}")
+    template_sheets = [template[name] for name in sheet_names]
+
+    template_probe_sheets = {sheet["name"]: sheet for sheet in template_probe}
+    files = [
+        (
+            get_file_size(template_file),
+            [template_probe_sheets[name] for name in sheet_names],
+        )
+    ]
+    supplier_files = {}
+    for supplier in options["suppliers"]:
+        supplier_file = read_job_file(supplier)
+        supplier_probe = probe_workbook(supplier_file)
+        # Map the sheets before loading, to fail early on a mismatching file
+        mapping, by_position = map_supplier_sheets(
+            template_probe, supplier_probe, sheet_names
+        )
+        unmatched = [name for name, mapped in mapping.items() if mapped is None]
+        if unmatched:
+            raise JobError(
+                f"No sheet of supplier {supplier['name']} is left for: {', '.join(unmatched)}"
+            )
+        if by_position:
+            print(
+                f"Supplier {supplier['name']}: {', '.join(by_position)} matched by position"
+            )
+        supplier_files[supplier["name"]] = (supplier_file, mapping)
+        supplier_probe_sheets = {sheet["name"]: sheet for sheet in supplier_probe}
+        files.append(
+            (
+                get_file_size(supplier_file),
+                [supplier_probe_sheets[mapping[name]] for name in sheet_names],
+            )
+        )
+
+    # Wait for a slot shared with the app sessions of the process, and share the CPUs
+    # with the other running consolidations
+    admission_queue = get_admission_queue()
+    with admitted(admission_queue, estimate_job_memory(files)):
+        workers = min(
+            get_worker_count(len(sheet_names)), admission_queue.get_worker_share()
+        )
+        return combine_job_files(
+            options, template_sheets, supplier_files, sheet_names, workers
+        )
+
+
+def combine_job_files(options, template_sheets, supplier_files, sheet_names, workers):
+    """
+    Load the supplier files of a job, combine them and write the result to the download
+    folder.
+
+    Args:
+        options (dict): The job options returned by ``parse_job_request``.
+        template_sheets (list): The selected template sheets.
+        supplier_files (dict): A dictionary mapping the supplier names to their file
+            and sheet mapping (see ``map_supplier_sheets``).
+        sheet_names (list): The selected template sheet names.
+        workers (int): The number of worker processes the consolidation may use.
+
+    Returns:
+        str: The path of the consolidated file.
+    """
+    supplier_sheets_dict = {}
+    for name, (supplier_file, mapping) in supplier_files.items():
+        workbook = load_workbook(supplier_file, rich_text=True, data_only=True)
+        supplier_sheets_dict[name] = [
+            workbook[mapping[sheet_name]] for sheet_name in sheet_names
+        ]
+
+    consolidated = openpyxl.Workbook()
+    consolidated.remove(consolidated.active)
+    if options["mode"] == "side_by_side":
+        consolidated = side_by_side_combine(
+            consolidated,
+            template_sheets,
+            supplier_sheets_dict,
+            threshold=options["threshold"],
+            summary_option=options["summary"],
+            workers=workers,
+        )
+        combined_titles = get_combined_sheet_titles(consolidated, template_sheets)
+        if options["price_summary"]:
+            consolidated = add_price_summaries(
+                consolidated, list(supplier_sheets_dict)
+            )
+        if options["price_stats"]:
+            consolidated = add_price_statistics(
+                consolidated, list(supplier_sheets_dict)
+            )
+        max_rows = {
+            combined_titles[sheet.title]: sheet.max_row for sheet in template_sheets
+        }
+        if options["similarity"]:
+            consolidated = add_answer_similarity(
+                consolidated, list(supplier_sheets_dict), max_rows=max_rows
+            )
+        if options["question_summary"]:
+            consolidated = add_question_summaries(
+                consolidated, list(supplier_sheets_dict), max_rows=max_rows
+            )
+    else:
+        consolidated = separate_sheet_combine(
+            consolidated,
+            template_sheets,
+            supplier_sheets_dict,
+            threshold=options["threshold"],
+            workers=workers,
+        )
+
+    _, extension, _ = OUTPUT_FORMATS[options["output_format"]]
+    return save_consolidated_file(
+        consolidated,
+        options["output_format"],
+        options["compression_level"],
+        path=new_download_path(extension),
+    )
+
+
+class JobQueue:
+    """A bounded queue of consolidation jobs run by a fixed number of worker threads."""
+
+    def __init__(self, workers=2, max_queued=20):
+        self.jobs = {}
+        self.waiting = []
+        self.lock = threading.Lock()
+        self.queue = queue.Queue(maxsize=max_queued)
+        for _ in range(workers):
+            threading.Thread(target=self.work, daemon=True).start()
+
+    def submit(self, options):
+        """
+        Queue a job.
+
+        Args:
+            options (dict): The job options returned by ``parse_job_request``.
+
+        Returns:
+            dict: The job status, or None if the queue is full.
+        """
+        job = {
+            "id": secrets.token_urlsafe(12),
+            "status": "queued",
+            "options": options,
+            "path": None,
+            "error": None,
+            "submitted": time.time(),
+            "finished": None,
+        }
+        with self.lock:
+            try:
+                self.queue.put_nowait(job["id"])
+            except queue.Full:
+                return None
+            self.jobs[job["id"]] = job
+            self.waiting.append(job["id"])
+        return self.get_status(job["id"])
+
+    def work(self):
+        """Run the queued jobs one after the other, forever."""
+        while True:
+            job_id = self.queue.get()
+            with self.lock:
+                job = self.jobs[job_id]
+                self.waiting.remove(job_id)
+                job["status"] = "running"
+            try:
+                path = run_consolidation_job(job["options"])
+            except Exception as e:
+                print(f"Job {job_id} failed: {e}")
+                with self.lock:
+                    job["status"] = "failed"
+                    job["error"] = str(e)
+            else:
+                with self.lock:
+                    job["status"] = "done"
+                    job["path"] = path
+            finally:
+                with self.lock:
+                    job["finished"] = time.time()
+                    # The uploaded files are not needed anymore
+                    job["options"] = {
+                        key: value
+                        for key, value in job["options"].items()
+                        if key not in ("template", "suppliers")
+                    }
+                self.queue.task_done()
+                self.prune()
+
+    def get_status(self, job_id):
+        """
+        Return the public status of a job.
+
+        Args:
+            job_id (str): The job id.
+
+        Returns:
+            dict: The id, status, queue position (1 for the next job to run), error and
+                download path of the job, or None if the job is unknown.
+        """
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            status = {"id": job_id, "status": job["status"], "error": job["error"]}
+            if job["status"] == "queued":
+                status["queue_position"] = self.waiting.index(job_id) + 1
+            if job["status"] == "done":
+                status["download"] = f"/jobs/{job_id}/file"
+            return status
+
+    def get_download(self, job_id):
+        """
+        Return the file of a finished job.
+
+        Args:
+            job_id (str): The job id.
+
+        Returns:
+            tuple: The path and the downloaded file name, or None if not available.
+        """
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job["status"] != "done" or not os.path.exists(job["path"]):
+                return None
+            _, extension, mime = OUTPUT_FORMATS[job["options"]["output_format"]]
+            file_name = f"{job['options']['event_name']}_consolidated.{extension}"
+            return job["path"], file_name, mime
+
+    def prune(self, max_age=DOWNLOAD_MAX_AGE):
+        """
+        Forget the jobs that finished more than ``max_age`` seconds ago and delete the
+        expired files of the download folder.
+
+        Args:
+            max_age (int): The number of seconds finished jobs are kept.
+        """
+        now = time.time()
+        with self.lock:
+            for job_id, job in list(self.jobs.items()):
+                if job["finished"] and now - job["finished"] > max_age:
+                    del self.jobs[job_id]
+        cleanup_downloads(max_age)
+
+
+class ApiRequestHandler(BaseHTTPRequestHandler):
+    """Handle the requests of the consolidation API (see the module docstring)."""
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/jobs":
+            self.send_json(404, {"error": "Not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            self.send_json(400, {"error": "Invalid Content-Length"})
+            return
+        if length > API_MAX_BODY_SIZE:
+            self.send_json(413, {"error": "Request too large"})
+            return
+        try:
+            options = parse_job_request(self.rfile.read(length))
+        except JobError as e:
+            self.send_json(400, {"error": str(e)})
+            return
+        status = self.server.job_queue.submit(options)
+        if status is None:
+            self.send_json(503, {"error": "Too many queued jobs, try again later"})
+            return
+        self.send_json(202, status)
+
+    def do_GET(self):
+        parts = self.path.split("?")[0].strip("/").split("/")
+        if len(parts) == 2 and parts[0] == "jobs":
+            status = self.server.job_queue.get_status(parts[1])
+            if status is None:
+                self.send_json(404, {"error": "Unknown job"})
+            else:
+                self.send_json(200, status)
+        elif len(parts) == 3 and parts[0] == "jobs" and parts[2] == "file":
+            download = self.server.job_queue.get_download(parts[1])
+            if download is None:
+                self.send_json(404, {"error": "File not ready or expired"})
+                return
+            try:
+                stream_file(self, *download)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+        else:
+            self.send_json(404, {"error": "Not found"})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_api_server(host="127.0.0.1", port=8770, workers=2, max_queued=20):
+    """
+    Start the consolidation API in a background thread.
+
+    Args:
+        host (str): The interface to listen on, local connections only by default.
+        port (int): The port to listen on.
+        workers (int): The number of jobs run at the same time.
+        max_queued (int): The number of jobs that can wait before requests are refused.
+
+    Returns:
+        ThreadingHTTPServer: The running server. Its ``job_queue`` attribute holds the jobs.
+    """
+    server = ThreadingHTTPServer((host, port), ApiRequestHandler)
+    server.daemon_threads = True
+    server.job_queue = JobQueue(workers, max_queued)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the RFPDocSum consolidation API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument(
+        "--port", type=int, default=int(os.environ.get("RFPDOCSUM_API_PORT", 8770))
+    )
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--max-queued", type=int, default=20)
+    args = parser.parse_args()
+
+    api_server = start_api_server(args.host, args.port, args.workers, args.max_queued)
+    print(f"Consolidation API listening on http://{args.host}:{args.port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        api_server.shutdown()
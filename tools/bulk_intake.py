@@ -0,0 +1,197 @@
+import posixpath
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from tools.event_manifest import (
+    add_spooled_file,
+    new_supplier,
+    prune_manifest,
+    spool_file,
+)
+from tools.watch_folder import infer_doc_type, infer_supplier_name, is_response_file
+
+# Number of files decompressed, hashed and probed at the same time
+INTAKE_WORKERS = 8
+
+
+def list_intake_files(uploaded_files):
+    """
+    List the response files of a bulk upload, expanding zip archives.
+
+    Args:
+        uploaded_files (list): The uploaded xlsx and zip files.
+
+    Returns:
+        tuple: A list of tuples (file name, source name, opener) and the skipped files,
+            a list of tuples (file name, reason). The source name is the file name in
+            the archive, with its folders, and the opener is a function returning a
+            file-like object of the content.
+    """
+    files = []
+    skipped = []
+    for uploaded_file in uploaded_files:
+        if uploaded_file.name.lower().endswith(".zip"):
+            try:
+                archive = zipfile.ZipFile(uploaded_file)
+            except zipfile.BadZipFile as e:
+                skipped.append((uploaded_file.name, f"not a valid zip archive ({e})"))
+                continue
+            for info in archive.infolist():
+                file_name = posixpath.basename(info.filename)
+                if (
+                    info.is_dir()
+                    or info.filename.startswith("__MACOSX/")
+                    or not is_response_file(file_name)
+                ):
+                    continue
+                files.append(
+                    (
+                        file_name,
+                        info.filename,
+                        lambda info=info, archive=archive: archive.open(info),
+                    )
+                )
+        elif is_response_file(uploaded_file.name):
+            name = uploaded_file.name
+            files.append((name, name, lambda file=uploaded_file: file))
+    return files, skipped
+
+
+def get_name_sources(source_names):
+    """
+    Choose the text each supplier name is inferred from.
+
+    Files of an archive with one folder per supplier are named after their folder,
+    other files after their file name.
+
+    Args:
+        source_names (list): The source names of the files (see ``list_intake_files``).
+
+    Returns:
+        list: The text to infer the supplier name from, for each file.
+    """
+    folders = {posixpath.dirname(name) for name in source_names}
+    if len(folders) > 1 and "" not in folders:
+        return [posixpath.basename(posixpath.dirname(name)) for name in source_names]
+    return [posixpath.basename(name) for name in source_names]
+
+
+def infer_file_roles(file_name, sheets, template_sheets, doc_types, single_file):
+    """
+    Guess the document types a response file answers.
+
+    The visible sheets of the file are compared with the sheets of each template, the
+    file name is used when the sheets do not tell.
+
+    Args:
+        file_name (str): The file name.
+        sheets (list): The sheets of the file (see ``probe_workbook``).
+        template_sheets (dict): A dictionary mapping the document types to the visible
+            sheet names of their template (empty if no template was uploaded).
+        doc_types (list): The pricing and questionnaire document types.
+        single_file (bool): Whether the event uses a single file per supplier.
+
+    Returns:
+        list: The document types of the file.
+    """
+    if single_file:
+        return list(doc_types)
+    sheet_names = {
+        sheet["name"].strip().lower() for sheet in sheets if sheet["state"] == "visible"
+    }
+    scores = {
+        doc_type: len(
+            sheet_names & {name.strip().lower() for name in template_sheets[doc_type]}
+        )
+        for doc_type in doc_types
+    }
+    best = max(scores.values())
+    best_doc_types = [doc_type for doc_type in doc_types if scores[doc_type] == best]
+    if best and len(best_doc_types) == 1:
+        return best_doc_types
+    doc_type = infer_doc_type(file_name, doc_types)
+    if doc_type:
+        return [doc_type]
+    return best_doc_types if best else list(doc_types)
+
+
+def ingest_files(
+    manifest, uploaded_files, doc_types, single_file, workers=INTAKE_WORKERS
+):
+    """
+    Add the response files of a bulk upload to the event manifest.
+
+    The files are decompressed, spooled and probed in parallel. Each file is assigned
+    to a supplier inferred from its name (or folder), existing suppliers with the same
+    name have their files replaced and empty supplier slots are dropped. Files that
+    cannot be read (corrupt archives or workbooks) are skipped.
+
+    Args:
+        manifest (dict): The event manifest.
+        uploaded_files (list): The uploaded xlsx and zip files.
+        doc_types (list): The pricing and questionnaire document types.
+        single_file (bool): Whether the event uses a single file per supplier.
+        workers (int): The number of files read at the same time.
+
+    Returns:
+        tuple: A list of tuples (file name, supplier name, document types), one per
+            added file, and a list of tuples (file name, reason), one per skipped file.
+    """
+    files, skipped = list_intake_files(uploaded_files)
+    if not files:
+        return [], skipped
+
+    def read_file(file):
+        file_name, _, opener = file
+        try:
+            return spool_file(opener(), file_name), None
+        except Exception as e:
+            # A corrupt file must not abort the intake of the others
+            return None, f"cannot be read ({type(e).__name__}: {e})"
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(files)))) as executor:
+        results = list(executor.map(read_file, files))
+
+    template_sheets = {
+        doc_type: [
+            sheet["name"]
+            for sheet in manifest["files"][file_hash]["sheets"]
+            if sheet["state"] == "visible"
+        ]
+        if file_hash in manifest["files"]
+        else []
+        for doc_type, file_hash in manifest["templates"].items()
+    }
+    suppliers = [
+        supplier
+        for supplier in manifest["suppliers"]
+        if supplier["name"] or any(supplier["roles"].values())
+    ]
+    intake = []
+    name_sources = get_name_sources([source_name for _, source_name, _ in files])
+    for (file_name, _, _), name_source, (entry, error) in zip(
+        files, name_sources, results
+    ):
+        if entry is None:
+            print(f"Bulk intake: {file_name} skipped, {error}")
+            skipped.append((file_name, error))
+            continue
+        name = infer_supplier_name(
+            name_source, [supplier["name"] for supplier in suppliers]
+        )
+        roles = infer_file_roles(
+            file_name, entry["sheets"], template_sheets, doc_types, single_file
+        )
+        supplier = next(
+            (sup for sup in suppliers if sup["name"].lower() == name.lower()), None
+        )
+        if supplier is None:
+            supplier = new_supplier(name, doc_types)
+            suppliers.append(supplier)
+        file_hash = add_spooled_file(manifest, entry)
+        for doc_type in roles:
+            supplier["roles"][doc_type] = file_hash
+        intake.append((file_name, supplier["name"], roles))
+    manifest["suppliers"] = suppliers
+    prune_manifest(manifest)
+    return intake, skipped
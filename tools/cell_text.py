@@ -0,0 +1,102 @@
+import weakref
+
+# Plain text of the sheets already read, dropped with the sheets themselves
+_sheet_text_cache = weakref.WeakKeyDictionary()
+
+
+def get_cell_text(value):
+    """
+    Return the plain text of a cell value, trimmed and with whitespace normalized.
+
+    Args:
+        value: The cell value (rich text, string, number, date...).
+
+    Returns:
+        str: The text of the value, or None if the cell is empty or blank.
+    """
+    if value is None:
+        return None
+    # Rich text reads as the concatenation of its blocks, the same text a workbook
+    # loaded without rich text holds
+    text = " ".join(str(value).split())
+    return text or None
+
+
+def iter_sheet_values(sheet):
+    """
+    Iterate over the non-empty cell values of a sheet without creating any cell.
+
+    Works with regular and read-only worksheets.
+
+    Args:
+        sheet: The worksheet to read.
+
+    Yields:
+        tuple: (row, column, value) for each non-empty cell.
+    """
+    if hasattr(sheet, "_cells"):
+        for (row, col), cell in list(sheet._cells.items()):
+            if cell.value is not None:
+                yield row, col, cell.value
+    else:
+        for row, values in enumerate(sheet.iter_rows(values_only=True), start=1):
+            for col, value in enumerate(values, start=1):
+                if value is not None:
+                    yield row, col, value
+
+
+def get_sheet_text(sheet):
+    """
+    Return the plain text of every non-empty cell of a sheet, grouped by column.
+
+    The text is computed once per sheet and cached for as long as the sheet exists, so
+    that matching, mismatch detection, summaries and search all read the same text.
+
+    Args:
+        sheet: The worksheet to read.
+
+    Returns:
+        dict: A dictionary mapping column indexes to lists of (row, text) tuples sorted
+            by row.
+    """
+    if sheet in _sheet_text_cache:
+        return _sheet_text_cache[sheet]
+    columns = {}
+    for row, col, value in iter_sheet_values(sheet):
+        text = get_cell_text(value)
+        if text is not None:
+            columns.setdefault(col, []).append((row, text))
+    for cells in columns.values():
+        cells.sort()
+    _sheet_text_cache[sheet] = columns
+    return columns
+
+
+def get_column_text(sheet, col_idx, min_row=1, max_row=None):
+    """
+    Return the plain text of the non-empty cells of one column of a sheet.
+
+    Args:
+        sheet: The worksheet to read.
+        col_idx (int): The column index.
+        min_row (int): The first row to include.
+        max_row (int): The last row to include, None for all rows.
+
+    Returns:
+        list: A list of (row, text) tuples sorted by row.
+    """
+    return [
+        (row, text)
+        for row, text in get_sheet_text(sheet).get(col_idx, [])
+        if row >= min_row and (max_row is None or row <= max_row)
+    ]
+
+
+def clear_sheet_text(sheet):
+    """
+    Forget the cached text of a sheet, e.g. after its values were changed.
+
+    Args:
+        sheet: The worksheet whose text was cached.
+    """
+    _sheet_text_cache.pop(sheet, None)
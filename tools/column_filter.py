@@ -0,0 +1,122 @@
+import io
+import re
+import zipfile
+
+from tools.workbook_probe import SHARED_STRINGS_PATH, get_sheet_paths
+
+CELL_RE = re.compile(
+    rb"<(?:\w+:)?c\b[^>]*?\br=\"([A-Z]+)(\d+)\"[^>]*?(?:/>|>.*?</(?:\w+:)?c>)", re.S
+)
+CELL_START_RE = re.compile(rb"<(?:\w+:)?c[\s/>]")
+SHARED_STRING_CELL_RE = re.compile(rb"\bt=\"s\"")
+CELL_VALUE_RE = re.compile(rb"<(?:\w+:)?v>\s*(\d+)\s*</(?:\w+:)?v>")
+SHEET_DATA_RE = re.compile(
+    rb"<((?:\w+:)?)sheetData\b[^>]*?(?:/>|>.*?</(?:\w+:)?sheetData>)", re.S
+)
+SHARED_STRING_RE = re.compile(rb"<((?:\w+:)?)si\b[^>]*?(?:/>|>.*?</(?:\w+:)?si>)", re.S)
+
+
+def filter_sheet_xml(sheet_xml, keep_columns):
+    """
+    Remove the cells of the columns that are not kept from a worksheet XML.
+
+    Rows and everything outside the cells (dimensions, merged cells...) are left as is.
+
+    Args:
+        sheet_xml (bytes): The worksheet XML.
+        keep_columns (set): The column letters to keep, None to keep all columns.
+
+    Returns:
+        tuple: The filtered XML (bytes), the indexes of the shared strings used by the
+            kept cells (set, or None if some cells have no reference and could not be
+            checked) and the last row that had a cell before filtering (int).
+    """
+    shared_strings = set()
+    max_row = 0
+    n_cells = 0
+
+    def keep_cell(match):
+        nonlocal max_row, n_cells
+        n_cells += 1
+        max_row = max(max_row, int(match.group(2)))
+        if keep_columns is not None and match.group(1).decode() not in keep_columns:
+            return b""
+        cell_xml = match.group(0)
+        if SHARED_STRING_CELL_RE.search(cell_xml[: cell_xml.find(b">")]):
+            value = CELL_VALUE_RE.search(cell_xml)
+            if value:
+                shared_strings.add(int(value.group(1)))
+        return cell_xml
+
+    filtered_xml = CELL_RE.sub(keep_cell, sheet_xml)
+    if n_cells != len(CELL_START_RE.findall(sheet_xml)):
+        # Cells without an "r" attribute are kept, but their strings are unknown
+        shared_strings = None
+    return filtered_xml, shared_strings, max_row
+
+
+def filter_workbook(file, keep_sheets):
+    """
+    Build a copy of an xlsx file holding only the cells that will be used.
+
+    The sheets that are not listed are emptied but kept, so that sheet names, states and
+    positions do not change. Shared strings that no kept cell uses are blanked, so that
+    loading the copy with rich text only parses the text of the kept cells.
+
+    Args:
+        file: A path or file-like object of the xlsx file.
+        keep_sheets (dict): A dictionary mapping sheet names to the set of column letters
+            to keep, or None to keep all the columns of the sheet.
+
+    Returns:
+        tuple: The filtered file (io.BytesIO) and a dictionary mapping the kept sheet
+            names to their last row before filtering.
+    """
+    if hasattr(file, "seek"):
+        file.seek(0)
+    filtered = io.BytesIO()
+    max_rows = {}
+    shared_strings = set()
+    with zipfile.ZipFile(file) as archive:
+        sheet_paths = {
+            path: name for name, _, path in get_sheet_paths(archive) if path
+        }
+        entries = {}
+        for filename in archive.namelist():
+            data = archive.read(filename)
+            sheet_name = sheet_paths.get(filename)
+            if sheet_name is not None:
+                if sheet_name in keep_sheets:
+                    data, used_strings, max_rows[sheet_name] = filter_sheet_xml(
+                        data, keep_sheets[sheet_name]
+                    )
+                    if used_strings is None or shared_strings is None:
+                        shared_strings = None
+                    else:
+                        shared_strings |= used_strings
+                else:
+                    data = SHEET_DATA_RE.sub(rb"<\1sheetData/>", data)
+            entries[filename] = data
+
+        if shared_strings is not None and SHARED_STRINGS_PATH in entries:
+            data = entries[SHARED_STRINGS_PATH]
+            position = -1
+
+            def blank_unused(match):
+                nonlocal position
+                position += 1
+                if position in shared_strings:
+                    return match.group(0)
+                prefix = match.group(1)
+                return b"<" + prefix + b"si><" + prefix + b"t/></" + prefix + b"si>"
+
+            entries[SHARED_STRINGS_PATH] = SHARED_STRING_RE.sub(blank_unused, data)
+
+        # The copy is only read once, store it uncompressed
+        with zipfile.ZipFile(filtered, "w", zipfile.ZIP_STORED) as output:
+            for filename, data in entries.items():
+                output.writestr(filename, data)
+    if hasattr(file, "seek"):
+        file.seek(0)
+    filtered.seek(0)
+    return filtered, max_rows
@@ -1,1081 +1,1355 @@
+import os
+import zipfile
+from contextlib import contextmanager
+
 import streamlit as st
 import nltk
-
-nltk.download("punkt")
-nltk.download("punkt_tab")
 import openpyxl
-from openpyxl import load_workbook
-from openpyxl.cell.rich_text import TextBlock, CellRichText
-from openpyxl.styles import PatternFill, Border, Side, Alignment, Protection, Font
-from openpyxl.utils import get_column_letter
-from openpyxl.utils.dataframe import dataframe_to_rows
-from openpyxl.utils.cell import coordinate_from_string, column_index_from_string
-from openpyxl.chart import BarChart, Reference
-
-from fuzzywuzzy import fuzz
-from itertools import cycle
-from collections import deque, defaultdict
-from copy import copy
-import io
-import re
-import pandas as pd
-
-from sumy.parsers.plaintext import PlaintextParser
-from sumy.nlp.tokenizers import Tokenizer
-from sumy.summarizers.lsa import LsaSummarizer
-
-
-def fill_color_switch():
-    """
-    Returns a cycle of 10 colors used to fill cells in a worksheet. Each color represents a different supplier.
 
-    The colors are chosen to be visually distinct and not too bright (color blindness friendly).
-    """
-    colors = [
-        "E4DFEC",
-        "D4D5F8",
-        "DFD2FA",
-        "D9E5F3",
-        "E0E0EC",
-        "E7DAF2",
-        "E3E9E9",
-        "CC79A7",
-        "009E73",
-        "0072B2",
-    ]
-    return cycle(colors)
+from tools.consolidation import (
+    OUTPUT_FORMATS,
+    add_price_summaries,
+    fill_color_switch,
+    get_combined_sheet_titles,
+    get_supplier_columns,
+    get_worker_count,
+    match_supplier_sheets,
+    separate_sheet_combine,
+    side_by_side_combine,
+    save_consolidated_file,
+)
+from tools.event_manifest import (
+    get_event_suppliers,
+    get_event_templates,
+    new_supplier,
+    open_event_files,
+    prune_manifest,
+    set_supplier_file,
+)
+from tools.file_server import (
+    cleanup_downloads,
+    link_or_copy,
+    new_download_path,
+    register_download,
+    remove_download,
+    start_download_server,
+)
+from tools.job_admission import (
+    admitted,
+    estimate_job_memory,
+    get_admission_queue,
+    get_file_size,
+)
+from tools.answer_similarity import add_answer_similarity
+from tools.api_server import start_api_server
+from tools.preview import open_preview, read_preview_page, write_sheet_preview
+from tools.price_stats import add_price_statistics
+from tools.question_summary import add_question_summaries
+from tools.response_search import (
+    SEARCH_MAX_HITS,
+    index_sheets,
+    new_search_index,
+    search_index,
+)
+from tools.result_cache import get_cached_result, get_result_key, store_result
+from tools.round_diff import round_diff_combine
+from tools.template_schema import get_template_schemas
+from tools.workbook_probe import check_supplier_sheets, map_supplier_sheets
+from tools.watch_folder import (
+    get_changed_files,
+    infer_doc_type,
+    infer_supplier_name,
+    resolve_watch_folder,
+    scan_watch_folder,
+)
+from tools.workbook_registry import (
+    get_content_hash,
+    get_file_key,
+    get_filtered_workbook,
+    get_workbook,
+    get_workbook_probe,
+    prune_workbook_registry,
+)
 
+# Port of the optional server streaming the consolidated files to the browser, off
+# unless set
+DOWNLOAD_PORT = os.environ.get("RFPDOCSUM_DOWNLOAD_PORT")
+# Interface the download server listens on
+DOWNLOAD_HOST = os.environ.get("RFPDOCSUM_DOWNLOAD_HOST", "127.0.0.1")
+# Seconds between two checks of the watch folder
+WATCH_INTERVAL = 30
+# Port of the consolidation API run inside the app process, off unless set
+API_PORT = os.environ.get("RFPDOCSUM_API_PORT")
 
-def generate_merged_dict(sheet):
-    """
-    Generates a dictionary mapping column indices to lists of merged ranges
-    in that column.
-
-    The output dictionary will have the following structure:
-    {
-        column_idx1: [merged_range1, merged_range2, ...],
-        column_idx2: [merged_range3, merged_range4, ...],
-        ...
-    }
 
-    Only vertical merges are handled (i.e., merged cells in the same column).
+@st.cache_resource(show_spinner=False)
+def download_nltk_data():
     """
-    merged_dict = {}
-
-    for merged_range in sheet.merged_cells.ranges:
-        # Only handle vertical merges (i.e., merged cells in the same column)
-        if merged_range.size["columns"] == 1:
-            start_cell = merged_range.start_cell
-            column_idx = start_cell.column  # Get the column index
-            merged_range_str = (
-                merged_range.coord
-            )  # Get the range as string (e.g., 'C14:C17')
+    Download the NLTK tokenizers used by the summaries, once per server process.
+    """
+    nltk.download("punkt")
+    nltk.download("punkt_tab")
 
-            # If the column is not already in merged_dict, initialize an empty list
-            if column_idx not in merged_dict:
-                merged_dict[column_idx] = []
 
-            # Add the merged range to the list of merged ranges for this column
-            merged_dict[column_idx].append(merged_range_str)
+@st.cache_resource(show_spinner=False)
+def get_api_server():
+    """
+    Start the consolidation API in the app process, if enabled with the
+    ``RFPDOCSUM_API_PORT`` environment variable, so that its jobs wait in the same
+    admission queue as the sessions.
 
-    return merged_dict
+    Returns:
+        ThreadingHTTPServer: The API server, or None if it is disabled or cannot be
+            started.
+    """
+    if not API_PORT:
+        return None
+    try:
+        return start_api_server(port=int(API_PORT))
+    except OSError as e:
+        print(f"Consolidation API not available: {e}")
+        return None
 
 
-def merge_columns_in_target_sheet(
-    target_sheet, merged_dict, source_col_idx, target_col_idx
-):
+@contextmanager
+def consolidation_slot(template_file, suppliers, doc_type, sheet_names):
     """
-    Merges columns in the target sheet based on the merged ranges found in the source sheet.
+    Wait for the server to admit a consolidation, showing the queue position meanwhile,
+    and hold the slot for the duration of a ``with`` block.
 
     Args:
-        target_sheet: The target sheet where the columns will be merged.
-        merged_dict: A dictionary mapping column indices to lists of merged ranges.
-        source_col_idx: The column index from the source sheet where the merged ranges are found.
-        target_col_idx: The column index in the target sheet where the columns will be merged.
+        template_file: The template file.
+        suppliers (list): The suppliers of the event with their files.
+        doc_type (str): The document type to consolidate.
+        sheet_names (list): The selected template sheet names.
 
-    Returns:
-        None
+    Yields:
+        int: The number of worker processes the consolidation may use.
     """
-    if source_col_idx not in merged_dict:
-        # print(f"No merged ranges found for column {source_col_idx} in merged_dict.")
-        return
-    for merged_range in merged_dict[source_col_idx]:
-        # Extract the start and end rows from the merged range (e.g., 'C14:C17' -> 14, 17)
-        start_cell, end_cell = merged_range.split(":")
-        start_row = int(start_cell[1:])
-        end_row = int(end_cell[1:])
-        start_column = column_index_from_string(start_cell[0])
-        target_sheet.merge_cells(
-            start_row=start_row,
-            start_column=target_col_idx,  # Use target_col_idx for the target column
-            end_row=end_row,
-            end_column=target_col_idx,
+    files = [(template_file, sheet_names)]
+    for supplier in suppliers:
+        if supplier.get(doc_type):
+            supplier_sheet_names, _ = get_supplier_sheet_names(
+                template_file, supplier[doc_type], sheet_names
+            )
+            files.append((supplier[doc_type], supplier_sheet_names))
+    sheets = []
+    for file, names in files:
+        probe = {sheet["name"]: sheet for sheet in get_workbook_probe(file)}
+        sheets.append(
+            (get_file_size(file), [probe[name] for name in names if name in probe])
+        )
+    admission_queue = get_admission_queue()
+    placeholder = st.empty()
+
+    def show_position(position, waited):
+        placeholder.info(
+            f"⏳ The server is busy, your consolidation is number {position} in the queue ({waited:.0f} s)."
+        )
+
+    with admitted(admission_queue, estimate_job_memory(sheets), show_position):
+        placeholder.empty()
+        yield min(
+            get_worker_count(len(sheet_names)), admission_queue.get_worker_share()
         )
 
 
-# Function to find common columns by comparing values
-def find_matching_cols(template_sheet, supplier_sheet, threshold=80):
+@st.cache_data(show_spinner=False)
+def get_supplier_badges(supplier_names):
     """
-    Find the columns that are common between the template sheet and the supplier sheet.
+    Return the HTML of the supplier names, in the colors of their consolidated columns.
 
     Args:
-        template_sheet: The template sheet.
-        supplier_sheet: The supplier sheet.
-        threshold: The threshold for fuzzy matching.
+        supplier_names (tuple): The supplier names.
 
     Returns:
-        A tuple of three lists: common_columns, mis_mat_rows, and supplier_value_columns.
-            common_columns: The columns that are common between the template and the supplier.
-            mis_mat_rows: The rows that have mismatched values between the template and the supplier.
-            supplier_value_columns: The columns that contain the supplier values.
+        str: The HTML of the names.
     """
-    common_columns = []
-    supplier_value_columns = []
-    mis_mat_rows = []
-
-    for col in template_sheet.iter_cols(max_col=min(template_sheet.max_column, 100)):
-        # Get the column letter of the current column
-        col_letter = get_column_letter(col[0].column)
-        # Get the values of the current column in the template sheet
-        row_values_template = []
-        for cell in col:
-            row_value = cell.value
-            if row_value is not None:
-                # If the cell is rich text, convert to string
-                if isinstance(row_value, CellRichText):
-                    row_values_template.append(" ".join(row_value.as_list()))
-                else:
-                    row_values_template.append(str(row_value))
-        # Get the values of the current column in the supplier sheet
-        row_values_suppliers = []
-        for row_sup in supplier_sheet.iter_rows(
-            min_col=col[0].column,
-            max_col=col[0].column,
-            max_row=min(supplier_sheet.max_row, 300),
-        ):
-            for cell in row_sup:
-                if cell.value is not None:
-                    # If the cell is rich text, convert to string
-                    if isinstance(cell.value, CellRichText):
-                        row_values_suppliers.append(" ".join(cell.value.as_list()))
-                    else:
-                        row_values_suppliers.append(str(cell.value))
-        # If both lists are empty, skip the column
-        if not row_values_template and not row_values_suppliers:
-            continue
-
-        # Fuzzy matching between the string joint from the template and the supplier list
-        temp_row_str = " ".join(row_values_template)
-        suppliers_row_str = " ".join(row_values_suppliers)
-        similarity = fuzz.ratio(temp_row_str, suppliers_row_str)
-
-        if similarity > threshold:
-            common_columns.append(col_letter)
-            if similarity < 100:
-                # Highlight the row in the supplier sheet that does not match the template
-                for row_sup in supplier_sheet.iter_rows(
-                    min_col=col[0].column,
-                    max_col=col[0].column,
-                    max_row=min(supplier_sheet.max_row, 300),
-                ):
-                    for cell in row_sup:
-                        cell_val, cell_coord = cell.value, cell.coordinate
-                        if cell_val is not None:
-                            # Check if the cell is rich text
-                            if isinstance(cell_val, CellRichText):
-                                cell_val = " ".join(cell_val.as_list())
-                            else:
-                                cell_val = str(cell_val)
-                            if cell_val not in row_values_template:
-                                print(
-                                    f"Detected mismatch in row: {cell_coord} for supplier {supplier_sheet.title}. the value is: {cell_val}, the type is: {type(cell_val)}"
-                                )
-                                mis_mat_rows.append(cell_coord)
-                                # Detected mismatch in row, add coordinates of the mismatched row
-
-        else:
-            # This column is not common, can be the column that contains the supplier values
-            if row_values_suppliers:
-                supplier_value_columns.append(col_letter)
+    suppliers_html = ""
+    color_cycle = fill_color_switch()
+    for supplier_name in supplier_names:
+        supplier_color = next(color_cycle)
+        suppliers_html += f'<span style="font-weight: bold; color: #{supplier_color}; margin-right: 10px;">{supplier_name}</span>'
+    return suppliers_html
 
-    return common_columns, mis_mat_rows, supplier_value_columns
 
-
-def separate_sheet_combine(
-    workbook, template_sheets, supplier_sheets_dict, threshold=80
-):
+def get_supplier_sheet_names(template_file, supplier_file, sheet_names):
     """
-    Combine files side by side in the same sheet.
+    Return the supplier sheets answering the selected template sheets, mapped on the
+    probes of both files (see ``map_supplier_sheets``).
 
-    Parameters:
-    workbook (openpyxl.Workbook): The workbook to combine the sheets into.
-    template_sheets (list): A list of template sheets to combine.
-    supplier_sheets_dict (dict): A dictionary mapping supplier names to their
-        corresponding sheets to combine.
-    threshold (int): The threshold for fuzzy matching between the template and
-        supplier sheets.
+    Args:
+        template_file: The template file.
+        supplier_file: The supplier file.
+        sheet_names (list): The selected template sheet names.
 
     Returns:
-    openpyxl.Workbook: The combined workbook with all the sheets.
+        tuple: The name of the supplier sheet of each template sheet (None if the
+            supplier file has no sheet left for it), and the list of the template sheet
+            names matched by position only.
     """
-    st.toast(f"Combining files in progress...", icon="⏳")
-    for idx, template_sheet in enumerate(template_sheets):
-        # copy the template sheet to the workbook
-        target_sheet = workbook.create_sheet(f"{template_sheet.title}"[:30])
-        copy_sheet(template_sheet, target_sheet)
-        for supplier in supplier_sheets_dict:
-            print(f"Processing supplier: {supplier}")
-            # add a new sheet for each supplier
-            supplier_sheet = supplier_sheets_dict[supplier][idx]
-            sheet_title = f"{supplier} {template_sheet.title}"[:30]
-            target_sheet = workbook.create_sheet(sheet_title)
-            copy_sheet(supplier_sheet, target_sheet)
-            # Find matching columns between the template and supplier sheets
-            _, mis_mat_rows, _ = find_matching_cols(
-                template_sheet, supplier_sheet, threshold
-            )
-            # Highlight the mismatched rows
-            if mis_mat_rows:
-                for mis_mat_row in mis_mat_rows:
-                    col_mis, row_mis = openpyxl.utils.cell.coordinate_from_string(
-                        mis_mat_row
-                    )
-                    row_mis = int(row_mis)  # Convert to integer
-                    col_mis = column_index_from_string(col_mis)  # Convert to integer
-                    if col_mis and row_mis:
-                        target_sheet.cell(row=row_mis, column=col_mis).fill = (
-                            PatternFill(
-                                start_color="FAA0A0",
-                                end_color="FAA0A0",
-                                fill_type="solid",
-                            )
-                        )
-    # remove the default sheet
-    if "Sheet" in workbook.sheetnames:
-        workbook.remove(workbook["Sheet"])
-    st.toast("Seperate-Sheet File combined successfully! Ready to download", icon="🎉")
-    return workbook
+    mapping, by_position = map_supplier_sheets(
+        get_workbook_probe(template_file),
+        get_workbook_probe(supplier_file),
+        sheet_names,
+    )
+    return [mapping[name] for name in sheet_names], by_position
 
 
-def create_insertion_queue(common_columns, supplier_value_columns_dict):
+def get_files(
+    supplier_info,
+    sheet_names,
+    doc_type,
+    template_file,
+    read_only=False,
+    keep_columns=None,
+    notify=True,
+):
     """
-    Create a queue of columns to be inserted into the final combined sheet.
+    Read the specified files for each supplier and return the DataFrames and sheets.
 
-    The queue is sorted by column letter and includes a secondary sort by source type.
-    Priority: template columns come before supplier columns with the same letter.
+    The supplier sheets are mapped to the template sheets on their name, header rows
+    and dimensions before loading, so reordered, hidden or extra tabs are handled.
+    Sheets without a match are taken by position, with a warning. A supplier file with
+    fewer visible sheets than selected is skipped.
 
-    Parameters:
-    common_columns (list): A list of common column letters between the template and supplier sheets.
-    supplier_value_columns_dict (dict): A dictionary mapping supplier names to their corresponding
-        columns of values to be inserted.
+    Args:
+        supplier_info (list): List of dictionaries containing supplier information.
+        sheet_names (list): The template sheet names to read the supplier sheets of.
+        doc_type (str): Document type to read (either "RFP" or "Proposal").
+        template_file: The template file the sheet names belong to.
+        read_only (bool): Whether to open the files in read-only mode, for matching only.
+        keep_columns (dict): A dictionary mapping supplier names to the column letters
+            to load for each selected sheet (a set, or None for all columns). Only these
+            sheets and columns of the supplier files are parsed.
+        notify (bool): Whether to show the warnings and the toast, False for a first
+            pass whose messages would be shown again by the second one.
 
     Returns:
-    deque: The insertion queue.
+        tuple: Two dictionaries, the first containing the DataFrames, the second containing the sheets.
     """
-    # Initialize a list to hold queue items
-    queue_items = []
-
-    # Add common columns from the template to the queue
-    for col in common_columns:
-        queue_items.append({"column_letter": col, "source": "template"})
-
-    # Add supplier columns to the queue
-    for supplier, supplier_columns in supplier_value_columns_dict.items():
-        for col in supplier_columns:
-            queue_items.append({"column_letter": col, "source": supplier})
-
-    # Sort the queue by column letter and include a secondary sort by source type
-    # Priority: template columns come before supplier columns with the same letter
-    queue_items.sort(key=lambda x: (x["column_letter"], x["source"] != "template"))
+    dfs_dict = {}
+    worksheets_dict = {}
+    with st.spinner("Reading files..."):
+        for supplier in supplier_info:
+            if not supplier.get(doc_type):
+                # Warn if no file was found
+                if notify:
+                    st.warning(
+                        f"No {doc_type} file found for supplier {supplier['name']}.",
+                        icon="⚠️",
+                    )
+                continue
+            # Map the sheets on the probe, before loading anything
+            supplier_sheet_names, by_position = get_supplier_sheet_names(
+                template_file, supplier[doc_type], sheet_names
+            )
+            unmatched = [
+                name
+                for name, supplier_name in zip(sheet_names, supplier_sheet_names)
+                if supplier_name is None
+            ]
+            if unmatched:
+                if notify:
+                    st.warning(
+                        f"The {doc_type} file of supplier {supplier['name']} has no sheet left for {', '.join(unmatched)}, the supplier is skipped.",
+                        icon="⚠️",
+                    )
+                continue
+            if by_position and notify:
+                st.warning(
+                    f"No sheet of the {doc_type} file of supplier {supplier['name']} looks like {', '.join(by_position)}, the sheets are matched by position.",
+                    icon="⚠️",
+                )
+            dfs_dict[supplier["name"]] = []
+            worksheets_dict[supplier["name"]] = []
+            if keep_columns is not None and supplier["name"] in keep_columns:
+                # Only parse the sheets and columns that will be copied
+                keep_sheets = {}
+                for name, columns in zip(
+                    supplier_sheet_names, keep_columns[supplier["name"]]
+                ):
+                    if columns is None or keep_sheets.get(name, set()) is None:
+                        keep_sheets[name] = None
+                    else:
+                        keep_sheets[name] = keep_sheets.get(name, set()) | columns
+                sup_excel = get_filtered_workbook(
+                    supplier[doc_type],
+                    keep_sheets,
+                    rich_text=st.session_state.richtext_option,
+                    data_only=True,
+                )
+            else:
+                # Read the file (parsed once per upload, shared between doc types)
+                sup_excel = get_workbook(
+                    supplier[doc_type],
+                    rich_text=st.session_state.richtext_option and not read_only,
+                    data_only=True,
+                    read_only=read_only,
+                )
+            # Add the mapped sheets to the dictionary, in the order of the template
+            for name in supplier_sheet_names:
+                worksheets_dict[supplier["name"]].append(sup_excel[name])
 
-    # Convert the sorted list into a deque (queue structure)
-    insertion_queue = deque(queue_items)
+    # Show a toast when done
+    if notify:
+        st.toast("Supplier Files read successfully! 📚", icon="✅")
 
-    return insertion_queue
+    return dfs_dict, worksheets_dict
 
 
-def side_by_side_combine(
-    workbook,
+def get_matched_files(
+    supplier_info,
+    doc_type,
+    template_file,
     template_sheets,
-    supplier_sheets_dict,
-    threshold=80,
-    summary_option=False,
+    schemas=None,
 ):
     """
-    Combine the template sheets with the supplier sheets side by side.
+    Read the supplier files in two phases: match the columns on the plain values, then
+    load the formatting of the supplier value columns only.
+
+    The matches are kept in the session per supplier, so only the suppliers whose file
+    changed since the last consolidation are matched again.
 
-    Parameters:
-    workbook (openpyxl.Workbook): The workbook to combine the sheets into.
-    template_sheets (list): A list of template sheets to combine.
-    supplier_sheets_dict (dict): A dictionary mapping supplier names to their
-        corresponding sheets to combine.
-    threshold (int): The threshold for fuzzy matching between the template and
-        supplier sheets.
+    Args:
+        supplier_info (list): List of dictionaries containing supplier information.
+        doc_type (str): Document type to read (either "RFP" or "Proposal").
+        template_file: The template file the template sheets were loaded from.
+        template_sheets (list): The selected template sheets.
+        schemas (dict): The stored schemas of the template sheets, by sheet name.
 
     Returns:
-    openpyxl.Workbook: The combined workbook with all the sheets.
+        tuple: The sheets of each supplier and the column matches of each supplier
+            (see ``match_supplier_sheets``).
     """
-    st.toast(f"Combining files in progress...", icon="⏳")
-
-    # Iterate over each template sheet
-    for idx, template_sheet in enumerate(template_sheets):
-        print(f"Processing template sheet: {template_sheet.title}")
+    if "match_cache" not in st.session_state:
+        st.session_state.match_cache = {}
+    match_cache = st.session_state.match_cache
+    sheet_names = [sheet.title for sheet in template_sheets]
+    template_key = (get_file_key(template_file), tuple(sheet_names))
+    matches = {}
+    to_match = []
+    for supplier in supplier_info:
+        if not supplier.get(doc_type):
+            continue
+        cache_key = (template_key, get_file_key(supplier[doc_type]))
+        cached = match_cache.get((doc_type, supplier["name"]))
+        if cached and cached[0] == cache_key:
+            matches[supplier["name"]] = cached[1]
+        else:
+            to_match.append(supplier)
 
-        # Create a new sheet in the workbook for each template sheet
-        target_sheet_template = workbook.create_sheet(
-            f"{template_sheet.title} Template"[:30]
+    if to_match:
+        # The second pass below shows the warnings of both passes
+        _, plain_sheets_dict = get_files(
+            to_match, sheet_names, doc_type, template_file, read_only=True, notify=False
         )
-        copy_sheet(template_sheet, target_sheet_template)
-
-        # Create a new sheet in the workbook for side-by-side comparison
-        target_sheet = workbook.create_sheet(f"Combined {template_sheet.title}"[:30])
-
-        # Initialize variables to store column data and mismatched rows
-        common_columns = (
-            []
-        )  # List of common column letters between the template and supplier sheets
-        uncommon_columns = (
-            []
-        )  # List of columns that are not common between the template and supplier sheets
-        mis_mat_rows_dict = (
-            {}
-        )  # Dictionary mapping supplier names to their corresponding mismatched rows
-        supplier_value_columns_dict = (
-            {}
-        )  # Dictionary mapping supplier names to their corresponding columns of values
-        supplier_colors = (
-            {}
-        )  # Dictionary mapping supplier names to their corresponding fill colors
-        color_cycle = fill_color_switch()
-
-        # Iterate over each supplier and process their sheet
-        for supplier in supplier_sheets_dict:
-            if supplier not in supplier_colors:
-                supplier_colors[supplier] = next(color_cycle)
-
-            supplier_sheet = supplier_sheets_dict[supplier][idx]
-            com_columns, mis_mat_rows, supplier_value_columns = find_matching_cols(
-                template_sheet, supplier_sheet, threshold
-            )
-
-            # Add matching columns to the final list (ensure no duplicates)
-            common_columns.extend(
-                [col for col in com_columns if col not in common_columns]
+        with st.spinner("Matching columns..."):
+            new_matches = match_supplier_sheets(
+                template_sheets, plain_sheets_dict, schemas=schemas
             )
-            uncommon_columns.extend(
-                [col for col in supplier_value_columns if col not in uncommon_columns]
+        for supplier in to_match:
+            if supplier["name"] not in new_matches:
+                # Skipped, no sheet matches
+                continue
+            cache_key = (template_key, get_file_key(supplier[doc_type]))
+            match_cache[(doc_type, supplier["name"])] = (
+                cache_key,
+                new_matches[supplier["name"]],
             )
+        matches.update(new_matches)
+    # Keep the order of the suppliers
+    matches = {
+        supplier["name"]: matches[supplier["name"]]
+        for supplier in supplier_info
+        if supplier["name"] in matches
+    }
+    keep_columns = {
+        supplier: [set(value_columns) for _, _, value_columns in supplier_matches]
+        for supplier, supplier_matches in matches.items()
+    }
+    _, sheets_dict = get_files(
+        supplier_info, sheet_names, doc_type, template_file, keep_columns=keep_columns
+    )
+    return sheets_dict, matches
 
-            # Store mismatched rows and value columns for the supplier
-            mis_mat_rows_dict[supplier] = mis_mat_rows
-            supplier_value_columns_dict[supplier] = supplier_value_columns
 
-        # Copy common columns from template to target sheet
-        queue = create_insertion_queue(common_columns, supplier_value_columns_dict)
-        if not queue:
-            print("No columns to process for this template sheet.")
-            continue
+def sync_watch_folder():
+    """
+    Add the new and changed response files of the watch folder to the suppliers.
 
-        for i, item in enumerate(queue):
-            col_letter = item["column_letter"]
-            source = item["source"]
-            header_fill_color = None
-            mis_mat_rows = None
+    The supplier is inferred from the file name, and the document type from the file
+    name too when the event uses separate files. The folder must be inside the watch
+    root (see ``resolve_watch_folder``).
 
-            # Determine the source sheet
-            if source == "template":
-                source_sheet = template_sheet
-            else:
-                source_sheet = supplier_sheets_dict[source][idx]
-                header_fill_color = supplier_colors[source]
-                mis_mat_rows = mis_mat_rows_dict[source]
+    Returns:
+        list: The names of the suppliers whose files were added or changed.
+    """
+    folder = resolve_watch_folder(st.session_state.get("watch_folder"))
+    if not folder or "event_manifest" not in st.session_state:
+        return []
+    previous = st.session_state.get("watch_state", {})
+    current = scan_watch_folder(folder, previous)
+    st.session_state.watch_state = current
+    changed_paths = get_changed_files(previous, current)
+    if not changed_paths:
+        return []
+
+    doc_types = st.session_state.doc_types
+    manifest = st.session_state.event_manifest
+    # Drop the supplier slots left empty in the configuration
+    suppliers = [
+        supplier
+        for supplier in manifest["suppliers"]
+        if supplier["name"] or any(supplier["roles"].values())
+    ]
+    manifest["suppliers"] = suppliers
+    changed_suppliers = []
+    for path in sorted(changed_paths):
+        name = infer_supplier_name(path, [supplier["name"] for supplier in suppliers])
+        doc_type = infer_doc_type(path, doc_types)
+        if st.session_state.event_option == "In a Single File" or doc_type is None:
+            file_doc_types = doc_types
+        else:
+            file_doc_types = [doc_type]
+        supplier = next(
+            (sup for sup in suppliers if sup["name"].lower() == name.lower()), None
+        )
+        new = supplier is None
+        if new:
+            supplier = new_supplier(name, doc_types)
+            suppliers.append(supplier)
+        try:
+            set_supplier_file(manifest, supplier, file_doc_types, path)
+        except (zipfile.BadZipFile, KeyError) as e:
+            print(f"Watch folder: {os.path.basename(path)} cannot be read, skipped: {e}")
+            if new:
+                suppliers.remove(supplier)
+            continue
+        print(f"Watch folder: {os.path.basename(path)} is a response from {name}")
+        if supplier["name"] not in changed_suppliers:
+            changed_suppliers.append(supplier["name"])
+    prune_manifest(manifest)
+    return changed_suppliers
 
-            # Get column indices
-            col_idx_source = column_index_from_string(col_letter)
-            col_idx_target = i + 1  # Insert in the order of the queue
 
-            # Copy column
-            end_row_write = copy_column(
-                source_sheet, target_sheet, col_idx_source, col_idx_target, mis_mat_rows
-            )
-            # format the header cell for the supplier if there are mismatched rows
-            if header_fill_color:
-                # header cell is the first bold cell in the column
-                header_cell = target_sheet.cell(row=1, column=col_idx_target)
-                header_cell.fill = PatternFill(
-                    fill_type="solid", start_color=header_fill_color
-                )
-                # change the value of the header cell to include the supplier name
-                if header_cell.value:
-                    header_cell.value = f"{source}  {header_cell.value}"
-                else:
-                    header_cell.value = f"{source}"
-
-                header_cell.font = Font(name="Arial", size=15, bold=True)
-                header_cell.alignment = Alignment(
-                    horizontal="center", vertical="center"
-                )
-                # apply color formatting to the data rows
-                color_to_avoid = "FAA0A0"
-                for row in range(2, end_row_write + 1):
-                    cell_to_fill = target_sheet.cell(row=row, column=col_idx_target)
-                    # only fill if the fill color is not FAA0A0
-                    if (
-                        cell_to_fill.fill
-                        and cell_to_fill.fill.start_color
-                        and cell_to_fill.fill.start_color.rgb
-                    ):
-                        existing_color = str(cell_to_fill.fill.start_color.rgb)
-                    else:
-                        existing_color = ""
-
-                    # Fill only if the cell's color does not match the target color
-                    if color_to_avoid not in existing_color:
-                        cell_to_fill.fill = PatternFill(
-                            fill_type="solid",
-                            start_color=header_fill_color,
-                            end_color=header_fill_color,
-                        )
-                # Add summary if requested
-                if summary_option:
-                    source_text = " "
-                    for row in target_sheet.iter_rows(
-                        min_row=2,
-                        max_row=end_row_write,
-                        min_col=col_idx_target,
-                        max_col=col_idx_target,
-                    ):
-                        for cell in row:
-                            # check if the cell is rich text
-                            if cell.value is not None:
-                                if isinstance(cell.value, CellRichText):
-                                    source_text += " ".join(cell.value.as_list())
-                                else:
-                                    source_text += " " + str(cell.value) + " "
-                    if len(source_text.split()) > 5:
-                        summary = summarize_column_simple(source_text)
-                        target_sheet.cell(
-                            row=end_row_write + 1,
-                            column=col_idx_target,
-                            value="Summary:",
-                        )
-                        summary_cell = target_sheet.cell(
-                            row=end_row_write + 2, column=col_idx_target
-                        )
-                        summary_cell.value = summary
-                        summary_cell.font = Font(name="Arial", size=12, bold=False)
-                        summary_cell.fill = PatternFill(
-                            fill_type="solid", start_color="BFFFFF"
-                        )
-                        summary_cell.alignment = Alignment(
-                            horizontal="center", vertical="center", wrap_text=True
-                        )
+@st.fragment(run_every=WATCH_INTERVAL)
+def show_watch_status():
+    """
+    Check the watch folder in the background and rerun the page when a file changed.
+    """
+    folder = resolve_watch_folder(st.session_state.watch_folder)
+    if folder is None:
+        return
+    if get_changed_files(
+        st.session_state.get("watch_state", {}),
+        scan_watch_folder(folder, st.session_state.get("watch_state")),
+    ):
+        st.rerun()
+    st.caption(
+        f"📂 Watching `{folder}` for supplier responses"
+        + (", consolidating automatically." if st.session_state.watch_auto else ".")
+    )
 
-        # Copy the template sheet attributes to the target sheet
-        # copy_sheet_attributes(template_sheet, target_sheet)
-        st.toast(f"{template_sheet.title} consolidated!", icon="✔️")
-    # Remove the default sheet if it exists
-    if "Sheet" in workbook.sheetnames:
-        workbook.remove(workbook["Sheet"])
 
-    # Final success toast
-    st.toast("Side-By-Side File combined successfully! Ready to download", icon="🎉")
+def show_sheet_check(suppliers, template_probe, sheet_names, doc_type):
+    """
+    Warn about supplier files whose sheets do not line up with the selected template sheets.
 
-    return workbook
+    Args:
+        suppliers (list): The suppliers of the event with their files.
+        template_probe (list): The sheet metadata of the template (see ``probe_workbook``).
+        sheet_names (list): The selected template sheet names.
+        doc_type (str): The document type of the files to check.
+    """
+    for supplier in suppliers:
+        supplier_probe = get_workbook_probe(supplier[doc_type])
+        check = check_supplier_sheets(template_probe, supplier_probe, sheet_names)
+        messages = []
+        if check["missing"]:
+            messages.append(f"missing sheet(s): {', '.join(check['missing'])}")
+        if check["hidden"]:
+            messages.append(f"hidden sheet(s): {', '.join(check['hidden'])}")
+        if check["extra"]:
+            messages.append(f"extra sheet(s): {', '.join(check['extra'])}")
+        for template_sheet, supplier_sheet in check["misaligned"]:
+            if supplier_sheet is None:
+                messages.append(f"no sheet to match with **{template_sheet}**")
+            else:
+                messages.append(
+                    f"**{template_sheet}** would be matched with **{supplier_sheet}**"
+                    + (" by position" if template_sheet in check["by_position"] else "")
+                )
+        if messages:
+            st.warning(
+                f"{doc_type} file of supplier **{supplier['name']}**: "
+                + "; ".join(messages),
+                icon="⚠️",
+            )
 
 
-# Function to summarize text using Sumy
-def summarize_column_simple(text: str, sentence_count: int = 3) -> str:
+@st.cache_resource
+def get_download_server():
     """
-    Summarize the given text using Sumy's Latent Semantic Analysis (LSA) summarizer.
-
-    Args:
-        text (str): The text to be summarized.
-        sentence_count (int, optional): The number of sentences in the summary. Defaults to 3.
+    Start the download server shared by all sessions, if enabled with the
+    ``RFPDOCSUM_DOWNLOAD_PORT`` environment variable.
 
     Returns:
-        str: The summary of the text.
+        ThreadingHTTPServer: The download server, or None if it is disabled or cannot
+            be started (the files are then served with ``st.download_button``).
     """
+    if not DOWNLOAD_PORT:
+        return None
     try:
-        # Create a Sumy parser from the text
-        parser = PlaintextParser.from_string(text, Tokenizer("english"))
+        return start_download_server(host=DOWNLOAD_HOST, port=int(DOWNLOAD_PORT))
+    except OSError as e:
+        print(f"Download server not available, serving downloads from memory: {e}")
+        return None
 
-        # Create a Sumy LSA summarizer
-        summarizer = LsaSummarizer()
 
-        # Set the stop words for the summarizer to English
-        summarizer.stop_words = "english"
+def get_download_url(server, download):
+    """
+    Return the URL of a registered download.
+
+    The ``RFPDOCSUM_DOWNLOAD_URL`` environment variable sets the base URL of the download
+    server (e.g. behind a reverse proxy or on HTTPS). By default, the address the server
+    listens on is used, or the host used to reach the app if it listens on all
+    interfaces.
 
-        # Summarize the text
-        summary = summarizer(parser.document, sentence_count)
+    Args:
+        server (ThreadingHTTPServer): The download server.
+        download (dict): The download reference returned by ``register_download``.
 
-        # Join the summary sentences into a single string
-        return " ".join(str(sentence) for sentence in summary)
-    except Exception as e:
-        # Return an error message if there's an exception
-        return f"Error summarizing text: {e}"
+    Returns:
+        str: The URL of the file.
+    """
+    base_url = os.environ.get("RFPDOCSUM_DOWNLOAD_URL")
+    if not base_url:
+        host, port = server.server_address[:2]
+        if host in ("", "0.0.0.0", "::"):
+            host = st.context.headers.get("Host", "localhost").split(":")[0]
+        base_url = f"http://{host}:{port}"
+    return f"{base_url.rstrip('/')}/downloads/{download['token']}"
 
 
-# function to save the consolidated file and let it be downloadable by the user
-def save_consolidated_file(consolidated):
+def save_download(consolidated, doc_type, key, suffix="consolidated"):
     """
-    Save the consolidated file to a BytesIO object and return it for downloading.
+    Write the consolidated workbook to the download folder and keep a reference to it in
+    the session state, replacing the previous file of the session.
 
     Args:
         consolidated (openpyxl.Workbook): The consolidated workbook.
+        doc_type (str): The document type of the workbook.
+        key (str): The session state key of the download reference.
+        suffix (str): The end of the downloaded file name.
+    """
+    _, extension, _ = OUTPUT_FORMATS[st.session_state.output_format]
+    cleanup_downloads()
+    path = save_consolidated_file(
+        consolidated,
+        st.session_state.output_format,
+        st.session_state.compression_level,
+        path=new_download_path(extension),
+    )
+    replace_download(path, doc_type, key, suffix)
 
-    Returns:
-        io.BytesIO: The BytesIO object containing the workbook.
+
+def replace_download(path, doc_type, key, suffix="consolidated"):
+    """
+    Make a file of the download folder the current download of the session, replacing
+    the previous file.
+
+    Args:
+        path (str): The path of the file, in the format of the output options.
+        doc_type (str): The document type of the file.
+        key (str): The session state key of the download reference.
+        suffix (str): The end of the downloaded file name.
     """
-    # Create a BytesIO object to store the workbook
-    file_stream = io.BytesIO()
+    _, extension, mime = OUTPUT_FORMATS[st.session_state.output_format]
+    server = get_download_server()
+    if st.session_state.get(key):
+        remove_download(server, st.session_state[key])
+    st.session_state[key] = register_download(
+        server, path, f"{event_name}_{doc_type}_{suffix}.{extension}", mime
+    )
 
-    # Save the workbook to the BytesIO object
-    consolidated.save(file_stream)
 
-    # Reset the file pointer to the beginning of the BytesIO object
-    file_stream.seek(0)
+def save_preview(consolidated, key):
+    """
+    Write the values of each consolidated sheet to the download folder for the in-app
+    preview, replacing the previous preview files of the session.
 
-    return file_stream
+    Args:
+        consolidated (openpyxl.Workbook): The consolidated workbook.
+        key (str): The session state key of the preview.
+    """
+    preview = {}
+    for sheet in consolidated.worksheets:
+        path = new_download_path("arrow")
+        rows = write_sheet_preview(sheet, path)
+        preview[sheet.title] = {"path": path, "rows": rows}
+    replace_preview(preview, key)
 
 
-def append_logo(workbook, image_path, image_scale=0.8):
+def replace_preview(preview, key):
     """
-    Append the logo to each sheet in the workbook.
+    Make the given preview files the current preview of the session, deleting the
+    previous ones.
 
     Args:
-        workbook (openpyxl.Workbook): The workbook to append the logo to.
-        image_path (str): The path to the image file. If None or empty, no image is appended.
-        image_scale (float): The scale of the image. Default is 0.8.
+        preview (dict): A dictionary mapping sheet titles to their preview file path and
+            row count, or None.
+        key (str): The session state key of the preview.
     """
-    # get all the sheet names
-    sheet_names = workbook.sheetnames
-    # get all the worksheets
-    worksheets = [workbook[sheet_name] for sheet_name in sheet_names]
-    for worksheet in worksheets:
-        # add logo to the first cell of the worksheet
-        if image_path:
-            # import the Image class from openpyxl.drawing.image
-            from openpyxl.drawing.image import Image
-
-            # create an Image object
-            logo = Image(image_path)
-            # scale the image
-            logo.width = int(logo.width * image_scale)
-            logo.height = int(logo.height * image_scale)
-            # add the image to the worksheet
-            worksheet.add_image(logo, "A1")
-
-    return workbook
-
-
-def copy_column(
-    source_sheet, target_sheet, source_col_idx, target_col_idx, mis_mat_rows=None
+    for sheet_preview in (st.session_state.get(key) or {}).values():
+        try:
+            os.remove(sheet_preview["path"])
+        except OSError:
+            pass
+    st.session_state[key] = preview
+
+
+def get_consolidation_key(
+    template_file, suppliers, doc_type, sheet_names, sheet_indexes, options
 ):
     """
-    Copy a column from the source sheet to the target sheet.
+    Return the result cache key of a consolidation with the current files and options.
 
     Args:
-        source_sheet (openpyxl.Worksheet): The source sheet.
-        target_sheet (openpyxl.Worksheet): The target sheet.
-        source_col_idx (int): The column index of the source sheet.
-        target_col_idx (int): The column index of the target sheet.
-        mis_mat_rows (list): The list of rows that have mismatched values between the source and target sheets.
+        template_file: The template file.
+        suppliers (list): The suppliers of the event with their files.
+        doc_type (str): The document type to consolidate.
+        sheet_names (list): The selected template sheet names.
+        sheet_indexes (list): The selected sheet indexes.
+        options (dict): The options of the document type (mode, summary_option).
+
     Returns:
-        int: The row index of the last row copied.
+        str: The key (see ``get_result_key``).
     """
-    source_col_letter = get_column_letter(source_col_idx)
-    target_col_letter = get_column_letter(target_col_idx)
-
-    # Initialize target_row at the first row of the target sheet
-    hidden_count = 0
-    end_row_idx = 500  # default value
-    # Track merged cells in the source column
-    # quick check the first 60 rows to see if there are any values, if all is empty, break the loop
-    max_rows_to_check = min(source_sheet.max_row, 60)
-    check_empty = 0
-    for row in range(1, max_rows_to_check + 1):
-        source_cell = source_sheet.cell(row=row, column=source_col_idx)
-        if source_cell.value not in (
-            None,
-            "",
-        ):  # If a non-empty cell is found, exit early
-            break
-        check_empty += 1
-
-    # If all rows are empty, exit the function
-    if check_empty == max_rows_to_check:
-        return end_row_idx
-    target_row = 1
-    merged_dict = generate_merged_dict(source_sheet)
-    # Iterate over each row in the source sheet
-    empty_rows_cont = 0
-    if mis_mat_rows:
-        # covert to a list of tuples for easy comparison
-        mis_mat_rows = [coordinate_from_string(row) for row in mis_mat_rows]
-    for row in range(1, min(source_sheet.max_row + 1, 500)):
-        source_cell = source_sheet.cell(row=row, column=source_col_idx)
-        target_cell = target_sheet.cell(row=target_row, column=target_col_idx)
-        if source_cell.value is None or source_cell.value == "":
-            empty_rows_cont += 1
-            if empty_rows_cont > 80:
-                end_row_idx = row - empty_rows_cont + 1
-
-                break
-        else:
-            empty_rows_cont = 0
-        # Skip hidden rows in the source sheet
-        if getattr(source_sheet.row_dimensions[row], "hidden", False):
-            hidden_count += 1
-            if hidden_count > 60:
+    supplier_hashes = {
+        supplier["name"]: get_content_hash(supplier[doc_type])
+        for supplier in suppliers
+        if supplier.get(doc_type)
+    }
+    return get_result_key(
+        get_content_hash(template_file),
+        supplier_hashes,
+        {
+            "doc_type": doc_type,
+            "sheets": list(sheet_names),
+            "sheet_indexes": list(sheet_indexes),
+            "output_format": st.session_state.output_format,
+            "compression_level": st.session_state.compression_level,
+            "rich_text": st.session_state.richtext_option,
+            "threshold": 80,
+            **options,
+        },
+    )
 
-                end_row_idx = row - empty_rows_cont + 1
 
-                break
-        else:
-            hidden_count = 0
+def load_cached_result(result_key, doc_type, key, preview_key):
+    """
+    Use the stored result of an identical consolidation, if any.
 
-        source_cell_value = copy(source_cell.value)
-        target_cell.value = source_cell_value
-        target_cell.data_type = copy(source_cell.data_type)
+    Args:
+        result_key (str): The key returned by ``get_consolidation_key``.
+        doc_type (str): The document type of the consolidation.
+        key (str): The session state key of the download reference.
+        preview_key (str): The session state key of the preview.
 
-        try:
-            if source_cell.has_style:
-                target_cell.font = copy(source_cell.font)
-                target_cell.border = copy(source_cell.border)
-                target_cell.fill = copy(source_cell.fill)
-                target_cell.number_format = copy(source_cell.number_format)
-                target_cell.protection = copy(source_cell.protection)
-                target_cell.alignment = copy(source_cell.alignment)
-        except Exception as e:
-            print(f"Error copying styles for cell {source_cell.coordinate}: {e}")
-
-        if source_cell.hyperlink:
-            target_cell.hyperlink = source_cell.hyperlink
-
-        if source_cell.comment:
-            target_cell.comment = copy(source_cell.comment)
-        if mis_mat_rows:
-            col_s, row_s = coordinate_from_string(source_cell.coordinate)
-            for mis_row in mis_mat_rows:
-                if mis_row[1] == row_s:
-                    # conver mis_row[0] to column index
-                    col_mis_idx = column_index_from_string(mis_row[0])
-                    if (
-                        source_col_idx - col_mis_idx == 1
-                    ):  # meaning the mismatched column is the previous column
-                        target_cell.fill = PatternFill(
-                            start_color="FAA0A0", end_color="FAA0A0", fill_type="solid"
-                        )
+    Returns:
+        bool: True if a stored result was found and is now the current download.
+    """
+    _, extension, _ = OUTPUT_FORMATS[st.session_state.output_format]
+    cached = get_cached_result(result_key, extension)
+    if cached is None:
+        return False
+    # Link the stored files into the download folder, which cleans up its own files
+    cleanup_downloads()
+    path = new_download_path(extension)
+    link_or_copy(cached["path"], path)
+    replace_download(path, doc_type, key)
+    preview = None
+    if cached["preview"]:
+        preview = {}
+        for title, sheet_preview in cached["preview"].items():
+            preview_path = new_download_path("arrow")
+            link_or_copy(sheet_preview["path"], preview_path)
+            preview[title] = {"path": preview_path, "rows": sheet_preview["rows"]}
+    replace_preview(preview, preview_key)
+    set_search_index(doc_type, cached["search"])
+    return True
+
+
+def set_search_index(doc_type, index):
+    """
+    Keep the search index of the supplier responses of a document type in the session.
 
-        target_row += 1
+    Args:
+        doc_type (str): The document type.
+        index (dict): The search index (see ``new_search_index``), or None.
+    """
+    if "search_index" not in st.session_state:
+        st.session_state.search_index = {}
+    if index:
+        st.session_state.search_index[doc_type] = index
+    else:
+        st.session_state.search_index.pop(doc_type, None)
 
-    if end_row_idx == 500:
-        end_row_idx = target_row - empty_rows_cont + 1
 
-    # Perform merging of cells after copying data
-    merge_columns_in_target_sheet(
-        target_sheet, merged_dict, source_col_idx, target_col_idx
-    )
+def store_consolidation(result_key, doc_type, key, preview_key):
+    """
+    Store the current download, preview and search index of the session in the result
+    cache.
 
-    # Copy column width and hidden property
-    source_dim = source_sheet.column_dimensions[source_col_letter]
-    target_dim = target_sheet.column_dimensions[target_col_letter]
-    if hasattr(source_dim, "width"):
-        target_dim.width = source_dim.width
-    if hasattr(source_dim, "hidden"):
-        target_dim.hidden = source_dim.hidden
+    Args:
+        result_key (str): The key returned by ``get_consolidation_key``.
+        doc_type (str): The document type of the consolidation.
+        key (str): The session state key of the download reference.
+        preview_key (str): The session state key of the preview.
+    """
+    if st.session_state.get(key):
+        _, extension, _ = OUTPUT_FORMATS[st.session_state.output_format]
+        store_result(
+            result_key,
+            extension,
+            st.session_state[key]["path"],
+            st.session_state.get(preview_key),
+            st.session_state.get("search_index", {}).get(doc_type),
+        )
 
-    return end_row_idx
 
+def show_preview(preview, supplier_names, key):
+    """
+    Show a paginated preview of the consolidated sheets, with the supplier columns
+    filtered by supplier. Only the rows of the current page are read from disk.
 
-# function to copy the sheet from source to target
-def copy_sheet(source_sheet, target_sheet):
+    Args:
+        preview (dict): The preview written by ``save_preview``.
+        supplier_names (list): The supplier names.
+        key (str): A prefix for the widget keys.
     """
-    Copy all columns and sheet-level attributes from the source sheet to the target sheet.
+    with st.expander("🔍 Preview"):
+        sheet_title = st.selectbox("Sheet", list(preview), key=f"{key}_sheet")
+        sheet_preview = preview[sheet_title]
+        if not os.path.exists(sheet_preview["path"]):
+            st.warning("The preview has expired, please consolidate again.")
+            return
+        headers = open_preview(sheet_preview["path"]).column_names
+        supplier_columns = get_supplier_columns(headers, supplier_names)
+        chosen_suppliers = st.multiselect(
+            "Suppliers",
+            supplier_names,
+            default=supplier_names,
+            key=f"{key}_suppliers",
+        )
+        chosen = set(supplier_columns[None])
+        for supplier in chosen_suppliers:
+            chosen.update(supplier_columns[supplier])
+        columns = [header for header in headers if header in chosen]
+
+        col1, col2 = st.columns(2)
+        page_size = col1.selectbox(
+            "Rows per page", (50, 100, 500), key=f"{key}_page_size"
+        )
+        n_pages = max(1, -(-sheet_preview["rows"] // page_size))
+        page = col2.number_input(
+            f"Page (of {n_pages})",
+            min_value=1,
+            max_value=n_pages,
+            value=1,
+            key=f"{key}_page",
+        )
+        st.dataframe(
+            read_preview_page(sheet_preview["path"], page, page_size, columns),
+            use_container_width=True,
+        )
+
+
+def show_download(download):
+    """
+    Show the download button of a consolidated file.
+
+    The file is served from its open handle with ``st.download_button``, or streamed
+    from disk by the download server when it is enabled.
 
     Args:
-        source_sheet (openpyxl.Worksheet): The sheet to copy from.
-        target_sheet (openpyxl.Worksheet): The sheet to copy to.
+        download (dict): The download reference returned by ``register_download``.
     """
-    hidden_count = 0  # Counter to track consecutive hidden columns
-    for col in source_sheet.iter_cols(max_col=min(source_sheet.max_column, 100)):
-        col_idx = col[0].column
-        col_letter = get_column_letter(col_idx)
-
-        # Check if the column is hidden
-        if source_sheet.column_dimensions[col_letter].hidden:
-            hidden_count += 1
-            if (
-                hidden_count > 60
-            ):  # Stop copying if more than 60 consecutive columns are hidden
-                break
-            continue
+    label = f"💾 Download {download['file_name']}"
+    server = get_download_server()
+    if not os.path.exists(download["path"]):
+        st.warning("The consolidated file has expired, please consolidate again.")
+    elif server is not None and download["token"] in server.downloads:
+        st.link_button(label, get_download_url(server, download))
+    else:
+        with open(download["path"], "rb") as file:
+            st.download_button(
+                label,
+                data=file,
+                file_name=download["file_name"],
+                mime=download["mime"],
+            )
 
-        # Copy the column to the same index in the target
-        _ = copy_column(source_sheet, target_sheet, col_idx, col_idx)
 
-    # Copy sheet-level attributes
-    copy_sheet_attributes(source_sheet, target_sheet)
+@st.fragment
+def output_options():
+    """
+    Show the output options. Their widgets only rerun this section of the page.
+    """
+    with st.expander("💾 Output options"):
+        st.selectbox(
+            "Output format",
+            list(OUTPUT_FORMATS),
+            format_func=lambda output_format: OUTPUT_FORMATS[output_format][0],
+            key="output_format",
+            help="Values-only, CSV and Parquet outputs skip the formatting and charts and are much faster to save and download.",
+        )
+        st.slider(
+            "Compression level",
+            min_value=0,
+            max_value=9,
+            value=6,
+            key="compression_level",
+            help="Lower levels save faster but produce larger files.",
+        )
+        st.checkbox(
+            "Load only the matched supplier columns",
+            value=True,
+            key="two_phase_option",
+            help="Match the columns on the plain cell values first, then load the formatting of the supplier answer columns only. Much faster on large supplier files.",
+        )
 
 
-def copy_sheet_attributes(source_sheet, target_sheet):
+@st.fragment
+def pricing_section(suppliers, template_pri, doc_type1):
     """
-    Copy various attributes from a source sheet to a target sheet.
+    Show the Pricing consolidation. Its widgets only rerun this section of the page.
 
     Args:
-        source_sheet (openpyxl.Worksheet): The sheet to copy attributes from.
-        target_sheet (openpyxl.Worksheet): The sheet to copy attributes to.
+        suppliers (list): The suppliers of the event with their files.
+        template_pri: The Pricing template file.
+        doc_type1 (str): The Pricing document type.
     """
-    # Copy basic sheet properties
-    target_sheet.sheet_format = copy(source_sheet.sheet_format)
-    target_sheet.sheet_properties = copy(source_sheet.sheet_properties)
-    target_sheet.page_margins = copy(source_sheet.page_margins)
-    target_sheet.page_setup = copy(source_sheet.page_setup)
-    target_sheet.print_options = copy(source_sheet.print_options)
-    target_sheet.auto_filter = copy(source_sheet.auto_filter)
-    target_sheet.print_area = source_sheet.print_area
-    target_sheet.freeze_panes = source_sheet.freeze_panes
+    st.markdown("### :green[For **Pricing**]")
+    st.markdown(
+        "***Note:** Summary tab and chart for Pricing only works in **Side by Side** consolidation.*"
+    )
 
-    # Copy the row heights
-    for rn, source_row in source_sheet.row_dimensions.items():
-        target_sheet.row_dimensions[rn].ht = copy(source_row.ht)
+    probe_template_pri = get_workbook_probe(template_pri)
+    all_sheets_pri = [sheet["name"] for sheet in probe_template_pri]
 
-    # Copy merged cell ranges
-    for merged_range in source_sheet.merged_cells.ranges:
-        target_sheet.merge_cells(str(merged_range))
+    pricing_sheets_list = st.multiselect(
+        "Please select Pricing sheet(s) to consolidate",
+        all_sheets_pri,
+        all_sheets_pri,
+        key="pricing_sheets",
+    )
+    show_sheet_check(suppliers, probe_template_pri, pricing_sheets_list, doc_type1)
 
-    # Copy sheet protection settings
-    target_sheet.protection = copy(source_sheet.protection)
+    chosen_sheets_pri_idx = [all_sheets_pri.index(sheet) for sheet in pricing_sheets_list]
 
+    if "pri_comb_mode" not in st.session_state:
+        st.session_state.pri_comb_mode = "Side by Side"
 
-def get_files(supplier_info, sheet_indexes, doc_type):
-    """
-    Read the specified files for each supplier and return the DataFrames and sheets.
 
-    Args:
-        supplier_info (list): List of dictionaries containing supplier information.
-        sheet_indexes (list): List of sheet indexes to read (0-indexed).
-        doc_type (str): Document type to read (either "RFP" or "Proposal").
+    st.radio(
+        "Please select consolidation method:",
+        ("Side by Side", "Separate Sheets"),
+        index=0,
+        key="pri_comb_mode",
+    )
+    st.checkbox(
+        "Line item price statistics",
+        value=True,
+        key="price_stats_option",
+        help="Add a sheet with the min, max and median bid of each line item, the gap of each supplier to the median, the lowest bidder and the outlier bids. Side by Side mode only.",
+    )
 
-    Returns:
-        tuple: Two dictionaries, the first containing the DataFrames, the second containing the sheets.
-    """
-    dfs_dict = {}
-    worksheets_dict = {}
-    with st.spinner("Reading files..."):
-        for supplier in supplier_info:
-            if supplier.get(doc_type):
-                dfs_dict[supplier["name"]] = []
-                worksheets_dict[supplier["name"]] = []
+    consolidate_pri = st.button(
+        "Consolidate", key="consolidate_pri"
+    ) or st.session_state.pop("auto_consolidate_p", False)
+    if consolidate_pri:
+        # Identical requests reuse the stored result instead of consolidating again
+        result_key_pri = get_consolidation_key(
+            template_pri,
+            suppliers,
+            doc_type1,
+            pricing_sheets_list,
+            chosen_sheets_pri_idx,
+            {
+                "mode": st.session_state.pri_comb_mode,
+                "summary_option": False,
+                "price_stats": st.session_state.price_stats_option,
+            },
+        )
+        if load_cached_result(result_key_pri, doc_type1, "consolidated_p", "preview_p"):
+            consolidate_pri = False
+            st.success("Pricing sheets consolidated successfully!", icon="✅")
+
+    if consolidate_pri:
+        # Wait for a free slot of the server, shared by all the sessions
+        with consolidation_slot(
+            template_pri, suppliers, doc_type1, pricing_sheets_list
+        ) as workers:
+            consolidated_pri = openpyxl.Workbook()
+            consolidated_pri.remove(consolidated_pri.active)
+            wb_template_pri = get_workbook(
+                template_pri, rich_text=st.session_state.richtext_option, data_only=True
+            )
+            template_sheets_pri = [
+                wb_template_pri[sheet] for sheet in pricing_sheets_list
+            ]
+            # Structure of the template, analyzed once per template and stored on disk
+            schemas_pri = get_template_schemas(template_pri, template_sheets_pri)
+            matches_pri = None
+            if not st.session_state.two_phase_option:
+                dfs_pri_dict, sheets_pri_dict = get_files(
+                    suppliers, pricing_sheets_list, doc_type1, template_pri
+                )
+            elif st.session_state.pri_comb_mode == "Side by Side":
+                sheets_pri_dict, matches_pri = get_matched_files(
+                    suppliers,
+                    doc_type1,
+                    template_pri,
+                    template_sheets_pri,
+                    schemas_pri,
+                )
             else:
-                # Warn if no file was found
-                st.warning(
-                    f"No {doc_type} file found for supplier {supplier['name']}.",
-                    icon="⚠️",
+                # Separate sheets copy whole sheets, only skip the sheets that are not selected
+                dfs_pri_dict, sheets_pri_dict = get_files(
+                    suppliers,
+                    pricing_sheets_list,
+                    doc_type1,
+                    template_pri,
+                    keep_columns={
+                        supplier["name"]: [None] * len(pricing_sheets_list)
+                        for supplier in suppliers
+                    },
                 )
-                continue
-            # Read the file
-            sup_excel = load_workbook(
-                supplier[doc_type],
-                rich_text=st.session_state.richtext_option,
-                data_only=True,
+            with st.spinner("Processing... Please wait."):
+                if st.session_state.pri_comb_mode == "Side by Side":
+                    consolidated_pri = side_by_side_combine(
+                        consolidated_pri,
+                        template_sheets_pri,
+                        sheets_pri_dict,
+                        workers=workers,
+                        matches=matches_pri,
+                    )
+                    # Index the supplier cells before the summary sheets are added
+                    set_search_index(
+                        doc_type1,
+                        index_sheets(
+                            new_search_index(),
+                            doc_type1,
+                            consolidated_pri,
+                            list(sheets_pri_dict),
+                        ),
+                    )
+                    supplier_names = list(sheets_pri_dict.keys())
+                    combined_titles_pri = get_combined_sheet_titles(
+                        consolidated_pri, template_sheets_pri
+                    )
+                    header_rows_pri = {
+                        combined_titles_pri[title]: schema["header_rows"]
+                        for title, schema in schemas_pri.items()
+                    }
+                    consolidated_pri = add_price_summaries(
+                        consolidated_pri, supplier_names, header_rows_pri
+                    )
+                    if st.session_state.price_stats_option:
+                        total_rows_pri = {
+                            combined_titles_pri[title]: schema["subtotal_rows"]
+                            + schema["grand_total_rows"]
+                            for title, schema in schemas_pri.items()
+                        }
+                        consolidated_pri = add_price_statistics(
+                            consolidated_pri, supplier_names, total_rows_pri
+                        )
+
+                elif st.session_state.pri_comb_mode == "Separate Sheets":
+                    consolidated_pri = separate_sheet_combine(
+                        consolidated_pri,
+                        template_sheets_pri,
+                        sheets_pri_dict,
+                        workers=workers,
+                    )
+                    # Index the supplier cells of the consolidated sheets
+                    set_search_index(
+                        doc_type1,
+                        index_sheets(
+                            new_search_index(),
+                            doc_type1,
+                            consolidated_pri,
+                            list(sheets_pri_dict),
+                        ),
+                    )
+                # consolidated_pri = append_logo(consolidated_pri, st.session_state.logo_path)
+                # save to disk, the session state only keeps a reference
+                save_download(consolidated_pri, doc_type1, "consolidated_p")
+                save_preview(consolidated_pri, "preview_p")
+            if not st.session_state.get("consolidated_p"):
+                st.error("Failed to save the consolidated file. Please try again.")
+                return
+            store_consolidation(
+                result_key_pri, doc_type1, "consolidated_p", "preview_p"
             )
-            # Get the visible sheets
-            sup_sheets = [
-                sup_excel[sheet]
-                for sheet in sup_excel.sheetnames
-                if sup_excel[sheet].sheet_state == "visible"
-            ]
-            # Iterate over the specified sheet indexes
-            for sheet_idx in sheet_indexes:
-                sheet = sup_sheets[sheet_idx]
-                # Add the sheet to the dictionary
-                worksheets_dict[supplier["name"]].append(sheet)
+        st.success("Pricing sheets consolidated successfully!", icon="✅")
 
-    # Show a toast when done
-    st.toast("Supplier Files read successfully! 📚", icon="✅")
 
-    return dfs_dict, worksheets_dict
+    if st.session_state.get("consolidated_p"):
+        show_download(st.session_state.consolidated_p)
+        if st.session_state.get("preview_p"):
+            show_preview(
+                st.session_state.preview_p,
+                [supplier["name"] for supplier in suppliers],
+                "preview_p",
+            )
+    else:
+        st.session_state.consolidated_p = None
 
 
-def write_summary_to_sheet(summary_df, grand_total_df, summary_sheet):
+@st.fragment
+def questionnaire_section(suppliers, template_ques, doc_type2):
     """
-    Write the summary DataFrame and grand total DataFrame to the summary sheet.
+    Show the Questionnaire consolidation. Its widgets only rerun this section of the
+    page.
 
     Args:
-        summary_df (pd.DataFrame): The summary DataFrame
-        grand_total_df (pd.DataFrame): The grand total DataFrame
-        summary_sheet (openpyxl.worksheet.worksheet.Worksheet): The summary sheet
-
-    Note:
-        This function writes the summary DataFrame to the sheet, then writes the
-        grand total DataFrame to the sheet below the summary DataFrame. It also
-        formats the sheet by applying borders to all cells and setting the column
-        widths to auto based on the content.
+        suppliers (list): The suppliers of the event with their files.
+        template_ques: The Questionnaire template file.
+        doc_type2 (str): The Questionnaire document type.
     """
-    if not summary_df.empty:
-        # Pivot the summary DataFrame
-        merged_df = summary_df.pivot_table(
-            index=["Category", "Subcategory"],
-            values=[
-                col
-                for col in summary_df.columns
-                if col not in ["Category", "Subcategory"]
-            ],
-            aggfunc="first",
-        ).reset_index()
-
-        # Write merged_df to the sheet
-        for r in dataframe_to_rows(merged_df, index=False, header=True):
-            summary_sheet.append(r)
-
-        # Separate `merged_df` and `grand_total_df` visually in the sheet
-        summary_sheet.append([])
-        summary_sheet.append(
-            ["Grand Total Summary"]
-        )  # Add a title row for grand_total_df
-
-        # Write grand_total_df to the sheet
-        for r in dataframe_to_rows(grand_total_df, index=False, header=True):
-            summary_sheet.append(r)
-
-        # Merge cells with the same value in column A (Category column)
-        current_value = None
-        start_row = None
-        for row in range(2, summary_sheet.max_row + 1):  # Skip header row
-            cell_value = summary_sheet.cell(row=row, column=1).value
-            if cell_value != current_value:
-                if start_row and current_value is not None:
-                    summary_sheet.merge_cells(
-                        start_row=start_row,
-                        start_column=1,
-                        end_row=row - 1,
-                        end_column=1,
-                    )
-                current_value = cell_value
-                start_row = row
-        if start_row and current_value is not None:
-            summary_sheet.merge_cells(
-                start_row=start_row,
-                start_column=1,
-                end_row=summary_sheet.max_row,
-                end_column=1,
-            )
+    st.markdown("#### :orange[For **Questionnaire**]")
+    probe_template_ques = get_workbook_probe(template_ques)
+    all_sheets_ques = [sheet["name"] for sheet in probe_template_ques]
+
+    questionnaire_sheets_list = st.multiselect(
+        "Please select Questionnaire sheet(s) to consolidate",
+        all_sheets_ques,
+        all_sheets_ques,
+        key="questionnaire_sheets",
+    )
+    show_sheet_check(
+        suppliers, probe_template_ques, questionnaire_sheets_list, doc_type2
+    )
+
+    chosen_sheets_ques_idx = [
+        all_sheets_ques.index(sheet) for sheet in questionnaire_sheets_list
+    ]
+
+    if "ques_comb_mode" not in st.session_state:
+        st.session_state.ques_comb_mode = "Side by Side"
+
+    st.radio(
+        "Please select consolidation method:",
+        ("Side by Side", "Separate Sheets"),
+        index=0,
+        key="ques_comb_mode",
+    )
 
-        # Format the sheet
-        header_fill = PatternFill(
-            start_color="4472C4", end_color="4472C4", fill_type="solid"
+
+    # add a summary option tickbox
+    st.checkbox(
+        "Questionnaire summary included",
+        value=False,
+        key="summary_option",
+        help="Include a summary of the supplier responses at the end of each column. Side by Side mode only.",
+    )
+    st.checkbox(
+        "Per question summary",
+        value=False,
+        key="question_summary_option",
+        help="Add a column condensing the answers of all the suppliers to each question. Side by Side mode only.",
+    )
+    st.checkbox(
+        "Answer similarity analysis",
+        value=True,
+        key="similarity_option",
+        help="Add a sheet comparing the answers of the suppliers to each question, with the near duplicate (boilerplate) and divergent answers. Side by Side mode only.",
+    )
+
+
+    consolidate_ques = st.button(
+        "Consolidate", key="consolidate_ques"
+    ) or st.session_state.pop("auto_consolidate_q", False)
+    if consolidate_ques:
+        # Identical requests reuse the stored result instead of consolidating again
+        result_key_ques = get_consolidation_key(
+            template_ques,
+            suppliers,
+            doc_type2,
+            questionnaire_sheets_list,
+            chosen_sheets_ques_idx,
+            {
+                "mode": st.session_state.ques_comb_mode,
+                "summary_option": st.session_state.summary_option,
+                "similarity": st.session_state.similarity_option,
+                "question_summary": st.session_state.question_summary_option,
+            },
         )
-        font_style_header = Font(b=True, color="FFFFFF")
-        border_style = Side(border_style="thin", color="000000")
-
-        # Apply borders and styles to all cells
-        grand_total_row = 1
-        for row in summary_sheet.iter_rows(
-            min_row=1,
-            max_row=summary_sheet.max_row,
-            min_col=1,
-            max_col=summary_sheet.max_column,
-        ):
-            for cell in row:
-                cell.border = Border(
-                    left=border_style,
-                    right=border_style,
-                    top=border_style,
-                    bottom=border_style,
+        if load_cached_result(result_key_ques, doc_type2, "consolidated_q", "preview_q"):
+            consolidate_ques = False
+            st.success("Questionnaire sheets consolidated successfully!", icon="✅")
+
+    if consolidate_ques:
+        # Wait for a free slot of the server, shared by all the sessions
+        with consolidation_slot(
+            template_ques, suppliers, doc_type2, questionnaire_sheets_list
+        ) as workers:
+            consolidated_ques = openpyxl.Workbook()
+            consolidated_ques.remove(consolidated_ques.active)
+            wb_template_ques = get_workbook(
+                template_ques,
+                rich_text=st.session_state.richtext_option,
+                data_only=True,
+            )
+            template_sheets_ques = [
+                wb_template_ques[sheet] for sheet in questionnaire_sheets_list
+            ]
+            schemas_ques = get_template_schemas(template_ques, template_sheets_ques)
+            matches_ques = None
+            if not st.session_state.two_phase_option:
+                dfs_ques_dict, sheets_ques_dict = get_files(
+                    suppliers, questionnaire_sheets_list, doc_type2, template_ques
                 )
-                if cell.row == 1:
-                    cell.fill = header_fill
-                    cell.font = font_style_header
-                elif cell.value == "Grand Total Summary":
-                    # fill the cell with a different color
-                    cell.fill = PatternFill(
-                        start_color="FF0000", end_color="FF0000", fill_type="solid"
+            elif st.session_state.ques_comb_mode == "Side by Side":
+                sheets_ques_dict, matches_ques = get_matched_files(
+                    suppliers,
+                    doc_type2,
+                    template_ques,
+                    template_sheets_ques,
+                    schemas_ques,
+                )
+            else:
+                # Separate sheets copy whole sheets, only skip the sheets that are not selected
+                dfs_ques_dict, sheets_ques_dict = get_files(
+                    suppliers,
+                    questionnaire_sheets_list,
+                    doc_type2,
+                    template_ques,
+                    keep_columns={
+                        supplier["name"]: [None] * len(questionnaire_sheets_list)
+                        for supplier in suppliers
+                    },
+                )
+            with st.spinner("Processing... Please wait."):
+                if st.session_state.ques_comb_mode == "Side by Side":
+                    consolidated_ques = side_by_side_combine(
+                        consolidated_ques,
+                        template_sheets_ques,
+                        sheets_ques_dict,
+                        summary_option=st.session_state.summary_option,
+                        workers=workers,
+                        matches=matches_ques,
+                    )
+                    # Index the supplier cells before the summary sheets are added
+                    set_search_index(
+                        doc_type2,
+                        index_sheets(
+                            new_search_index(),
+                            doc_type2,
+                            consolidated_ques,
+                            list(sheets_ques_dict),
+                        ),
+                    )
+                    # Leave out the header rows and the summaries below the questions
+                    combined_titles_ques = get_combined_sheet_titles(
+                        consolidated_ques, template_sheets_ques
                     )
-                    cell.font = font_style_header
-                    grand_total_row = cell.row
-
-        # Set the column width to auto based on the content
-        for col in range(1, summary_sheet.max_column + 1):
-            column = get_column_letter(col)
-            max_length = max(
-                len(str(summary_sheet.cell(row=row, column=col).value) or "")
-                for row in range(1, summary_sheet.max_row + 1)
+                    header_rows_ques = {
+                        combined_titles_ques[title]: schema["header_rows"]
+                        for title, schema in schemas_ques.items()
+                    }
+                    max_rows_ques = {
+                        combined_titles_ques[sheet.title]: sheet.max_row
+                        for sheet in template_sheets_ques
+                    }
+                    if st.session_state.similarity_option:
+                        consolidated_ques = add_answer_similarity(
+                            consolidated_ques,
+                            list(sheets_ques_dict.keys()),
+                            header_rows_ques,
+                            max_rows_ques,
+                        )
+                    if st.session_state.question_summary_option:
+                        consolidated_ques = add_question_summaries(
+                            consolidated_ques,
+                            list(sheets_ques_dict.keys()),
+                            header_rows_ques,
+                            max_rows_ques,
+                        )
+                elif st.session_state.ques_comb_mode == "Separate Sheets":
+                    consolidated_ques = separate_sheet_combine(
+                        consolidated_ques,
+                        template_sheets_ques,
+                        sheets_ques_dict,
+                        workers=workers,
+                    )
+                    # Index the supplier cells of the consolidated sheets
+                    set_search_index(
+                        doc_type2,
+                        index_sheets(
+                            new_search_index(),
+                            doc_type2,
+                            consolidated_ques,
+                            list(sheets_ques_dict),
+                        ),
+                    )
+                # consolidated_ques = append_logo(consolidated_ques, st.session_state.logo_path)
+                # save to disk, the session state only keeps a reference
+                save_download(consolidated_ques, doc_type2, "consolidated_q")
+                save_preview(consolidated_ques, "preview_q")
+            store_consolidation(
+                result_key_ques, doc_type2, "consolidated_q", "preview_q"
             )
-            summary_sheet.column_dimensions[column].width = max_length + 2
-
-        # Plot bar chart of the grand total summary
-        chart = BarChart()
-        chart.type = "col"  # Column chart
-        chart.grouping = "clustered"  # Set grouping to clustered
-        chart.title = "Supplier Price Comparison by Category"
-        chart.x_axis.title = "Category"
-        chart.y_axis.title = "Price"
-
-        data = Reference(
-            summary_sheet,
-            min_col=2,
-            min_row=grand_total_row + 1,
-            max_row=summary_sheet.max_row,
-            max_col=summary_sheet.max_column - 1,
-        )
-        categories = Reference(
-            summary_sheet,
-            min_col=1,
-            min_row=grand_total_row + 2,
-            max_row=summary_sheet.max_row,
-        )
-        chart.add_data(data, titles_from_data=True)
-        chart.set_categories(categories)
-        summary_sheet.add_chart(chart, "A" + str(summary_sheet.max_row + 2))
-        # Display the category in the x-axis
-
-        # Add a title for the chart
-        summary_sheet.cell(
-            row=summary_sheet.max_row + 4,
-            column=1,
-            value="Supplier Price Comparison by Category",
-        )
+
+        st.success("Questionnaire sheets consolidated successfully!", icon="✅")
+
+    if st.session_state.get("consolidated_q"):
+        show_download(st.session_state.consolidated_q)
+        if st.session_state.get("preview_q"):
+            show_preview(
+                st.session_state.preview_q,
+                [supplier["name"] for supplier in suppliers],
+                "preview_q",
+            )
+    else:
+        st.session_state.consolidated_q = None
 
 
-def create_summary_price_table(summary_sheet, price_sheet, supplier_names):
+@st.fragment
+def search_section():
     """
-    Create a summary price table by extracting price data from the price sheet
-    and writing it to the summary sheet.
+    Show the search box over the supplier responses of the consolidated documents. Its
+    widgets only rerun this section of the page.
+    """
+    st.markdown("#### :blue[Search the **supplier responses**]")
+    indexes = st.session_state.get("search_index", {})
+    query = st.text_input(
+        "Search all the supplier answers of the event",
+        key="search_query",
+        placeholder="SOC 2, SLA, warranty...",
+        help="The cells containing every word of the search are listed, the most relevant first.",
+    )
+    if not query:
+        return
+    if not indexes:
+        st.info("Consolidate the Pricing or Questionnaire sheets to search them.")
+        return
+    hits = sorted(
+        (hit for index in indexes.values() for hit in search_index(index, query)),
+        key=lambda hit: -hit["score"],
+    )[:SEARCH_MAX_HITS]
+    if not hits:
+        st.info(f"No supplier answer contains {query!r}.")
+        return
+    st.caption(f"{len(hits)} best matches")
+    st.dataframe(
+        [
+            {
+                "Document": hit["doc_type"],
+                "Supplier": hit["supplier"],
+                "Sheet": hit["sheet"],
+                "Row": hit["row"],
+                "Column": hit["column"],
+                "Answer": hit["text"],
+                "Score": hit["score"],
+            }
+            for hit in hits
+        ],
+        use_container_width=True,
+        hide_index=True,
+    )
 
-    Args:
-        summary_sheet (openpyxl.Worksheet): The worksheet to write the summary data.
-        price_sheet (openpyxl.Worksheet): The worksheet to extract price data from.
-        supplier_names (list): A list of supplier names to map columns.
 
-    Returns:
-        int: 1 if the summary table is created successfully, 0 otherwise.
+@st.fragment
+def round_section(suppliers, template_files, doc_types):
     """
-    # Extract headers and map columns to suppliers
-    headers_dict = {}
-    for col in price_sheet.iter_cols():
-        col_letter = get_column_letter(col[0].column)
-        headers = [(cell.value, cell.row) for cell in col if cell.font.bold]
-        headers_dict[col_letter] = headers
-
-    # Identify columns for price data
-    price_label_col = None
-    max_len = 0
-    supplier_cols_dict = defaultdict(list)
-    for key, value in headers_dict.items():
-        if value and value[0][1] == 1 and value[0][0] in supplier_names:
-            supplier_cols_dict[value[0][0]].append(key)
-        else:
-            if len(value) > max_len:
-                max_len = len(value)
-                price_label_col = key
-
-    # Compile summary data
-    summary_data = []
-    for supplier, cols in supplier_cols_dict.items():
-        for col in cols:
-            col_headers = headers_dict.get(col, [])
-            if len(col_headers) < 2:
-                continue
-            category = col_headers[1][0]
-            upper_row = headers_dict[price_label_col][0][1]
-            lower_row = headers_dict[price_label_col][0][1]
-            for cate, row in headers_dict[price_label_col]:
-                if row > lower_row:
-                    lower_row = row
-                value = price_sheet[f"{col}{row}"].value
-                price_value = re.sub(r"[^\d.]", "", str(value))
-                if price_value:
-                    try:
-                        price_value = round(float(price_value), 2)
-                    except ValueError:
-                        continue
-                    summary_data.append(
-                        {
-                            "Category": category,
-                            "Subcategory": cate,
-                            supplier: price_value,
-                        }
-                    )
-                else:
-                    total_price = 0
-                    for row in range(upper_row, lower_row + 1):
-                        value = price_sheet[f"{col}{row}"].value
-                        price_value = re.sub(r"[^\d.]", "", str(value))
-                        if price_value:
-                            try:
-                                price_value = float(price_value)
-                            except ValueError:
-                                continue
-                            total_price += price_value
-                    if total_price > 0:
-                        total_price = round(total_price, 2)
-                        summary_data.append(
-                            {
-                                "Category": category,
-                                "Subcategory": cate,
-                                supplier: total_price,
-                            }
-                        )
+    Show the comparison with the previous round. Its widgets only rerun this section of
+    the page.
 
-    # Convert summary data into DataFrame
-    summary_df = pd.DataFrame(summary_data)
-
-    # Pivot the DataFrame and reset the index
-    if not summary_df.empty:
-        merged_df = summary_df.pivot_table(
-            index=["Category", "Subcategory"],
-            values=[
-                col
-                for col in summary_df.columns
-                if col not in ["Category", "Subcategory"]
-            ],
-            aggfunc="first",
-        ).reset_index()
-
-        # Ensure that only existing suppliers are used
-        existing_suppliers = [
-            supplier for supplier in supplier_names if supplier in merged_df.columns
-        ]
-        if not existing_suppliers:
-            print("No valid suppliers found in the DataFrame columns.")
-            return summary_sheet
-        try:
-            grand_total_rows = merged_df[
-                merged_df["Subcategory"].str.contains(
-                    "grand total", case=False, na=False
-                )
-            ].index
+    Args:
+        suppliers (list): The suppliers of the event with their files.
+        template_files (dict): The template file of each document type.
+        doc_types (list): The document types of the event.
+    """
+    st.markdown("#### :blue[Compare with the **previous round**]")
+    st.markdown(
+        "*Upload the supplier files of the previous round to get a workbook with only the cells that changed.*"
+    )
+    round_doc_type = st.radio(
+        "Document to compare:",
+        tuple(dict.fromkeys(doc_types)),
+        key="round_doc_type",
+        horizontal=True,
+    )
+    with st.expander("📂 Previous round files"):
+        for supplier in suppliers:
+            st.file_uploader(
+                f"{supplier['name']} ({round_doc_type}, previous round)",
+                type=["xlsx"],
+                key=f"previous_round_{round_doc_type}_{supplier['name']}",
+            )
 
-            if grand_total_rows.size > 0:
-                # Extract the rows containing 'Grand Total'
-                grand_total_df = merged_df.loc[grand_total_rows]
-                # drop the 'Subcategory' column
-                grand_total_df = grand_total_df.drop(columns=["Subcategory"])
-            else:
-                # Aggregate the data to compute the grand total
-                numeric_columns = merged_df.select_dtypes(include="number").columns
-                grand_total_df = (
-                    merged_df.groupby("Category")[numeric_columns].sum().reset_index()
-                )
-        except Exception as e:
-            print(f"Error Creating Summary Table: {e}")
-            return 0
-    else:
-        print("The summary_df is empty; ensure your input data is correct.")
-        return 0
+    if st.button("Compare rounds", key="compare_rounds"):
+        # Compare the sheets selected for the consolidation of the document
+        sheets_key = (
+            "pricing_sheets" if round_doc_type == doc_types[0] else "questionnaire_sheets"
+        )
+        round_sheets = st.session_state.get(sheets_key, [])
+        previous_info = [
+            {
+                "name": supplier["name"],
+                round_doc_type: st.session_state.get(
+                    f"previous_round_{round_doc_type}_{supplier['name']}"
+                ),
+            }
+            for supplier in suppliers
+            if st.session_state.get(f"previous_round_{round_doc_type}_{supplier['name']}")
+        ]
+        if not previous_info:
+            st.warning("Please upload at least one file of the previous round.", icon="⚠️")
+            return
+        # Both rounds are read the same way as for the consolidation
+        _, previous_sheets_dict = get_files(
+            previous_info, round_sheets, round_doc_type, template_files[round_doc_type]
+        )
+        _, current_sheets_dict = get_files(
+            suppliers, round_sheets, round_doc_type, template_files[round_doc_type]
+        )
+        round_changes = openpyxl.Workbook()
+        with st.spinner("Comparing... Please wait."):
+            round_changes, total_changes = round_diff_combine(
+                round_changes, previous_sheets_dict, current_sheets_dict
+            )
+            save_download(round_changes, round_doc_type, "round_changes", "round_changes")
+        st.success(f"{total_changes} changed cells found.", icon="✅")
 
-    # Write the summary and grand total data to the summary sheet
-    write_summary_to_sheet(merged_df, grand_total_df, summary_sheet)
-    return 1
+    if st.session_state.get("round_changes"):
+        show_download(st.session_state.round_changes)
 
 
 # streamlit_app\
 # st.image(r"assets/", width=200)
 
+download_nltk_data()
+get_api_server()
+
+# Pick up the new and changed files of the watch folder, if any
+watched_suppliers = sync_watch_folder()
+if watched_suppliers:
+    st.toast(f"New responses from {', '.join(watched_suppliers)}", icon="📂")
+    if st.session_state.get("watch_auto"):
+        st.session_state.auto_consolidate_p = True
+        st.session_state.auto_consolidate_q = True
+
 # Check if suppliers are set up
-if "suppliers" not in st.session_state or len(st.session_state.suppliers) == 0:
+if (
+    "event_manifest" not in st.session_state
+    or len(st.session_state.event_manifest["suppliers"]) == 0
+):
     st.error("No supplier data found. Please complete the setup first.")
     st.stop()
 
@@ -1088,8 +1362,16 @@ if "event_name" not in st.session_state or "event_option" not in st.session_stat
     st.error("Event name or option not configured. Please complete the setup first.")
     st.stop()
 
+# Open the spooled event files, the session keeps one handle per file
+event_files = open_event_files(
+    st.session_state.event_manifest, st.session_state.get("event_files")
+)
+st.session_state.event_files = event_files
+template_files = get_event_templates(st.session_state.event_manifest, event_files)
+suppliers = get_event_suppliers(st.session_state.event_manifest, event_files)
+
 # Check if each supplier has the necessary files and names
-for i, supplier in enumerate(st.session_state.suppliers):
+for i, supplier in enumerate(suppliers):
     if (
         not supplier.get("name")
         or not supplier.get(st.session_state.doc_types[0])
@@ -1110,14 +1392,7 @@ doc_type1, doc_type2 = st.session_state.doc_types
 
 
 st.write("# RFP Files Consolidator")
-suppliers_html = ""
-color_cycle = fill_color_switch()
-
-for i, supplier in enumerate(st.session_state.suppliers):
-    supplier_name = supplier["name"]
-    supplier_color = next(color_cycle)
-
-    suppliers_html += f'<span style="font-weight: bold; color: #{supplier_color}; margin-right: 10px;">{supplier_name}</span>'
+suppliers_html = get_supplier_badges(tuple(supplier["name"] for supplier in suppliers))
 
 # Render the formatted text with bold event and option names
 st.markdown(
@@ -1142,168 +1417,35 @@ st.markdown(
 
 st.session_state.richtext_option = True
 
-### Pricing Sheets Consolidation
-
-st.markdown("### :green[For **Pricing**]")
-st.markdown(
-    "***Note:** Summary tab and chart for Pricing only works in **Side by Side** consolidation.*"
-)
-
-template_pri = st.session_state.template_files[doc_type1]
-wb_template_pri = load_workbook(
-    template_pri, rich_text=st.session_state.richtext_option, data_only=True
-)
-all_sheets_pri = wb_template_pri.sheetnames
-
-pricing_sheets_list = st.multiselect(
-    "Please select Pricing sheet(s) to consolidate", all_sheets_pri, all_sheets_pri
-)
-
-chosen_sheets_pri_idx = [all_sheets_pri.index(sheet) for sheet in pricing_sheets_list]
-
-if "pri_comb_mode" not in st.session_state:
-    st.session_state.pri_comb_mode = "Side by Side"
-
-
-st.radio(
-    "Please select consolidation method:",
-    ("Side by Side", "Separate Sheets"),
-    index=0,
-    key="pri_comb_mode",
+# Forget the parsed workbooks of files that were replaced or removed from the event
+prune_workbook_registry(
+    list(template_files.values())
+    + [
+        supplier.get(doc_type)
+        for supplier in suppliers
+        for doc_type in st.session_state.doc_types
+    ]
 )
 
+if resolve_watch_folder(st.session_state.get("watch_folder")):
+    show_watch_status()
 
-if st.button("Consolidate", key="consolidate_pri"):
-    consolidated_pri = openpyxl.Workbook()
-    consolidated_pri.remove(consolidated_pri.active)
-    dfs_pri_dict, sheets_pri_dict = get_files(
-        st.session_state.suppliers, chosen_sheets_pri_idx, doc_type1
-    )
-    template_sheets_pri = [wb_template_pri[sheet] for sheet in pricing_sheets_list]
-    with st.spinner("Processing... Please wait."):
-        if st.session_state.pri_comb_mode == "Side by Side":
-            consolidated_pri = side_by_side_combine(
-                consolidated_pri, template_sheets_pri, sheets_pri_dict
-            )
-            supplier_names = list(sheets_pri_dict.keys())
-            # iterate over the sheets in consolidated_pri and create a summary sheet
-            for sheet in consolidated_pri.worksheets:
-                # Skip template or non-price sheets if needed
-                if "Combined" in sheet.title:
-                    # Create a new summary sheet
-                    summary_sheet = consolidated_pri.create_sheet(
-                        title=f"Summary of {sheet.title}"[:30]
-                    )
-                    status_sum = create_summary_price_table(
-                        summary_sheet, sheet, supplier_names
-                    )
-                    # Move the summary sheet to the leftmost position
-                    if status_sum:
-                        consolidated_pri._sheets.remove(summary_sheet)
-                        consolidated_pri._sheets.insert(0, summary_sheet)
-                    else:
-                        # remove the sheet if the summary is not created
-                        consolidated_pri.remove(summary_sheet)
-
-        elif st.session_state.pri_comb_mode == "Separate Sheets":
-            consolidated_pri = separate_sheet_combine(
-                consolidated_pri, template_sheets_pri, sheets_pri_dict
-            )
-        # consolidated_pri = append_logo(consolidated_pri, st.session_state.logo_path)
-        file_stream_p = save_consolidated_file(consolidated_pri)
-    if file_stream_p is None:
-        st.error("Failed to save the consolidated file. Please try again.")
-        st.stop()
-    # save to session state
-    st.session_state.consolidated_p = file_stream_p
-    st.success("Pricing sheets consolidated successfully!", icon="✅")
+### Output Options
 
+output_options()
 
-if st.session_state.get("consolidated_p"):
-    st.download_button(
-        f"💾 Download {event_name}_{doc_type1}_consolidated.xlsx",
-        data=st.session_state.consolidated_p,  # Changed from consolidated_q
-        file_name=f"{event_name}_{doc_type1}_consolidated.xlsx",
-    )
-else:
-    st.session_state.consolidated_p = None
+### Pricing Sheets Consolidation
 
+pricing_section(suppliers, template_files[doc_type1], doc_type1)
 
 ### Questionnaire Sheets Consolidation
 
-st.markdown("#### :orange[For **Questionnaire**]")
-template_ques = st.session_state.template_files[doc_type2]
-wb_template_ques = load_workbook(
-    template_ques, rich_text=st.session_state.richtext_option, data_only=True
-)
-all_sheets_ques = wb_template_ques.sheetnames
-
-questionnaire_sheets_list = st.multiselect(
-    "Please select Questionnaire sheet(s) to consolidate",
-    all_sheets_ques,
-    all_sheets_ques,
-)
-
-chosen_sheets_ques_idx = [
-    all_sheets_ques.index(sheet) for sheet in questionnaire_sheets_list
-]
-
-if "ques_comb_mode" not in st.session_state:
-    st.session_state.ques_comb_mode = "Side by Side"
-
-st.radio(
-    "Please select consolidation method:",
-    ("Side by Side", "Separate Sheets"),
-    index=0,
-    key="ques_comb_mode",
-)
-
-
-# add a summary option tickbox
-summary_option = st.checkbox(
-    "Questionnaire summary included",
-    value=False,
-    key="summary_option",
-    help="Include a summary of the supplier responses at the end of each column. Side by Side mode only.",
-)
-
+questionnaire_section(suppliers, template_files[doc_type2], doc_type2)
 
-if st.button("Consolidate", key="consolidate_ques"):
-    consolidated_ques = openpyxl.Workbook()
-    consolidated_ques.remove(consolidated_ques.active)
-    dfs_ques_dict, sheets_ques_dict = get_files(
-        st.session_state.suppliers, chosen_sheets_ques_idx, doc_type2
-    )
-    template_sheets_ques = [
-        wb_template_ques[sheet] for sheet in questionnaire_sheets_list
-    ]
-    with st.spinner("Processing... Please wait."):
-        if st.session_state.ques_comb_mode == "Side by Side":
-            consolidated_ques = side_by_side_combine(
-                consolidated_ques,
-                template_sheets_ques,
-                sheets_ques_dict,
-                summary_option=st.session_state.summary_option,
-            )
-        elif st.session_state.ques_comb_mode == "Separate Sheets":
-            consolidated_ques = separate_sheet_combine(
-                consolidated_ques, template_sheets_ques, sheets_ques_dict
-            )
-        # consolidated_ques = append_logo(consolidated_ques, st.session_state.logo_path)
-        file_stream_q = save_consolidated_file(consolidated_ques)
+### Search of the supplier responses
 
-    # save to session state
-    st.session_state.consolidated_q = file_stream_q
-    st.success("Questionnaire sheets consolidated successfully!", icon="✅")
+search_section()
 
-download_questionnaire = False
+### Comparison with the previous round
 
-if st.session_state.get("consolidated_q"):
-    st.download_button(
-        f"💾 Download {event_name}_{doc_type2}_consolidated.xlsx",
-        data=st.session_state.consolidated_q,
-        file_name=f"{event_name}_{doc_type2}_consolidated.xlsx",
-    )
-    download_questionnaire = True
-else:
-    st.session_state.consolidated_q = None
+round_section(suppliers, template_files, st.session_state.doc_types)
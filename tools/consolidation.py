@@ -0,0 +1,1740 @@
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+import openpyxl
+from openpyxl.cell.rich_text import CellRichText
+from openpyxl.styles import PatternFill, Border, Side, Alignment, Font
+from openpyxl.utils import get_column_letter
+from openpyxl.utils.dataframe import dataframe_to_rows
+from openpyxl.utils.cell import coordinate_from_string, column_index_from_string
+from openpyxl.chart import BarChart, Reference
+from openpyxl.formatting.rule import FormulaRule
+from openpyxl.writer.excel import ExcelWriter
+
+from fuzzywuzzy import fuzz
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import cycle
+from collections import deque, defaultdict
+from copy import copy
+import io
+import math
+import multiprocessing
+import os
+import re
+import zipfile
+import pandas as pd
+from pickle import PicklingError
+
+from sumy.parsers.plaintext import PlaintextParser
+from sumy.nlp.tokenizers import Tokenizer
+from sumy.summarizers.lsa import LsaSummarizer
+
+from tools.cell_text import get_column_text
+from tools.sheet_layout import get_sheet_layout, is_hidden
+from tools.sheet_snapshot import snapshot_sheet, restore_sheet
+
+# Minimum number of template sheets before they are combined in worker processes
+PARALLEL_MIN_SHEETS = 4
+
+# A number with an optional currency symbol or code, such as "$1,200.50" or "950 EUR"
+PRICE_TEXT_RE = re.compile(
+    r"^\s*(?:[A-Z]{3}|[$€£¥])?\s*"
+    r"(-?\d[\d,]*(?:\.\d+)?|-?\.\d+)"
+    r"\s*(?:[A-Z]{3}|[$€£¥])?\s*$",
+    re.I,
+)
+
+# Output formats of the consolidated file: label, file extension and MIME type
+OUTPUT_FORMATS = {
+    "xlsx": (
+        "Excel workbook (formatted)",
+        "xlsx",
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    ),
+    "lean_xlsx": (
+        "Excel workbook (values only)",
+        "xlsx",
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    ),
+    "csv": ("CSV files (zip)", "zip", "application/zip"),
+    "parquet": ("Parquet files (zip)", "zip", "application/zip"),
+}
+
+def notify(message, icon=None):
+    """
+    Show a progress message as a toast in the app, or print it when the consolidation
+    runs outside of Streamlit (e.g. in the HTTP API).
+
+    Args:
+        message (str): The message to show.
+        icon (str): The icon of the toast.
+    """
+    if get_script_run_ctx() is None:
+        print(message)
+    else:
+        st.toast(message, icon=icon)
+
+
+def fill_color_switch():
+    """
+    Returns a cycle of 10 colors used to fill cells in a worksheet. Each color represents a different supplier.
+
+    The colors are chosen to be visually distinct and not too bright (color blindness friendly).
+    """
+    colors = [
+        "E4DFEC",
+        "D4D5F8",
+        "DFD2FA",
+        "D9E5F3",
+        "E0E0EC",
+        "E7DAF2",
+        "E3E9E9",
+        "CC79A7",
+        "009E73",
+        "0072B2",
+    ]
+    return cycle(colors)
+
+
+def generate_merged_dict(sheet):
+    """
+    Generates a dictionary mapping column indices to lists of merged ranges
+    in that column.
+
+    The output dictionary will have the following structure:
+    {
+        column_idx1: [merged_range1, merged_range2, ...],
+        column_idx2: [merged_range3, merged_range4, ...],
+        ...
+    }
+
+    Only vertical merges are handled (i.e., merged cells in the same column).
+    """
+    merged_dict = {}
+
+    for merged_range in sheet.merged_cells.ranges:
+        # Only handle vertical merges (i.e., merged cells in the same column)
+        if merged_range.size["columns"] == 1:
+            start_cell = merged_range.start_cell
+            column_idx = start_cell.column  # Get the column index
+            merged_range_str = (
+                merged_range.coord
+            )  # Get the range as string (e.g., 'C14:C17')
+
+            # If the column is not already in merged_dict, initialize an empty list
+            if column_idx not in merged_dict:
+                merged_dict[column_idx] = []
+
+            # Add the merged range to the list of merged ranges for this column
+            merged_dict[column_idx].append(merged_range_str)
+
+    return merged_dict
+
+
+def merge_columns_in_target_sheet(
+    target_sheet, merged_dict, source_col_idx, target_col_idx
+):
+    """
+    Merges columns in the target sheet based on the merged ranges found in the source sheet.
+
+    Args:
+        target_sheet: The target sheet where the columns will be merged.
+        merged_dict: A dictionary mapping column indices to lists of merged ranges.
+        source_col_idx: The column index from the source sheet where the merged ranges are found.
+        target_col_idx: The column index in the target sheet where the columns will be merged.
+
+    Returns:
+        None
+    """
+    if source_col_idx not in merged_dict:
+        # print(f"No merged ranges found for column {source_col_idx} in merged_dict.")
+        return
+    for merged_range in merged_dict[source_col_idx]:
+        # Extract the start and end rows from the merged range (e.g., 'C14:C17' -> 14, 17)
+        start_cell, end_cell = merged_range.split(":")
+        start_row = int(start_cell[1:])
+        end_row = int(end_cell[1:])
+        start_column = column_index_from_string(start_cell[0])
+        target_sheet.merge_cells(
+            start_row=start_row,
+            start_column=target_col_idx,  # Use target_col_idx for the target column
+            end_row=end_row,
+            end_column=target_col_idx,
+        )
+
+
+# Function to find common columns by comparing values
+def find_matching_cols(template_sheet, supplier_sheet, threshold=80, schema=None):
+    """
+    Find the columns that are common between the template sheet and the supplier sheet.
+
+    Args:
+        template_sheet: The template sheet.
+        supplier_sheet: The supplier sheet.
+        threshold: The threshold for fuzzy matching.
+        schema: The stored schema of the template sheet (see ``get_template_schemas``).
+            If given, the template text is taken from the schema.
+
+    Returns:
+        A tuple of three lists: common_columns, mis_mat_rows, and supplier_value_columns.
+            common_columns: The columns that are common between the template and the supplier.
+            mis_mat_rows: The rows that have mismatched values between the template and the supplier.
+            supplier_value_columns: The columns that contain the supplier values.
+    """
+    common_columns = []
+    supplier_value_columns = []
+    mis_mat_rows = []
+    # Read-only sheets without a stored dimension have no max_row
+    max_row_supplier = min(supplier_sheet.max_row or 300, 300)
+
+    max_column_template = (
+        schema["max_column"] if schema is not None else template_sheet.max_column
+    )
+
+    for col_idx in range(1, min(max_column_template, 100) + 1):
+        # Get the column letter of the current column
+        col_letter = get_column_letter(col_idx)
+        # Get the values of the current column in the template sheet
+        if schema is not None:
+            row_values_template = schema["column_text"].get(col_idx, [])
+        else:
+            row_values_template = [
+                text for _, text in get_column_text(template_sheet, col_idx)
+            ]
+        # Get the values of the current column in the supplier sheet
+        supplier_cells = get_column_text(
+            supplier_sheet, col_idx, max_row=max_row_supplier
+        )
+        row_values_suppliers = [text for _, text in supplier_cells]
+        # If both lists are empty, skip the column
+        if not row_values_template and not row_values_suppliers:
+            continue
+
+        # Fuzzy matching between the string joint from the template and the supplier list
+        temp_row_str = " ".join(row_values_template)
+        suppliers_row_str = " ".join(row_values_suppliers)
+        similarity = fuzz.ratio(temp_row_str, suppliers_row_str)
+
+        if similarity > threshold:
+            common_columns.append(col_letter)
+            if similarity < 100:
+                # Highlight the row in the supplier sheet that does not match the template
+                template_values = set(row_values_template)
+                for row, cell_val in supplier_cells:
+                    if cell_val not in template_values:
+                        cell_coord = f"{col_letter}{row}"
+                        print(
+                            f"Detected mismatch in row: {cell_coord} for supplier {supplier_sheet.title}. the value is: {cell_val}, the type is: {type(cell_val)}"
+                        )
+                        # Detected mismatch in row, add coordinates of the mismatched row
+                        mis_mat_rows.append(cell_coord)
+
+        else:
+            # This column is not common, can be the column that contains the supplier values
+            if row_values_suppliers:
+                supplier_value_columns.append(col_letter)
+
+    return common_columns, mis_mat_rows, supplier_value_columns
+
+
+def match_supplier_sheets(
+    template_sheets, supplier_sheets_dict, threshold=80, schemas=None
+):
+    """
+    Match the columns of every supplier sheet with its template sheet.
+
+    Only the plain text of the cells is used, so the supplier sheets can come from a
+    read-only workbook loaded without rich text or styles.
+
+    Args:
+        template_sheets (list): A list of template sheets.
+        supplier_sheets_dict (dict): A dictionary mapping supplier names to their
+            sheets, in the order of the template sheets.
+        threshold (int): The threshold for fuzzy matching.
+        schemas (dict): The stored schemas of the template sheets, by sheet name.
+
+    Returns:
+        dict: A dictionary mapping supplier names to the ``find_matching_cols`` result
+            of each of their sheets, in the order of the template sheets.
+    """
+    return {
+        supplier: [
+            find_matching_cols(
+                template_sheet,
+                supplier_sheet,
+                threshold,
+                schemas.get(template_sheet.title) if schemas else None,
+            )
+            for template_sheet, supplier_sheet in zip(template_sheets, supplier_sheets)
+        ]
+        for supplier, supplier_sheets in supplier_sheets_dict.items()
+    }
+
+
+def separate_sheet_combine(
+    workbook, template_sheets, supplier_sheets_dict, threshold=80, workers=None
+):
+    """
+    Combine files side by side in the same sheet.
+
+    Parameters:
+    workbook (openpyxl.Workbook): The workbook to combine the sheets into.
+    template_sheets (list): A list of template sheets to combine.
+    supplier_sheets_dict (dict): A dictionary mapping supplier names to their
+        corresponding sheets to combine.
+    threshold (int): The threshold for fuzzy matching between the template and
+        supplier sheets.
+    workers (int): The number of worker processes, one template sheet per worker.
+        Defaults to the number of CPUs when there are enough template sheets.
+
+    Returns:
+    openpyxl.Workbook: The combined workbook with all the sheets.
+    """
+    notify(f"Combining files in progress...", icon="⏳")
+    jobs = get_sheet_jobs(template_sheets, supplier_sheets_dict)
+    if get_worker_count(len(jobs), workers) > 1:
+        list(
+            combine_sheets_in_parallel(
+                workbook, "separate", jobs, threshold, workers=workers
+            )
+        )
+    else:
+        for template_sheet, supplier_sheets, _ in jobs:
+            combine_sheet_separate(
+                workbook, template_sheet, supplier_sheets, threshold
+            )
+    # remove the default sheet
+    if "Sheet" in workbook.sheetnames:
+        workbook.remove(workbook["Sheet"])
+    notify("Seperate-Sheet File combined successfully! Ready to download", icon="🎉")
+    return workbook
+
+
+def combine_sheet_separate(workbook, template_sheet, supplier_sheets, threshold=80):
+    """
+    Copy one template sheet and the matching sheet of each supplier into separate sheets.
+
+    Args:
+        workbook (openpyxl.Workbook): The workbook to add the sheets to.
+        template_sheet (openpyxl.Worksheet): The template sheet.
+        supplier_sheets (dict): A dictionary mapping supplier names to their sheet
+            matching the template sheet.
+        threshold (int): The threshold for fuzzy matching.
+    """
+    # copy the template sheet to the workbook
+    target_sheet = workbook.create_sheet(
+        get_unique_sheet_title(workbook, template_sheet.title)
+    )
+    copy_sheet(template_sheet, target_sheet)
+    for supplier in supplier_sheets:
+        print(f"Processing supplier: {supplier}")
+        # add a new sheet for each supplier
+        supplier_sheet = supplier_sheets[supplier]
+        sheet_title = get_unique_sheet_title(
+            workbook, f"{supplier} {template_sheet.title}"
+        )
+        target_sheet = workbook.create_sheet(sheet_title)
+        copy_sheet(supplier_sheet, target_sheet)
+        # Find matching columns between the template and supplier sheets
+        _, mis_mat_rows, _ = find_matching_cols(
+            template_sheet, supplier_sheet, threshold
+        )
+        # Highlight the mismatched rows
+        if mis_mat_rows:
+            for mis_mat_row in mis_mat_rows:
+                col_mis, row_mis = openpyxl.utils.cell.coordinate_from_string(
+                    mis_mat_row
+                )
+                row_mis = int(row_mis)  # Convert to integer
+                col_mis = column_index_from_string(col_mis)  # Convert to integer
+                if col_mis and row_mis:
+                    target_sheet.cell(row=row_mis, column=col_mis).fill = (
+                        PatternFill(
+                            start_color="FAA0A0",
+                            end_color="FAA0A0",
+                            fill_type="solid",
+                        )
+                    )
+
+
+def create_insertion_queue(common_columns, supplier_value_columns_dict):
+    """
+    Create a queue of columns to be inserted into the final combined sheet.
+
+    The queue is sorted by column letter and includes a secondary sort by source type.
+    Priority: template columns come before supplier columns with the same letter.
+
+    Parameters:
+    common_columns (list): A list of common column letters between the template and supplier sheets.
+    supplier_value_columns_dict (dict): A dictionary mapping supplier names to their corresponding
+        columns of values to be inserted.
+
+    Returns:
+    deque: The insertion queue.
+    """
+    # Initialize a list to hold queue items
+    queue_items = []
+
+    # Add common columns from the template to the queue
+    for col in common_columns:
+        queue_items.append({"column_letter": col, "source": "template"})
+
+    # Add supplier columns to the queue
+    for supplier, supplier_columns in supplier_value_columns_dict.items():
+        for col in supplier_columns:
+            queue_items.append({"column_letter": col, "source": supplier})
+
+    # Sort the queue by column letter and include a secondary sort by source type
+    # Priority: template columns come before supplier columns with the same letter
+    queue_items.sort(key=lambda x: (x["column_letter"], x["source"] != "template"))
+
+    # Convert the sorted list into a deque (queue structure)
+    insertion_queue = deque(queue_items)
+
+    return insertion_queue
+
+
+def side_by_side_combine(
+    workbook,
+    template_sheets,
+    supplier_sheets_dict,
+    threshold=80,
+    summary_option=False,
+    workers=None,
+    matches=None,
+):
+    """
+    Combine the template sheets with the supplier sheets side by side.
+
+    Parameters:
+    workbook (openpyxl.Workbook): The workbook to combine the sheets into.
+    template_sheets (list): A list of template sheets to combine.
+    supplier_sheets_dict (dict): A dictionary mapping supplier names to their
+        corresponding sheets to combine.
+    threshold (int): The threshold for fuzzy matching between the template and
+        supplier sheets.
+    workers (int): The number of worker processes, one template sheet per worker.
+        Defaults to the number of CPUs when there are enough template sheets.
+    matches (dict): The column matches computed beforehand by
+        ``match_supplier_sheets``. If None, the columns are matched here.
+
+    Returns:
+    openpyxl.Workbook: The combined workbook with all the sheets.
+    """
+    notify(f"Combining files in progress...", icon="⏳")
+
+    jobs = get_sheet_jobs(template_sheets, supplier_sheets_dict, matches)
+    if get_worker_count(len(jobs), workers) > 1:
+        for title in combine_sheets_in_parallel(
+            workbook,
+            "side_by_side",
+            jobs,
+            threshold,
+            summary_option,
+            workers=workers,
+        ):
+            notify(f"{title} consolidated!", icon="✔️")
+    else:
+        # Iterate over each template sheet
+        for template_sheet, supplier_sheets, sheet_matches in jobs:
+            combine_sheet_side_by_side(
+                workbook,
+                template_sheet,
+                supplier_sheets,
+                threshold,
+                summary_option,
+                sheet_matches,
+            )
+            notify(f"{template_sheet.title} consolidated!", icon="✔️")
+    # Remove the default sheet if it exists
+    if "Sheet" in workbook.sheetnames:
+        workbook.remove(workbook["Sheet"])
+
+    # Final success toast
+    notify("Side-By-Side File combined successfully! Ready to download", icon="🎉")
+
+    return workbook
+
+
+def combine_sheet_side_by_side(
+    workbook,
+    template_sheet,
+    supplier_sheets,
+    threshold=80,
+    summary_option=False,
+    matches=None,
+):
+    """
+    Add the copy of one template sheet and its side-by-side comparison to the workbook.
+
+    Args:
+        workbook (openpyxl.Workbook): The workbook to add the sheets to.
+        template_sheet (openpyxl.Worksheet): The template sheet.
+        supplier_sheets (dict): A dictionary mapping supplier names to their sheet
+            matching the template sheet.
+        threshold (int): The threshold for fuzzy matching.
+        summary_option (bool): Whether to add a summary below each supplier column.
+        matches (dict): A dictionary mapping supplier names to their
+            ``find_matching_cols`` result for this sheet, None to match the columns here.
+
+    Returns:
+        bool: True if the comparison sheet was filled, False if there were no columns to process.
+    """
+    print(f"Processing template sheet: {template_sheet.title}")
+
+    # Create a new sheet in the workbook for each template sheet
+    target_sheet_template = workbook.create_sheet(
+        get_unique_sheet_title(workbook, f"{template_sheet.title} Template")
+    )
+    copy_sheet(template_sheet, target_sheet_template)
+
+    # Create a new sheet in the workbook for side-by-side comparison
+    target_sheet = workbook.create_sheet(
+        get_unique_sheet_title(workbook, f"Combined {template_sheet.title}")
+    )
+
+    # Initialize variables to store column data and mismatched rows
+    common_columns = (
+        []
+    )  # List of common column letters between the template and supplier sheets
+    uncommon_columns = (
+        []
+    )  # List of columns that are not common between the template and supplier sheets
+    mis_mat_rows_dict = (
+        {}
+    )  # Dictionary mapping supplier names to their corresponding mismatched rows
+    supplier_value_columns_dict = (
+        {}
+    )  # Dictionary mapping supplier names to their corresponding columns of values
+    supplier_colors = (
+        {}
+    )  # Dictionary mapping supplier names to their corresponding fill colors
+    color_cycle = fill_color_switch()
+
+    # Iterate over each supplier and process their sheet
+    for supplier in supplier_sheets:
+        if supplier not in supplier_colors:
+            supplier_colors[supplier] = next(color_cycle)
+
+        supplier_sheet = supplier_sheets[supplier]
+        if matches is not None:
+            com_columns, mis_mat_rows, supplier_value_columns = matches[supplier]
+        else:
+            com_columns, mis_mat_rows, supplier_value_columns = find_matching_cols(
+                template_sheet, supplier_sheet, threshold
+            )
+
+        # Add matching columns to the final list (ensure no duplicates)
+        common_columns.extend(
+            [col for col in com_columns if col not in common_columns]
+        )
+        uncommon_columns.extend(
+            [col for col in supplier_value_columns if col not in uncommon_columns]
+        )
+
+        # Store mismatched rows and value columns for the supplier
+        mis_mat_rows_dict[supplier] = mis_mat_rows
+        supplier_value_columns_dict[supplier] = supplier_value_columns
+
+    # Copy common columns from template to target sheet
+    queue = create_insertion_queue(common_columns, supplier_value_columns_dict)
+    if not queue:
+        print("No columns to process for this template sheet.")
+        return False
+
+    for i, item in enumerate(queue):
+        col_letter = item["column_letter"]
+        source = item["source"]
+        header_fill_color = None
+        mis_mat_rows = None
+
+        # Determine the source sheet
+        if source == "template":
+            source_sheet = template_sheet
+        else:
+            source_sheet = supplier_sheets[source]
+            header_fill_color = supplier_colors[source]
+            mis_mat_rows = mis_mat_rows_dict[source]
+
+        # Get column indices
+        col_idx_source = column_index_from_string(col_letter)
+        col_idx_target = i + 1  # Insert in the order of the queue
+
+        # Copy column
+        end_row_write = copy_column(
+            source_sheet, target_sheet, col_idx_source, col_idx_target, mis_mat_rows
+        )
+        # format the header cell for the supplier if there are mismatched rows
+        if header_fill_color:
+            # header cell is the first bold cell in the column
+            header_cell = target_sheet.cell(row=1, column=col_idx_target)
+            header_cell.fill = PatternFill(
+                fill_type="solid", start_color=header_fill_color
+            )
+            # change the value of the header cell to include the supplier name
+            if header_cell.value:
+                header_cell.value = f"{source}  {header_cell.value}"
+            else:
+                header_cell.value = f"{source}"
+
+            header_cell.font = Font(name="Arial", size=15, bold=True)
+            header_cell.alignment = Alignment(
+                horizontal="center", vertical="center"
+            )
+            # apply color formatting to the data rows
+            fill_column_rows(
+                target_sheet, col_idx_target, 2, end_row_write, header_fill_color
+            )
+            # Add summary if requested
+            if summary_option:
+                # Rows are copied one to one, so read the cached text of the source column
+                source_text = " ".join(
+                    text
+                    for _, text in get_column_text(
+                        source_sheet, col_idx_source, min_row=2, max_row=end_row_write
+                    )
+                )
+                if len(source_text.split()) > 5:
+                    summary = summarize_column_simple(source_text)
+                    target_sheet.cell(
+                        row=end_row_write + 1,
+                        column=col_idx_target,
+                        value="Summary:",
+                    )
+                    summary_cell = target_sheet.cell(
+                        row=end_row_write + 2, column=col_idx_target
+                    )
+                    summary_cell.value = summary
+                    summary_cell.font = Font(name="Arial", size=12, bold=False)
+                    summary_cell.fill = PatternFill(
+                        fill_type="solid", start_color="BFFFFF"
+                    )
+                    summary_cell.alignment = Alignment(
+                        horizontal="center", vertical="center", wrap_text=True
+                    )
+
+    # Copy the template sheet attributes to the target sheet
+    # copy_sheet_attributes(template_sheet, target_sheet)
+    return True
+
+
+def fill_column_rows(
+    sheet, col_idx, first_row, last_row, color, color_to_avoid="FAA0A0"
+):
+    """
+    Fill the rows of a column with a solid color, without creating empty cells.
+
+    The existing cells are filled directly, unless their fill is ``color_to_avoid``
+    (the mismatch highlight). The rows without a cell are filled with a conditional
+    format over their ranges, so no empty cell is written to the output.
+
+    Args:
+        sheet (openpyxl.Worksheet): The sheet to fill.
+        col_idx (int): The column index.
+        first_row (int): The first row to fill.
+        last_row (int): The last row to fill.
+        color (str): The fill color.
+        color_to_avoid (str): The fill color of the cells to leave as is.
+    """
+    col_letter = get_column_letter(col_idx)
+    fill = PatternFill(fill_type="solid", start_color=color, end_color=color)
+    empty_ranges = []
+    for row in range(first_row, last_row + 1):
+        cell_to_fill = sheet._cells.get((row, col_idx))
+        if cell_to_fill is None:
+            # Extend the current range of empty rows or start a new one
+            if empty_ranges and empty_ranges[-1][1] == row - 1:
+                empty_ranges[-1][1] = row
+            else:
+                empty_ranges.append([row, row])
+            continue
+        # only fill if the fill color is not the color to avoid
+        if (
+            cell_to_fill.fill
+            and cell_to_fill.fill.start_color
+            and cell_to_fill.fill.start_color.rgb
+        ):
+            existing_color = str(cell_to_fill.fill.start_color.rgb)
+        else:
+            existing_color = ""
+        if color_to_avoid not in existing_color:
+            cell_to_fill.fill = copy(fill)
+
+    if empty_ranges:
+        sheet.conditional_formatting.add(
+            " ".join(
+                f"{col_letter}{start}:{col_letter}{end}" for start, end in empty_ranges
+            ),
+            FormulaRule(formula=["TRUE"], fill=fill),
+        )
+
+
+def get_sheet_jobs(template_sheets, supplier_sheets_dict, matches=None):
+    """
+    Pair each template sheet with the matching sheet of every supplier.
+
+    Args:
+        template_sheets (list): A list of template sheets.
+        supplier_sheets_dict (dict): A dictionary mapping supplier names to their
+            sheets, in the order of the template sheets.
+        matches (dict): The column matches of ``match_supplier_sheets``, or None.
+
+    Returns:
+        list: A list of (template_sheet, {supplier: supplier_sheet}, sheet_matches)
+            tuples, where sheet_matches maps the suppliers to their column matches
+            for the sheet, or is None.
+    """
+    return [
+        (
+            template_sheet,
+            {
+                supplier: supplier_sheets_dict[supplier][idx]
+                for supplier in supplier_sheets_dict
+            },
+            (
+                {supplier: matches[supplier][idx] for supplier in supplier_sheets_dict}
+                if matches is not None
+                else None
+            ),
+        )
+        for idx, template_sheet in enumerate(template_sheets)
+    ]
+
+
+def get_worker_count(n_jobs, workers=None):
+    """
+    Return the number of worker processes to use for the given number of sheet jobs.
+
+    Args:
+        n_jobs (int): The number of template sheets to combine.
+        workers (int): The requested number of workers. If None, use all CPUs when
+            there are at least ``PARALLEL_MIN_SHEETS`` template sheets.
+
+    Returns:
+        int: The number of workers, 1 meaning the sheets are combined in this process.
+    """
+    if workers is None:
+        if n_jobs < PARALLEL_MIN_SHEETS:
+            return 1
+        workers = os.cpu_count() or 1
+    return max(1, min(workers, n_jobs))
+
+
+def combine_sheet_job(
+    mode,
+    template_snapshot,
+    supplier_snapshots,
+    threshold=80,
+    summary_option=False,
+    matches=None,
+):
+    """
+    Combine one template sheet in a worker process.
+
+    Args:
+        mode (str): Either "side_by_side" or "separate".
+        template_snapshot (dict): The snapshot of the template sheet.
+        supplier_snapshots (dict): A dictionary mapping supplier names to the snapshot
+            of their matching sheet.
+        threshold (int): The threshold for fuzzy matching.
+        summary_option (bool): Whether to add summaries (side by side only).
+        matches (dict): The column matches of the sheet (side by side only), or None.
+
+    Returns:
+        list: The snapshots of the combined sheets, in the order they were created.
+    """
+    source_workbook = openpyxl.Workbook()
+    template_sheet = restore_sheet(
+        template_snapshot, source_workbook.create_sheet(template_snapshot["title"])
+    )
+    supplier_sheets = {
+        supplier: restore_sheet(snapshot, source_workbook.create_sheet(snapshot["title"]))
+        for supplier, snapshot in supplier_snapshots.items()
+    }
+
+    workbook = openpyxl.Workbook()
+    workbook.remove(workbook.active)
+    if mode == "side_by_side":
+        combine_sheet_side_by_side(
+            workbook, template_sheet, supplier_sheets, threshold, summary_option, matches
+        )
+    else:
+        combine_sheet_separate(workbook, template_sheet, supplier_sheets, threshold)
+    return [snapshot_sheet(sheet) for sheet in workbook.worksheets]
+
+
+def combine_sheets_in_parallel(
+    workbook, mode, jobs, threshold=80, summary_option=False, workers=None
+):
+    """
+    Combine each template sheet in its own worker process and add the results to the
+    workbook in the original order of the template sheets.
+
+    Sheets are sent to and from the workers as snapshots (see ``snapshot_sheet``). If
+    the worker pool cannot be used, the sheets are combined in this process instead.
+
+    Args:
+        workbook (openpyxl.Workbook): The workbook to add the combined sheets to.
+        mode (str): Either "side_by_side" or "separate".
+        jobs (list): The (template_sheet, {supplier: supplier_sheet}, sheet_matches)
+            tuples to combine (see ``get_sheet_jobs``).
+        threshold (int): The threshold for fuzzy matching.
+        summary_option (bool): Whether to add summaries (side by side only).
+        workers (int): The number of worker processes.
+
+    Yields:
+        str: The title of each template sheet once its result is in the workbook.
+    """
+    try:
+        with ProcessPoolExecutor(
+            max_workers=get_worker_count(len(jobs), workers),
+            mp_context=multiprocessing.get_context("spawn"),
+        ) as executor:
+            futures = [
+                executor.submit(
+                    combine_sheet_job,
+                    mode,
+                    snapshot_sheet(template_sheet),
+                    {
+                        supplier: snapshot_sheet(sheet)
+                        for supplier, sheet in supplier_sheets.items()
+                    },
+                    threshold,
+                    summary_option,
+                    sheet_matches,
+                )
+                for template_sheet, supplier_sheets, sheet_matches in jobs
+            ]
+            results = [future.result() for future in futures]
+    except (BrokenProcessPool, OSError, PicklingError) as e:
+        print(f"Parallel consolidation failed, combining sheets sequentially: {e}")
+        for template_sheet, supplier_sheets, sheet_matches in jobs:
+            if mode == "side_by_side":
+                combine_sheet_side_by_side(
+                    workbook,
+                    template_sheet,
+                    supplier_sheets,
+                    threshold,
+                    summary_option,
+                    sheet_matches,
+                )
+            else:
+                combine_sheet_separate(
+                    workbook, template_sheet, supplier_sheets, threshold
+                )
+            yield template_sheet.title
+        return
+
+    # Assemble the results in the order of the template sheets, the titles made unique
+    # across the jobs as in a sequential run
+    for (template_sheet, _, _), snapshots in zip(jobs, results):
+        for snapshot in snapshots:
+            restore_sheet(
+                snapshot,
+                workbook.create_sheet(
+                    get_unique_sheet_title(workbook, snapshot["title"])
+                ),
+            )
+        yield template_sheet.title
+
+
+# Function to summarize text using Sumy
+def summarize_column_simple(text: str, sentence_count: int = 3) -> str:
+    """
+    Summarize the given text using Sumy's Latent Semantic Analysis (LSA) summarizer.
+
+    Args:
+        text (str): The text to be summarized.
+        sentence_count (int, optional): The number of sentences in the summary. Defaults to 3.
+
+    Returns:
+        str: The summary of the text.
+    """
+    try:
+        # Create a Sumy parser from the text
+        parser = PlaintextParser.from_string(text, Tokenizer("english"))
+
+        # Create a Sumy LSA summarizer
+        summarizer = LsaSummarizer()
+
+        # Set the stop words for the summarizer to English
+        summarizer.stop_words = "english"
+
+        # Summarize the text
+        summary = summarizer(parser.document, sentence_count)
+
+        # Join the summary sentences into a single string
+        return " ".join(str(sentence) for sentence in summary)
+    except Exception as e:
+        # Return an error message if there's an exception
+        return f"Error summarizing text: {e}"
+
+
+# function to save the consolidated file and let it be downloadable by the user
+def save_consolidated_file(
+    consolidated, output_format="xlsx", compression_level=None, path=None
+):
+    """
+    Save the consolidated file to a BytesIO object (or to disk) and return it for downloading.
+
+    Args:
+        consolidated (openpyxl.Workbook): The consolidated workbook.
+        output_format (str): One of the keys of ``OUTPUT_FORMATS``:
+            "xlsx": the full workbook with all formatting and charts.
+            "lean_xlsx": the cell values only, written in write-only mode.
+            "csv": a zip archive with one CSV file per sheet.
+            "parquet": a zip archive with one Parquet file per sheet.
+        compression_level (int): The zip compression level (0-9) of the xlsx and zip
+            archives. None uses the default level.
+        path (str): If given, the file is written to this path instead of memory.
+
+    Returns:
+        io.BytesIO: The BytesIO object containing the file, or the path if given.
+    """
+    if path:
+        with open(path, "wb") as file_stream:
+            write_consolidated_file(
+                consolidated, file_stream, output_format, compression_level
+            )
+        return path
+
+    # Create a BytesIO object to store the workbook
+    file_stream = io.BytesIO()
+    write_consolidated_file(consolidated, file_stream, output_format, compression_level)
+
+    # Reset the file pointer to the beginning of the BytesIO object
+    file_stream.seek(0)
+
+    return file_stream
+
+
+def write_consolidated_file(
+    consolidated, file_stream, output_format="xlsx", compression_level=None
+):
+    """
+    Write the consolidated file in the given format (see ``save_consolidated_file``).
+
+    Args:
+        consolidated (openpyxl.Workbook): The consolidated workbook.
+        file_stream: The binary file-like object to write to.
+        output_format (str): One of the keys of ``OUTPUT_FORMATS``.
+        compression_level (int): The zip compression level (0-9), None for the default.
+    """
+    if output_format == "xlsx":
+        if compression_level is None:
+            # Save the workbook to the file object
+            consolidated.save(file_stream)
+        else:
+            save_workbook_compressed(consolidated, file_stream, compression_level)
+    elif output_format == "lean_xlsx":
+        lean = openpyxl.Workbook(write_only=True)
+        for sheet in consolidated.worksheets:
+            lean_sheet = lean.create_sheet(sheet.title)
+            for row in sheet.iter_rows(values_only=True):
+                lean_sheet.append([get_plain_value(value) for value in row])
+        save_workbook_compressed(lean, file_stream, compression_level)
+    elif output_format in ("csv", "parquet"):
+        with zipfile.ZipFile(
+            file_stream,
+            "w",
+            zipfile.ZIP_DEFLATED,
+            compresslevel=compression_level,
+        ) as archive:
+            for sheet in consolidated.worksheets:
+                df = sheet_to_dataframe(sheet)
+                if output_format == "csv":
+                    archive.writestr(f"{sheet.title}.csv", df.to_csv(index=False))
+                else:
+                    df = to_single_type_columns(df)
+                    archive.writestr(f"{sheet.title}.parquet", df.to_parquet(index=False))
+    else:
+        raise ValueError(f"Unknown output format: {output_format}")
+
+
+def save_workbook_compressed(workbook, file_stream, compression_level=None):
+    """
+    Save a workbook with the given zip compression level.
+
+    Args:
+        workbook (openpyxl.Workbook): The workbook to save.
+        file_stream: The path or file-like object to save to.
+        compression_level (int): The zip compression level (0-9), None for the default.
+    """
+    archive = zipfile.ZipFile(
+        file_stream,
+        "w",
+        zipfile.ZIP_DEFLATED,
+        allowZip64=True,
+        compresslevel=compression_level,
+    )
+    writer = ExcelWriter(workbook, archive)
+    writer.save()
+
+
+def get_plain_value(value):
+    """
+    Return the value of a cell without rich text formatting.
+
+    Args:
+        value: The cell value.
+
+    Returns:
+        The text of rich text values, the value itself otherwise.
+    """
+    if isinstance(value, CellRichText):
+        return str(value)
+    return value
+
+
+def sheet_to_dataframe(sheet):
+    """
+    Read the values of a sheet into a DataFrame, using the first row as the header.
+
+    Empty and duplicated header cells are replaced by the column letter.
+
+    Args:
+        sheet (openpyxl.Worksheet): The sheet to read.
+
+    Returns:
+        pd.DataFrame: The values of the sheet.
+    """
+    rows = [
+        [get_plain_value(value) for value in row]
+        for row in sheet.iter_rows(values_only=True)
+    ]
+    if not rows:
+        return pd.DataFrame()
+    header = []
+    for idx, value in enumerate(rows[0], start=1):
+        name = str(value) if value not in (None, "") else get_column_letter(idx)
+        if name in header:
+            name = get_column_letter(idx)
+        header.append(name)
+    return pd.DataFrame(rows[1:], columns=header)
+
+
+def to_single_type_columns(df):
+    """
+    Give each column of a sheet DataFrame a single type, as Parquet and Arrow need.
+
+    Numeric columns are kept, the other columns are converted to text.
+
+    Args:
+        df (pd.DataFrame): The DataFrame returned by ``sheet_to_dataframe``.
+
+    Returns:
+        pd.DataFrame: The same DataFrame, converted in place.
+    """
+    for col in df.columns:
+        if not pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = df[col].map(lambda value: None if value is None else str(value))
+    return df
+
+
+def get_supplier_columns(headers, supplier_names):
+    """
+    Group the columns of a combined sheet by supplier.
+
+    Supplier columns are the ones whose header starts with the supplier name, as
+    written by ``side_by_side_combine``.
+
+    Args:
+        headers (list): The header of each column.
+        supplier_names (list): The supplier names.
+
+    Returns:
+        dict: A dictionary mapping each supplier name to the headers of its columns.
+            The columns that belong to no supplier are listed under None.
+    """
+    # Try the longest names first, so that "Acme Corp" is not taken for "Acme"
+    names = sorted(supplier_names, key=len, reverse=True)
+    columns = {supplier: [] for supplier in supplier_names}
+    columns[None] = []
+    for header in headers:
+        columns[get_column_owner(header, names)].append(header)
+    return columns
+
+
+def get_column_owner(header, supplier_names):
+    """
+    Return the supplier a column of a combined sheet belongs to.
+
+    Args:
+        header: The header of the column.
+        supplier_names (list): The supplier names, longest first so that "Acme Corp"
+            is not taken for "Acme".
+
+    Returns:
+        str: The supplier name, or None if the column belongs to no supplier.
+    """
+    text = str(header) if header is not None else ""
+    return next(
+        (
+            name
+            for name in supplier_names
+            if text == name or text.startswith(f"{name} ")
+        ),
+        None,
+    )
+
+
+def get_unique_sheet_title(workbook, title, max_length=30):
+    """
+    Shorten a sheet title to the length allowed by Excel, keeping it unique in the
+    workbook.
+
+    Titles already in use get a number at the end (" (2)", " (3)"...), so that
+    truncated titles do not collide and get renamed by openpyxl.
+
+    Args:
+        workbook (openpyxl.Workbook): The workbook the sheet will be added to.
+        title (str): The wanted title.
+        max_length (int): The maximum length of the title.
+
+    Returns:
+        str: The unique title.
+    """
+    used = {sheet_title.lower() for sheet_title in workbook.sheetnames}
+    unique_title = title[:max_length]
+    number = 2
+    while unique_title.lower() in used:
+        suffix = f" ({number})"
+        unique_title = title[: max_length - len(suffix)] + suffix
+        number += 1
+    return unique_title
+
+
+def get_combined_sheet_titles(workbook, template_sheets):
+    """
+    Return the title of the combined sheet of each template sheet of a side-by-side
+    workbook, as created (see ``get_unique_sheet_title``).
+
+    ``side_by_side_combine`` adds a copy of each template sheet followed by its
+    combined sheet, in the order of the template sheets, so this must be called before
+    other sheets are added.
+
+    Args:
+        workbook (openpyxl.Workbook): The workbook returned by ``side_by_side_combine``.
+        template_sheets (list): The template sheets, in the order they were combined.
+
+    Returns:
+        dict: A dictionary mapping the template sheet titles to the titles of their
+            combined sheets.
+    """
+    return {
+        template_sheet.title: sheet.title
+        for template_sheet, sheet in zip(template_sheets, workbook.worksheets[1::2])
+    }
+
+
+def get_side_by_side_columns(headers, supplier_names):
+    """
+    Split the columns of a side-by-side combined sheet into supplier and label columns.
+
+    Side-by-side sheets have one column per supplier for each value column of the
+    template, so the k-th column of each supplier holds the same field.
+
+    Args:
+        headers (tuple): The values of the first row of the sheet.
+        supplier_names (list): The supplier names.
+
+    Returns:
+        tuple: A dictionary mapping each supplier name to the indexes (0-based) of its
+            columns, and the list of the indexes of the other (label) columns.
+    """
+    names = sorted(supplier_names, key=len, reverse=True)
+    supplier_cols = {supplier: [] for supplier in supplier_names}
+    label_cols = []
+    for col_idx, header in enumerate(headers):
+        owner = get_column_owner(header, names)
+        if owner is None:
+            label_cols.append(col_idx)
+        else:
+            supplier_cols[owner].append(col_idx)
+    return supplier_cols, label_cols
+
+
+def append_logo(workbook, image_path, image_scale=0.8):
+    """
+    Append the logo to each sheet in the workbook.
+
+    Args:
+        workbook (openpyxl.Workbook): The workbook to append the logo to.
+        image_path (str): The path to the image file. If None or empty, no image is appended.
+        image_scale (float): The scale of the image. Default is 0.8.
+    """
+    # get all the sheet names
+    sheet_names = workbook.sheetnames
+    # get all the worksheets
+    worksheets = [workbook[sheet_name] for sheet_name in sheet_names]
+    for worksheet in worksheets:
+        # add logo to the first cell of the worksheet
+        if image_path:
+            # import the Image class from openpyxl.drawing.image
+            from openpyxl.drawing.image import Image
+
+            # create an Image object
+            logo = Image(image_path)
+            # scale the image
+            logo.width = int(logo.width * image_scale)
+            logo.height = int(logo.height * image_scale)
+            # add the image to the worksheet
+            worksheet.add_image(logo, "A1")
+
+    return workbook
+
+
+def copy_column(
+    source_sheet, target_sheet, source_col_idx, target_col_idx, mis_mat_rows=None
+):
+    """
+    Copy a column from the source sheet to the target sheet.
+
+    Args:
+        source_sheet (openpyxl.Worksheet): The source sheet.
+        target_sheet (openpyxl.Worksheet): The target sheet.
+        source_col_idx (int): The column index of the source sheet.
+        target_col_idx (int): The column index of the target sheet.
+        mis_mat_rows (list): The list of rows that have mismatched values between the source and target sheets.
+    Returns:
+        int: The row index of the last row copied.
+    """
+    target_col_letter = get_column_letter(target_col_idx)
+
+    # Initialize target_row at the first row of the target sheet
+    hidden_count = 0
+    end_row_idx = 500  # default value
+    # Track merged cells in the source column
+    # quick check the first 60 rows to see if there are any values, if all is empty, break the loop
+    max_rows_to_check = min(source_sheet.max_row, 60)
+    check_empty = 0
+    # Look the cells up without creating the missing ones
+    source_cells = source_sheet._cells
+    for row in range(1, max_rows_to_check + 1):
+        source_cell = source_cells.get((row, source_col_idx))
+        if source_cell is not None and source_cell.value not in (
+            None,
+            "",
+        ):  # If a non-empty cell is found, exit early
+            break
+        check_empty += 1
+
+    # If all rows are empty, exit the function
+    if check_empty == max_rows_to_check:
+        return end_row_idx
+    target_row = 1
+    merged_dict = generate_merged_dict(source_sheet)
+    layout = get_sheet_layout(source_sheet)
+    # Iterate over each row in the source sheet
+    empty_rows_cont = 0
+    mismatch_rows = set()
+    if mis_mat_rows:
+        # Rows where the previous column has a mismatched value
+        for col_mis, row_mis in map(coordinate_from_string, mis_mat_rows):
+            if source_col_idx - column_index_from_string(col_mis) == 1:
+                mismatch_rows.add(row_mis)
+    for row in range(1, min(source_sheet.max_row + 1, 500)):
+        source_cell = source_cells.get((row, source_col_idx))
+        if source_cell is None or source_cell.value is None or source_cell.value == "":
+            empty_rows_cont += 1
+            if empty_rows_cont > 80:
+                end_row_idx = row - empty_rows_cont + 1
+
+                break
+        else:
+            empty_rows_cont = 0
+        # Skip hidden rows in the source sheet
+        if is_hidden(layout["hidden_rows"], row):
+            hidden_count += 1
+            if hidden_count > 60:
+
+                end_row_idx = row - empty_rows_cont + 1
+
+                break
+        else:
+            hidden_count = 0
+
+        # Sparse write: only create the target cells that carry something
+        if source_cell is None or (
+            source_cell.value is None
+            and not source_cell.has_style
+            and not source_cell.hyperlink
+            and not source_cell.comment
+        ):
+            if row in mismatch_rows:
+                target_sheet.cell(row=target_row, column=target_col_idx).fill = (
+                    PatternFill(
+                        start_color="FAA0A0", end_color="FAA0A0", fill_type="solid"
+                    )
+                )
+            target_row += 1
+            continue
+
+        target_cell = target_sheet.cell(row=target_row, column=target_col_idx)
+        source_cell_value = copy(source_cell.value)
+        target_cell.value = source_cell_value
+        target_cell.data_type = copy(source_cell.data_type)
+
+        try:
+            if source_cell.has_style:
+                target_cell.font = copy(source_cell.font)
+                target_cell.border = copy(source_cell.border)
+                target_cell.fill = copy(source_cell.fill)
+                target_cell.number_format = copy(source_cell.number_format)
+                target_cell.protection = copy(source_cell.protection)
+                target_cell.alignment = copy(source_cell.alignment)
+        except Exception as e:
+            print(f"Error copying styles for cell {source_cell.coordinate}: {e}")
+
+        if source_cell.hyperlink:
+            target_cell.hyperlink = source_cell.hyperlink
+
+        if source_cell.comment:
+            target_cell.comment = copy(source_cell.comment)
+        if row in mismatch_rows:
+            target_cell.fill = PatternFill(
+                start_color="FAA0A0", end_color="FAA0A0", fill_type="solid"
+            )
+
+        target_row += 1
+
+    if end_row_idx == 500:
+        end_row_idx = target_row - empty_rows_cont + 1
+
+    # Perform merging of cells after copying data
+    merge_columns_in_target_sheet(
+        target_sheet, merged_dict, source_col_idx, target_col_idx
+    )
+
+    # Copy column width and hidden property
+    target_dim = target_sheet.column_dimensions[target_col_letter]
+    if source_col_idx in layout["column_widths"]:
+        target_dim.width = layout["column_widths"][source_col_idx]
+    target_dim.hidden = is_hidden(layout["hidden_columns"], source_col_idx)
+
+    return end_row_idx
+
+
+# function to copy the sheet from source to target
+def copy_sheet(source_sheet, target_sheet):
+    """
+    Copy all columns and sheet-level attributes from the source sheet to the target sheet.
+
+    Args:
+        source_sheet (openpyxl.Worksheet): The sheet to copy from.
+        target_sheet (openpyxl.Worksheet): The sheet to copy to.
+    """
+    hidden_count = 0  # Counter to track consecutive hidden columns
+    hidden_columns = get_sheet_layout(source_sheet)["hidden_columns"]
+    for col_idx in range(1, min(source_sheet.max_column, 100) + 1):
+        # Check if the column is hidden
+        if is_hidden(hidden_columns, col_idx):
+            hidden_count += 1
+            if (
+                hidden_count > 60
+            ):  # Stop copying if more than 60 consecutive columns are hidden
+                break
+            continue
+
+        # Copy the column to the same index in the target
+        _ = copy_column(source_sheet, target_sheet, col_idx, col_idx)
+
+    # Copy sheet-level attributes
+    copy_sheet_attributes(source_sheet, target_sheet)
+
+
+def copy_sheet_attributes(source_sheet, target_sheet):
+    """
+    Copy various attributes from a source sheet to a target sheet.
+
+    Args:
+        source_sheet (openpyxl.Worksheet): The sheet to copy attributes from.
+        target_sheet (openpyxl.Worksheet): The sheet to copy attributes to.
+    """
+    # Copy basic sheet properties
+    target_sheet.sheet_format = copy(source_sheet.sheet_format)
+    target_sheet.sheet_properties = copy(source_sheet.sheet_properties)
+    target_sheet.page_margins = copy(source_sheet.page_margins)
+    target_sheet.page_setup = copy(source_sheet.page_setup)
+    target_sheet.print_options = copy(source_sheet.print_options)
+    target_sheet.auto_filter = copy(source_sheet.auto_filter)
+    target_sheet.print_area = source_sheet.print_area
+    target_sheet.freeze_panes = source_sheet.freeze_panes
+
+    # Copy the row heights
+    for rn, height in get_sheet_layout(source_sheet)["row_heights"].items():
+        target_sheet.row_dimensions[rn].ht = height
+
+    # Copy merged cell ranges
+    for merged_range in source_sheet.merged_cells.ranges:
+        target_sheet.merge_cells(str(merged_range))
+
+    # Copy sheet protection settings
+    target_sheet.protection = copy(source_sheet.protection)
+
+
+def write_summary_to_sheet(summary_df, grand_total_df, summary_sheet):
+    """
+    Write the summary DataFrame and grand total DataFrame to the summary sheet.
+
+    Args:
+        summary_df (pd.DataFrame): The summary DataFrame
+        grand_total_df (pd.DataFrame): The grand total DataFrame
+        summary_sheet (openpyxl.worksheet.worksheet.Worksheet): The summary sheet
+
+    Note:
+        This function writes the summary DataFrame to the sheet, then writes the
+        grand total DataFrame to the sheet below the summary DataFrame. It also
+        formats the sheet by applying borders to all cells and setting the column
+        widths to auto based on the content.
+    """
+    if not summary_df.empty:
+        # Pivot the summary DataFrame
+        merged_df = summary_df.pivot_table(
+            index=["Category", "Subcategory"],
+            values=[
+                col
+                for col in summary_df.columns
+                if col not in ["Category", "Subcategory"]
+            ],
+            aggfunc="first",
+        ).reset_index()
+
+        # Write merged_df to the sheet
+        for r in dataframe_to_rows(merged_df, index=False, header=True):
+            summary_sheet.append(r)
+
+        # Separate `merged_df` and `grand_total_df` visually in the sheet
+        summary_sheet.append([])
+        summary_sheet.append(
+            ["Grand Total Summary"]
+        )  # Add a title row for grand_total_df
+
+        # Write grand_total_df to the sheet
+        for r in dataframe_to_rows(grand_total_df, index=False, header=True):
+            summary_sheet.append(r)
+
+        # Merge cells with the same value in column A (Category column)
+        current_value = None
+        start_row = None
+        for row in range(2, summary_sheet.max_row + 1):  # Skip header row
+            cell_value = summary_sheet.cell(row=row, column=1).value
+            if cell_value != current_value:
+                if start_row and current_value is not None:
+                    summary_sheet.merge_cells(
+                        start_row=start_row,
+                        start_column=1,
+                        end_row=row - 1,
+                        end_column=1,
+                    )
+                current_value = cell_value
+                start_row = row
+        if start_row and current_value is not None:
+            summary_sheet.merge_cells(
+                start_row=start_row,
+                start_column=1,
+                end_row=summary_sheet.max_row,
+                end_column=1,
+            )
+
+        # Format the sheet
+        header_fill = PatternFill(
+            start_color="4472C4", end_color="4472C4", fill_type="solid"
+        )
+        font_style_header = Font(b=True, color="FFFFFF")
+        border_style = Side(border_style="thin", color="000000")
+
+        # Apply borders and styles to all cells
+        grand_total_row = 1
+        for row in summary_sheet.iter_rows(
+            min_row=1,
+            max_row=summary_sheet.max_row,
+            min_col=1,
+            max_col=summary_sheet.max_column,
+        ):
+            for cell in row:
+                cell.border = Border(
+                    left=border_style,
+                    right=border_style,
+                    top=border_style,
+                    bottom=border_style,
+                )
+                if cell.row == 1:
+                    cell.fill = header_fill
+                    cell.font = font_style_header
+                elif cell.value == "Grand Total Summary":
+                    # fill the cell with a different color
+                    cell.fill = PatternFill(
+                        start_color="FF0000", end_color="FF0000", fill_type="solid"
+                    )
+                    cell.font = font_style_header
+                    grand_total_row = cell.row
+
+        # Set the column width to auto based on the content
+        for col in range(1, summary_sheet.max_column + 1):
+            column = get_column_letter(col)
+            max_length = max(
+                len(str(summary_sheet.cell(row=row, column=col).value) or "")
+                for row in range(1, summary_sheet.max_row + 1)
+            )
+            summary_sheet.column_dimensions[column].width = max_length + 2
+
+        # Plot bar chart of the grand total summary
+        chart = BarChart()
+        chart.type = "col"  # Column chart
+        chart.grouping = "clustered"  # Set grouping to clustered
+        chart.title = "Supplier Price Comparison by Category"
+        chart.x_axis.title = "Category"
+        chart.y_axis.title = "Price"
+
+        data = Reference(
+            summary_sheet,
+            min_col=2,
+            min_row=grand_total_row + 1,
+            max_row=summary_sheet.max_row,
+            max_col=summary_sheet.max_column - 1,
+        )
+        categories = Reference(
+            summary_sheet,
+            min_col=1,
+            min_row=grand_total_row + 2,
+            max_row=summary_sheet.max_row,
+        )
+        chart.add_data(data, titles_from_data=True)
+        chart.set_categories(categories)
+        summary_sheet.add_chart(chart, "A" + str(summary_sheet.max_row + 2))
+        # Display the category in the x-axis
+
+        # Add a title for the chart
+        summary_sheet.cell(
+            row=summary_sheet.max_row + 4,
+            column=1,
+            value="Supplier Price Comparison by Category",
+        )
+
+
+def parse_price(value):
+    """
+    Read a price from a cell value.
+
+    Args:
+        value: The cell value, a number or a text such as "$1,200.50".
+
+    Returns:
+        float: The price, or NaN if the cell holds no price (empty, or a label such as
+            "Included in item 3").
+    """
+    if isinstance(value, bool) or value is None:
+        return math.nan
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, (str, CellRichText)):
+        match = PRICE_TEXT_RE.match(str(value))
+        if match:
+            return float(match.group(1).replace(",", ""))
+    return math.nan
+
+
+def add_price_summaries(workbook, supplier_names, header_rows=None):
+    """
+    Add a summary sheet with a price table and chart for each combined sheet of a
+    side-by-side workbook, in front of the other sheets.
+
+    Args:
+        workbook (openpyxl.Workbook): The side-by-side consolidated workbook.
+        supplier_names (list): The supplier names.
+        header_rows (dict): A dictionary mapping the combined sheet titles to the header
+            rows of their template (see ``create_summary_price_table``), or None.
+
+    Returns:
+        openpyxl.Workbook: The workbook with the summary sheets.
+    """
+    header_rows = header_rows or {}
+    # iterate over the sheets in the workbook and create a summary sheet
+    for sheet in list(workbook.worksheets):
+        # Skip template or non-price sheets if needed
+        if "Combined" in sheet.title:
+            # Create a new summary sheet
+            summary_sheet = workbook.create_sheet(
+                title=get_unique_sheet_title(workbook, f"Summary of {sheet.title}")
+            )
+            status_sum = create_summary_price_table(
+                summary_sheet,
+                sheet,
+                supplier_names,
+                header_rows.get(sheet.title),
+            )
+            # Move the summary sheet to the leftmost position
+            if status_sum:
+                workbook._sheets.remove(summary_sheet)
+                workbook._sheets.insert(0, summary_sheet)
+            else:
+                # remove the sheet if the summary is not created
+                workbook.remove(summary_sheet)
+    return workbook
+
+
+def create_summary_price_table(
+    summary_sheet, price_sheet, supplier_names, header_rows=None
+):
+    """
+    Create a summary price table by extracting price data from the price sheet
+    and writing it to the summary sheet.
+
+    Args:
+        summary_sheet (openpyxl.Worksheet): The worksheet to write the summary data.
+        price_sheet (openpyxl.Worksheet): The worksheet to extract price data from.
+        supplier_names (list): A list of supplier names to map columns.
+        header_rows (list): The rows holding the bold headers, from the template schema.
+            If None, every cell of the sheet is checked for bold headers. Bold cells of
+            the supplier columns are headers too, wherever they are, so that headers
+            added by a supplier are not summed as line items.
+
+    Returns:
+        int: 1 if the summary table is created successfully, 0 otherwise.
+    """
+    # Extract headers and map columns to suppliers
+    headers_dict = {}
+    if header_rows is not None:
+        # The supplier names are written in bold in the first row
+        rows = sorted(set(header_rows) | {1})
+        for col_idx in range(1, price_sheet.max_column + 1):
+            headers = []
+            for row in rows:
+                cell = price_sheet._cells.get((row, col_idx))
+                if cell is not None and cell.font.bold:
+                    headers.append((cell.value, row))
+            headers_dict[get_column_letter(col_idx)] = headers
+    else:
+        for col in price_sheet.iter_cols():
+            col_letter = get_column_letter(col[0].column)
+            headers = [(cell.value, cell.row) for cell in col if cell.font.bold]
+            headers_dict[col_letter] = headers
+
+    # Identify columns for price data
+    price_label_col = None
+    max_len = 0
+    supplier_cols_dict = defaultdict(list)
+    for key, value in headers_dict.items():
+        if value and value[0][1] == 1 and value[0][0] in supplier_names:
+            supplier_cols_dict[value[0][0]].append(key)
+        else:
+            if len(value) > max_len:
+                max_len = len(value)
+                price_label_col = key
+
+    # Rows in bold in a supplier column but not in the template, headers added by the
+    # supplier
+    supplier_header_rows = defaultdict(set)
+    supplier_columns = {
+        column_index_from_string(col)
+        for cols in supplier_cols_dict.values()
+        for col in cols
+    }
+    if header_rows is not None:
+        for (row, col_idx), cell in price_sheet._cells.items():
+            if col_idx in supplier_columns and cell.has_style and cell.font.bold:
+                supplier_header_rows[get_column_letter(col_idx)].add(row)
+    else:
+        for col_idx in supplier_columns:
+            col = get_column_letter(col_idx)
+            supplier_header_rows[col] = {row for _, row in headers_dict[col]}
+    template_header_rows = (
+        set(header_rows)
+        if header_rows is not None
+        else {row for _, row in headers_dict.get(price_label_col, [])}
+    )
+
+    # Compile summary data
+    summary_data = []
+    for supplier, cols in supplier_cols_dict.items():
+        for col in cols:
+            col_headers = headers_dict.get(col, [])
+            if len(col_headers) < 2:
+                continue
+            category = col_headers[1][0]
+            upper_row = headers_dict[price_label_col][0][1]
+            lower_row = headers_dict[price_label_col][0][1]
+            skip_rows = supplier_header_rows[col] - template_header_rows
+            for cate, row in headers_dict[price_label_col]:
+                if row > lower_row:
+                    lower_row = row
+                price_value = parse_price(price_sheet[f"{col}{row}"].value)
+                if not math.isnan(price_value):
+                    price_value = round(price_value, 2)
+                    summary_data.append(
+                        {
+                            "Category": category,
+                            "Subcategory": cate,
+                            supplier: price_value,
+                        }
+                    )
+                else:
+                    total_price = 0
+                    for row in range(upper_row, lower_row + 1):
+                        if row in skip_rows:
+                            continue
+                        # Labels such as "Included" are not prices
+                        price_value = parse_price(price_sheet[f"{col}{row}"].value)
+                        if not math.isnan(price_value):
+                            total_price += price_value
+                    if total_price > 0:
+                        total_price = round(total_price, 2)
+                        summary_data.append(
+                            {
+                                "Category": category,
+                                "Subcategory": cate,
+                                supplier: total_price,
+                            }
+                        )
+
+    # Convert summary data into DataFrame
+    summary_df = pd.DataFrame(summary_data)
+
+    # Pivot the DataFrame and reset the index
+    if not summary_df.empty:
+        merged_df = summary_df.pivot_table(
+            index=["Category", "Subcategory"],
+            values=[
+                col
+                for col in summary_df.columns
+                if col not in ["Category", "Subcategory"]
+            ],
+            aggfunc="first",
+        ).reset_index()
+
+        # Ensure that only existing suppliers are used
+        existing_suppliers = [
+            supplier for supplier in supplier_names if supplier in merged_df.columns
+        ]
+        if not existing_suppliers:
+            print("No valid suppliers found in the DataFrame columns.")
+            return summary_sheet
+        try:
+            grand_total_rows = merged_df[
+                merged_df["Subcategory"].str.contains(
+                    "grand total", case=False, na=False
+                )
+            ].index
+
+            if grand_total_rows.size > 0:
+                # Extract the rows containing 'Grand Total'
+                grand_total_df = merged_df.loc[grand_total_rows]
+                # drop the 'Subcategory' column
+                grand_total_df = grand_total_df.drop(columns=["Subcategory"])
+            else:
+                # Aggregate the data to compute the grand total
+                numeric_columns = merged_df.select_dtypes(include="number").columns
+                grand_total_df = (
+                    merged_df.groupby("Category")[numeric_columns].sum().reset_index()
+                )
+        except Exception as e:
+            print(f"Error Creating Summary Table: {e}")
+            return 0
+    else:
+        print("The summary_df is empty; ensure your input data is correct.")
+        return 0
+
+    # Write the summary and grand total data to the summary sheet
+    write_summary_to_sheet(merged_df, grand_total_df, summary_sheet)
+    return 1
@@ -1,5 +1,17 @@
+import zipfile
+
 import streamlit as st
 
+from tools.bulk_intake import ingest_files
+from tools.event_manifest import (
+    new_manifest,
+    new_supplier,
+    prune_manifest,
+    set_supplier_file,
+    set_template_file,
+)
+from tools.watch_folder import get_watch_root, resolve_watch_folder
+
 
 # Set initial configuration if not already set
 def initialize_session_state():
@@ -9,23 +21,49 @@ def initialize_session_state():
     The variables are:
     - event_name: The name of the RFP event, which will appear in the filename for the consolidated document.
     - event_option: The document configuration for this event, which can be either "In a Single File" or "In Separate Files".
-    - suppliers: A list of supplier names.
-    - template_files: A dictionary with keys "Pricing" and "Questionnaire", and values that are the uploaded template files.
+    - event_manifest: The templates and suppliers of the event, with the uploaded files spooled to disk (see ``new_manifest``).
     - doc_types: A list of document types, which is initially set to ["Pricing", "Questionnaire"].
+    - watch_folder: A folder where supplier response files arrive, empty if not watched.
+    - watch_auto: Whether to consolidate again when a watched file is added or changed.
     """
     if "event_name" not in st.session_state:
         st.session_state.event_name = ""
     if "event_option" not in st.session_state:
         st.session_state.event_option = "In a Single File"
-    if "suppliers" not in st.session_state:
-        st.session_state.suppliers = []
-    if "template_files" not in st.session_state:
-        st.session_state.template_files = {"Pricing": None, "Questionnaire": None}
     if "doc_types" not in st.session_state or len(st.session_state.doc_types) == 0:
         st.session_state.doc_types = ["Pricing", "Questionnaire"]
+    if "event_manifest" not in st.session_state:
+        st.session_state.event_manifest = new_manifest(st.session_state.doc_types)
+    if "watch_folder" not in st.session_state:
+        st.session_state.watch_folder = ""
+    if "watch_auto" not in st.session_state:
+        st.session_state.watch_auto = False
+
+
+def add_uploaded_file(set_file, manifest, *args):
+    """
+    Add an uploaded file to the event manifest, with a warning instead of an error when
+    the file is not a valid xlsx workbook.
+
+    Args:
+        set_file (function): ``set_template_file`` or ``set_supplier_file``.
+        manifest (dict): The event manifest.
+        *args: The other arguments of ``set_file``, the uploaded file last.
+    """
+    uploaded_file = args[-1]
+    try:
+        set_file(manifest, *args)
+    except (zipfile.BadZipFile, KeyError) as e:
+        print(f"Upload {uploaded_file.name} skipped: {e}")
+        st.warning(
+            f"**{uploaded_file.name}** cannot be read, please upload a valid .xlsx file.",
+            icon="⚠️",
+        )
 
 
 initialize_session_state()
+manifest = st.session_state.event_manifest
+doc_types = st.session_state.doc_types
 # Configuration form
 # st.image(r"assets/", width=200)
 st.write("# RFP Event Configuration")
@@ -56,76 +94,162 @@ st.write("### 🗝️ Template Files")
 if event_option == "In a Single File":
     st.markdown("#### :blue[**Combined** template file]")
     combined_template = st.file_uploader(
-        "Please upload Combined Template File", type=["xlsx", "xls"]
+        "Please upload Combined Template File", type=["xlsx"]
     )
     if combined_template:
-        st.session_state.template_files["Pricing"] = combined_template
-        st.session_state.template_files["Questionnaire"] = combined_template
+        add_uploaded_file(set_template_file, manifest, doc_types, combined_template)
 else:
     for doc_type in ["Pricing", "Questionnaire"]:
         st.markdown(
             f"#### :{'green' if doc_type == 'Pricing' else 'orange'}[**{doc_type}** template file]"
         )
         uploaded_file = st.file_uploader(
-            f"Please upload {doc_type} Template File", type=["xlsx", "xls"]
+            f"Please upload {doc_type} Template File", type=["xlsx"]
         )
         if uploaded_file:
-            st.session_state.template_files[doc_type] = uploaded_file
+            add_uploaded_file(set_template_file, manifest, [doc_type], uploaded_file)
 st.write("### 🗃️ Suppliers Response Files")
+# Bulk intake: all the response files at once, suppliers and roles inferred
+with st.expander("📦 Add many suppliers at once"):
+    bulk_files = st.file_uploader(
+        "Please upload a zip archive or several response files",
+        type=["xlsx", "zip"],
+        accept_multiple_files=True,
+        key="bulk_files",
+        help="Suppliers are named after the file names, or after their folder when the archive has one folder per supplier. Files with the same supplier name replace the files of that supplier.",
+    )
+    if st.button("Add to the event", disabled=not bulk_files):
+        with st.spinner("Reading files..."):
+            intake, skipped = ingest_files(
+                manifest, bulk_files, doc_types, event_option == "In a Single File"
+            )
+        st.session_state.bulk_skipped = skipped
+        if intake:
+            st.session_state.num_suppliers_input = len(manifest["suppliers"])
+            st.session_state.bulk_intake = intake
+            # New uploader widgets, so that the files they still hold do not replace
+            # the assignments of the bulk intake
+            st.session_state.uploader_generation = (
+                st.session_state.get("uploader_generation", 0) + 1
+            )
+        elif not skipped:
+            st.warning("No supplier response file (.xlsx) found.", icon="⚠️")
+    if st.session_state.get("bulk_skipped"):
+        st.warning(
+            "Skipped files: "
+            + "; ".join(
+                f"**{file_name}** {reason}"
+                for file_name, reason in st.session_state.bulk_skipped
+            ),
+            icon="⚠️",
+        )
+    if st.session_state.get("bulk_intake"):
+        st.dataframe(
+            [
+                {"File": file_name, "Supplier": name, "Documents": ", ".join(roles)}
+                for file_name, name, roles in st.session_state.bulk_intake
+            ],
+            hide_index=True,
+            use_container_width=True,
+        )
+
 # Number of suppliers
+if "num_suppliers_input" not in st.session_state:
+    st.session_state.num_suppliers_input = max(len(manifest["suppliers"]), 1)
 num_suppliers = st.number_input(
-    "Number of Suppliers in this event", min_value=1, step=1
+    "Number of Suppliers in this event",
+    min_value=1,
+    step=1,
+    key="num_suppliers_input",
 )
 st.session_state.num_suppliers = num_suppliers
 
 # Supplier details (ensure there is a supplier object for each supplier)
-if len(st.session_state.suppliers) < num_suppliers:
-    st.session_state.suppliers.extend(
-        [{"name": "", "Pricing": None, "Questionnaire": None}]
-        * (num_suppliers - len(st.session_state.suppliers))
+if len(manifest["suppliers"]) < num_suppliers:
+    manifest["suppliers"].extend(
+        new_supplier(doc_types=doc_types)
+        for _ in range(num_suppliers - len(manifest["suppliers"]))
     )
-elif len(st.session_state.suppliers) > num_suppliers:
-    st.session_state.suppliers = st.session_state.suppliers[:num_suppliers]
+elif len(manifest["suppliers"]) > num_suppliers:
+    manifest["suppliers"] = manifest["suppliers"][:num_suppliers]
+    prune_manifest(manifest)
 
 # Add Supplier Info Form
+uploader_generation = st.session_state.get("uploader_generation", 0)
 for i in range(num_suppliers):
+    supplier = manifest["suppliers"][i]
     with st.expander(f"Supplier {i + 1} Information"):
         supplier_name = st.text_input(
             f"Supplier {i + 1} Name",
-            value=st.session_state.suppliers[i]["name"],
+            value=supplier["name"],
             placeholder="This name will be used to refer to the supplier in the consolidated document.",
         )
-        st.session_state.suppliers[i]["name"] = supplier_name
+        supplier["name"] = supplier_name
 
         # Conditionally show file upload based on the event_option
         if event_option == "In a Single File":
             st.markdown("#### :blue[**Combined** response file]")
             combined_file = st.file_uploader(
                 f"Please upload Combined File for Supplier {i + 1}",
-                type=["xlsx", "xls"],
-                key=f"combined_{i}",
+                type=["xlsx"],
+                key=f"combined_{i}_{uploader_generation}",
             )
             if combined_file:
-                st.session_state.suppliers[i]["Pricing"] = combined_file
-                st.session_state.suppliers[i]["Questionnaire"] = combined_file
+                add_uploaded_file(
+                    set_supplier_file, manifest, supplier, doc_types, combined_file
+                )
         else:
             st.markdown("#### :green[**Pricing** file]")
             pricing_file = st.file_uploader(
                 f"Please upload Pricing File for Supplier {i + 1}",
-                type=["xlsx", "xls"],
-                key=f"pricing_{i}",
+                type=["xlsx"],
+                key=f"pricing_{i}_{uploader_generation}",
             )
             if pricing_file:
-                st.session_state.suppliers[i]["Pricing"] = pricing_file
+                add_uploaded_file(
+                    set_supplier_file, manifest, supplier, ["Pricing"], pricing_file
+                )
 
             st.markdown("#### :orange[**Questionnaire** file]")
             questionnaire_file = st.file_uploader(
                 f"Please upload Questionnaire File for Supplier {i + 1}",
-                type=["xlsx", "xls"],
-                key=f"questionnaire_{i}",
+                type=["xlsx"],
+                key=f"questionnaire_{i}_{uploader_generation}",
             )
             if questionnaire_file:
-                st.session_state.suppliers[i]["Questionnaire"] = questionnaire_file
+                add_uploaded_file(
+                    set_supplier_file,
+                    manifest,
+                    supplier,
+                    ["Questionnaire"],
+                    questionnaire_file,
+                )
+
+# Watch folder
+st.write("### 📂 Watch Folder")
+watch_root = get_watch_root()
+if watch_root is None:
+    st.caption(
+        "Watch folders are disabled. Set the `RFPDOCSUM_WATCH_ROOT` environment variable to the folder they must be inside to enable them."
+    )
+    st.session_state.watch_folder = ""
+else:
+    watch_folder = st.text_input(
+        f"Folder inside `{watch_root}` where supplier response files arrive (optional)",
+        value=st.session_state.watch_folder,
+        placeholder="New and updated .xlsx files in this folder are added to the suppliers, named after the file.",
+    )
+    resolved_folder = resolve_watch_folder(watch_folder.strip(), watch_root)
+    if watch_folder.strip() and resolved_folder is None:
+        st.warning(
+            f"This folder does not exist, cannot be read or is not inside `{watch_root}`.",
+            icon="⚠️",
+        )
+    st.session_state.watch_folder = watch_folder.strip()
+    st.session_state.watch_auto = st.checkbox(
+        "Consolidate again automatically when a response file is added or changed",
+        value=st.session_state.watch_auto,
+    )
 
 if st.button("Submit Configuration"):
     st.session_state.submitted = True
@@ -0,0 +1,307 @@
+import hashlib
+import io
+import os
+import tempfile
+import time
+import zipfile
+
+from tools.workbook_probe import probe_workbook
+
+# Size of the chunks copied and hashed when spooling a file
+SPOOL_CHUNK_SIZE = 1024 * 1024
+# Age (in seconds) after which unused spooled files are deleted
+SPOOL_MAX_AGE = 24 * 60 * 60
+
+
+class SpooledFile(io.FileIO):
+    """
+    A spooled event file opened for reading.
+
+    It can be used wherever an uploaded file is expected. The ``file_id`` is derived from
+    the content hash, so the workbook registry keeps its entries when the same file is
+    uploaded again.
+    """
+
+    def __init__(self, entry):
+        super().__init__(entry["path"], "rb")
+        self.name = entry["file_name"]
+        self.file_id = f"sha256:{entry['hash']}"
+        self.content_hash = entry["hash"]
+        self.probe = entry["sheets"]
+
+
+def get_spool_dir():
+    """
+    Return the folder where the event files are spooled.
+
+    Returns:
+        str: The path of the spool folder.
+    """
+    spool_dir = os.path.join(tempfile.gettempdir(), "rfpdocsum_uploads")
+    os.makedirs(spool_dir, exist_ok=True)
+    return spool_dir
+
+
+def new_manifest(doc_types=("Pricing", "Questionnaire")):
+    """
+    Return an empty event manifest.
+
+    The manifest only holds small dictionaries, the file contents stay on disk:
+        files: A dictionary mapping content hashes to the spooled files (see
+            ``spool_file``), shared by the templates and suppliers using them.
+        templates: A dictionary mapping each document type to the hash of its template.
+        suppliers: A list of suppliers (see ``new_supplier``).
+
+    Args:
+        doc_types (tuple): The document types of the event.
+
+    Returns:
+        dict: The manifest.
+    """
+    return {
+        "files": {},
+        "templates": {doc_type: None for doc_type in doc_types},
+        "suppliers": [],
+    }
+
+
+def new_supplier(name="", doc_types=("Pricing", "Questionnaire")):
+    """
+    Return a supplier of the event manifest without files.
+
+    Args:
+        name (str): The supplier name.
+        doc_types (tuple): The document types of the event.
+
+    Returns:
+        dict: The supplier with the keys name and roles, a dictionary mapping each
+            document type to the hash of the supplier file (None until uploaded).
+    """
+    return {"name": name, "roles": {doc_type: None for doc_type in doc_types}}
+
+
+def spool_file(source, file_name=None, chunk_size=SPOOL_CHUNK_SIZE):
+    """
+    Copy a file to the spool folder, named after the hash of its content.
+
+    Args:
+        source: A path or file-like object of the xlsx file.
+        file_name (str): The name of the file, defaults to the name of the source.
+        chunk_size (int): The number of bytes copied at a time.
+
+    Returns:
+        dict: The spooled file with the keys hash, path, file_name, size, sheets (see
+            ``probe_workbook``) and upload_id (the ``file_id`` of the source, if any).
+    """
+    cleanup_spool()
+    if file_name is None:
+        file_name = os.path.basename(getattr(source, "name", None) or str(source))
+    digest = hashlib.sha256()
+    fd, temp_path = tempfile.mkstemp(suffix=".tmp", dir=get_spool_dir())
+    try:
+        with os.fdopen(fd, "wb") as target:
+            if isinstance(source, (str, os.PathLike)):
+                file = open(source, "rb")
+            else:
+                source.seek(0)
+                file = source
+            try:
+                for chunk in iter(lambda: file.read(chunk_size), b""):
+                    digest.update(chunk)
+                    target.write(chunk)
+            finally:
+                if file is source:
+                    source.seek(0)
+                else:
+                    file.close()
+        # Files that are not xlsx workbooks are rejected before entering the spool
+        sheets = probe_workbook(temp_path)
+        path = os.path.join(get_spool_dir(), f"{digest.hexdigest()}.xlsx")
+        os.replace(temp_path, path)
+    except (OSError, zipfile.BadZipFile, KeyError):
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return {
+        "hash": digest.hexdigest(),
+        "path": path,
+        "file_name": file_name,
+        "size": os.path.getsize(path),
+        "sheets": sheets,
+        "upload_id": getattr(source, "file_id", None),
+    }
+
+
+def add_event_file(manifest, source, file_name=None):
+    """
+    Spool a file into the event manifest, unless the same upload was already spooled.
+
+    Args:
+        manifest (dict): The event manifest.
+        source: A path, uploaded file or file-like object of the xlsx file.
+        file_name (str): The name of the file, defaults to the name of the source.
+
+    Returns:
+        str: The content hash of the file.
+    """
+    upload_id = getattr(source, "file_id", None)
+    if upload_id:
+        # Uploaders return the same file on each rerun, do not copy it again
+        for file_hash, entry in manifest["files"].items():
+            if entry["upload_id"] == upload_id and os.path.exists(entry["path"]):
+                return file_hash
+    return add_spooled_file(manifest, spool_file(source, file_name))
+
+
+def add_spooled_file(manifest, entry):
+    """
+    Add a file spooled by ``spool_file`` to the event manifest.
+
+    Args:
+        manifest (dict): The event manifest.
+        entry (dict): The spooled file.
+
+    Returns:
+        str: The content hash of the file.
+    """
+    manifest["files"][entry["hash"]] = entry
+    return entry["hash"]
+
+
+def set_template_file(manifest, doc_types, source):
+    """
+    Use a file as the template of some document types.
+
+    Args:
+        manifest (dict): The event manifest.
+        doc_types (list): The document types the file is the template of.
+        source: A path, uploaded file or file-like object of the xlsx file.
+    """
+    file_hash = add_event_file(manifest, source)
+    for doc_type in doc_types:
+        manifest["templates"][doc_type] = file_hash
+    prune_manifest(manifest)
+
+
+def set_supplier_file(manifest, supplier, doc_types, source, file_name=None):
+    """
+    Use a file as the response of a supplier for some document types.
+
+    Args:
+        manifest (dict): The event manifest.
+        supplier (dict): The supplier of the manifest.
+        doc_types (list): The document types the file answers.
+        source: A path, uploaded file or file-like object of the xlsx file.
+        file_name (str): The name of the file, defaults to the name of the source.
+    """
+    file_hash = add_event_file(manifest, source, file_name)
+    for doc_type in doc_types:
+        supplier["roles"][doc_type] = file_hash
+    prune_manifest(manifest)
+
+
+def prune_manifest(manifest):
+    """
+    Drop the files of the manifest that are no longer used by a template or supplier.
+
+    Args:
+        manifest (dict): The event manifest.
+    """
+    used = set(manifest["templates"].values())
+    for supplier in manifest["suppliers"]:
+        used.update(supplier["roles"].values())
+    for file_hash in list(manifest["files"]):
+        if file_hash not in used:
+            del manifest["files"][file_hash]
+
+
+def open_event_files(manifest, open_files=None):
+    """
+    Open the spooled files of the manifest for reading.
+
+    The files opened by a previous call are reused, so that each rerun does not open
+    new handles. Those no longer in the manifest are closed.
+
+    Args:
+        manifest (dict): The event manifest.
+        open_files (dict): The result of the previous call, or None.
+
+    Returns:
+        dict: A dictionary mapping the content hashes to ``SpooledFile`` objects. Files
+            missing from the spool folder are left out.
+    """
+    open_files = open_files or {}
+    for file_hash, file in open_files.items():
+        if file_hash not in manifest["files"]:
+            file.close()
+    files = {}
+    for file_hash, entry in manifest["files"].items():
+        file = open_files.get(file_hash)
+        try:
+            # Mark the file as used for the cleanup of the spool folder
+            os.utime(entry["path"])
+            if file is None or file.closed:
+                file = SpooledFile(entry)
+            files[file_hash] = file
+        except OSError as e:
+            print(f"Could not open {entry['file_name']}: {e}")
+            if file is not None:
+                file.close()
+    return files
+
+
+def get_event_templates(manifest, files):
+    """
+    Return the template file of each document type.
+
+    Args:
+        manifest (dict): The event manifest.
+        files (dict): The files opened by ``open_event_files``.
+
+    Returns:
+        dict: A dictionary mapping the document types to their template file, or None.
+    """
+    return {
+        doc_type: files.get(file_hash)
+        for doc_type, file_hash in manifest["templates"].items()
+    }
+
+
+def get_event_suppliers(manifest, files):
+    """
+    Return the suppliers with their files, in the shape used by the consolidation.
+
+    Args:
+        manifest (dict): The event manifest.
+        files (dict): The files opened by ``open_event_files``.
+
+    Returns:
+        list: A list of dictionaries with the supplier name and, for each document type,
+            the supplier file (or None).
+    """
+    return [
+        {
+            "name": supplier["name"],
+            **{
+                doc_type: files.get(file_hash)
+                for doc_type, file_hash in supplier["roles"].items()
+            },
+        }
+        for supplier in manifest["suppliers"]
+    ]
+
+
+def cleanup_spool(max_age=SPOOL_MAX_AGE):
+    """
+    Delete the spooled files that were not used for ``max_age`` seconds.
+
+    Args:
+        max_age (int): The maximum age of the files to keep, in seconds.
+    """
+    now = time.time()
+    for entry in os.scandir(get_spool_dir()):
+        try:
+            if entry.is_file() and now - entry.stat().st_mtime > max_age:
+                os.remove(entry.path)
+        except OSError:
+            pass
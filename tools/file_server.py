@@ -0,0 +1,206 @@
+import os
+import secrets
+import shutil
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote
+
+# Size of the chunks read from disk and written to the client
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+# Age (in seconds) after which finished files are deleted from the download folder
+DOWNLOAD_MAX_AGE = 6 * 60 * 60
+
+
+def get_download_dir():
+    """
+    Return the folder where finished files are written before being downloaded.
+
+    Returns:
+        str: The path of the download folder.
+    """
+    download_dir = os.path.join(tempfile.gettempdir(), "rfpdocsum_downloads")
+    os.makedirs(download_dir, exist_ok=True)
+    return download_dir
+
+
+def get_cache_dir(name):
+    """
+    Return a folder of the persistent cache, shared by all sessions and app restarts.
+
+    The cache lives in ``~/.rfpdocsum`` unless the ``RFPDOCSUM_CACHE_DIR`` environment
+    variable points to another folder.
+
+    Args:
+        name (str): The name of the cache sub-folder.
+
+    Returns:
+        str: The path of the cache sub-folder.
+    """
+    cache_dir = os.environ.get(
+        "RFPDOCSUM_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".rfpdocsum")
+    )
+    path = os.path.join(cache_dir, name)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def link_or_copy(source, target):
+    """
+    Make a file available under another path, hard linking it when possible.
+
+    The target is marked as modified now. A hard link shares the modification time of
+    its source, and the download folder deletes files by age (see
+    ``cleanup_downloads``), so an old source would otherwise be deleted at once.
+
+    Args:
+        source (str): The path of the existing file.
+        target (str): The new path. An existing file is replaced.
+    """
+    if os.path.exists(target):
+        os.remove(target)
+    try:
+        os.link(source, target)
+    except OSError:
+        # Not on the same file system, or links not supported
+        shutil.copyfile(source, target)
+    os.utime(target)
+
+
+def new_download_path(extension):
+    """
+    Reserve a new file in the download folder.
+
+    Args:
+        extension (str): The file extension, without the dot.
+
+    Returns:
+        str: The path of the new (empty) file.
+    """
+    fd, path = tempfile.mkstemp(suffix=f".{extension}", dir=get_download_dir())
+    os.close(fd)
+    return path
+
+
+def cleanup_downloads(max_age=DOWNLOAD_MAX_AGE):
+    """
+    Delete the files of the download folder that are older than ``max_age`` seconds.
+
+    Args:
+        max_age (int): The maximum age of the files to keep, in seconds.
+    """
+    now = time.time()
+    for entry in os.scandir(get_download_dir()):
+        try:
+            if entry.is_file() and now - entry.stat().st_mtime > max_age:
+                os.remove(entry.path)
+        except OSError:
+            pass
+
+
+def stream_file(handler, path, file_name, mime, chunk_size=DOWNLOAD_CHUNK_SIZE):
+    """
+    Send a file as an HTTP attachment, reading and writing it in chunks.
+
+    Args:
+        handler (BaseHTTPRequestHandler): The handler of the request.
+        path (str): The path of the file to send.
+        file_name (str): The file name proposed to the browser.
+        mime (str): The MIME type of the file.
+        chunk_size (int): The number of bytes read and sent at a time.
+    """
+    handler.send_response(200)
+    handler.send_header("Content-Type", mime)
+    handler.send_header("Content-Length", str(os.path.getsize(path)))
+    handler.send_header(
+        "Content-Disposition", f"attachment; filename*=UTF-8''{quote(file_name)}"
+    )
+    handler.end_headers()
+    with open(path, "rb") as file:
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                break
+            handler.wfile.write(chunk)
+
+
+class DownloadRequestHandler(BaseHTTPRequestHandler):
+    """Serve the files registered on the server under ``/downloads/<token>``."""
+
+    def do_GET(self):
+        token = self.path.split("?")[0].rstrip("/").rsplit("/", 1)[-1]
+        download = self.server.downloads.get(token)
+        if not self.path.startswith("/downloads/") or download is None:
+            self.send_error(404, "File not found or expired")
+            return
+        if not os.path.exists(download["path"]):
+            self.server.downloads.pop(token, None)
+            self.send_error(404, "File not found or expired")
+            return
+        try:
+            stream_file(self, download["path"], download["file_name"], download["mime"])
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_download_server(host="127.0.0.1", port=8765):
+    """
+    Start the download server in a background thread.
+
+    Args:
+        host (str): The interface to listen on, the loopback interface by default.
+        port (int): The port to listen on.
+
+    Returns:
+        ThreadingHTTPServer: The running server. Its ``downloads`` attribute maps the
+            download tokens to the registered files.
+    """
+    server = ThreadingHTTPServer((host, port), DownloadRequestHandler)
+    server.daemon_threads = True
+    server.downloads = {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def register_download(server, path, file_name, mime):
+    """
+    Make a file of the download folder available on the download server.
+
+    Args:
+        server (ThreadingHTTPServer): The server returned by ``start_download_server``.
+        path (str): The path of the file.
+        file_name (str): The file name proposed to the browser.
+        mime (str): The MIME type of the file.
+
+    Returns:
+        dict: The download reference, with the keys token, path, file_name and mime.
+    """
+    download = {
+        "token": secrets.token_urlsafe(16),
+        "path": path,
+        "file_name": file_name,
+        "mime": mime,
+    }
+    if server is not None:
+        server.downloads[download["token"]] = download
+    return download
+
+
+def remove_download(server, download):
+    """
+    Unregister a download and delete its file.
+
+    Args:
+        server (ThreadingHTTPServer): The download server, or None.
+        download (dict): The download reference returned by ``register_download``.
+    """
+    if server is not None:
+        server.downloads.pop(download["token"], None)
+    try:
+        os.remove(download["path"])
+    except OSError:
+        pass
@@ -0,0 +1,253 @@
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Number of consolidations run at the same time by the server process
+CONSOLIDATION_SLOTS = int(os.environ.get("RFPDOCSUM_CONSOLIDATION_SLOTS", 2))
+# Estimated memory of one loaded cell (value, style and openpyxl objects), in bytes
+BYTES_PER_CELL = 600
+# Estimated memory per byte of a compressed xlsx file whose dimensions are unknown
+BYTES_PER_FILE_BYTE = 25
+# Seconds between two updates of the queue position of a waiting consolidation
+ADMISSION_POLL_INTERVAL = 1.0
+
+# The queue shared by the app sessions and the HTTP API of the process
+_admission_queue = None
+_admission_queue_lock = threading.Lock()
+
+
+def get_memory_budget():
+    """
+    Return the memory the running consolidations may use together.
+
+    The ``RFPDOCSUM_MEMORY_BUDGET`` environment variable (in bytes) takes precedence,
+    otherwise half of the physical memory is used.
+
+    Returns:
+        int: The budget in bytes.
+    """
+    if os.environ.get("RFPDOCSUM_MEMORY_BUDGET"):
+        return int(os.environ["RFPDOCSUM_MEMORY_BUDGET"])
+    try:
+        return os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") // 2
+    except (AttributeError, ValueError, OSError):
+        return 4 * 1024 * 1024 * 1024
+
+
+def get_file_size(file):
+    """
+    Return the size of an uploaded, spooled or local file.
+
+    Args:
+        file: A path or file-like object.
+
+    Returns:
+        int: The size in bytes, 0 if unknown.
+    """
+    if isinstance(file, (str, os.PathLike)):
+        return os.path.getsize(file)
+    if getattr(file, "size", None) is not None:
+        return file.size
+    try:
+        return os.fstat(file.fileno()).st_size
+    except (AttributeError, OSError, ValueError):
+        return len(file.getbuffer()) if hasattr(file, "getbuffer") else 0
+
+
+def estimate_job_memory(files):
+    """
+    Estimate the memory needed to consolidate some sheets of some files.
+
+    The sheets with known dimensions count ``BYTES_PER_CELL`` per cell of their used
+    range, the files without any known dimension count ``BYTES_PER_FILE_BYTE`` per byte.
+
+    Args:
+        files (list): A list of tuples (file size in bytes, sheets), where sheets are
+            the probed sheets to load (see ``probe_workbook``).
+
+    Returns:
+        int: The estimate in bytes.
+    """
+    estimate = 0
+    for size, sheets in files:
+        cells = [
+            sheet["max_row"] * sheet["max_column"]
+            for sheet in sheets
+            if sheet.get("max_row") and sheet.get("max_column")
+        ]
+        estimate += sum(cells) * BYTES_PER_CELL if cells else size * BYTES_PER_FILE_BYTE
+    return estimate
+
+
+class AdmissionQueue:
+    """
+    A first-in, first-out queue deciding when consolidations may start.
+
+    At most ``max_running`` jobs run at the same time and their memory estimates must
+    fit the memory budget together. A job larger than the whole budget runs alone. Only
+    the oldest waiting job is ever admitted, so large jobs are not overtaken forever.
+    """
+
+    def __init__(self, max_running=CONSOLIDATION_SLOTS, memory_budget=None):
+        self.max_running = max(1, max_running)
+        self.memory_budget = memory_budget or get_memory_budget()
+        self.condition = threading.Condition()
+        self.tickets = itertools.count(1)
+        self.waiting = []
+        self.running = {}
+
+    def can_start(self, estimate):
+        """
+        Tell whether a job may start now, the lock being held.
+
+        Args:
+            estimate (int): The memory estimate of the job, in bytes.
+
+        Returns:
+            bool: True if a slot is free and the job fits the remaining memory.
+        """
+        if len(self.running) >= self.max_running:
+            return False
+        return not self.running or (
+            sum(self.running.values()) + estimate <= self.memory_budget
+        )
+
+    def enter(self, estimate):
+        """
+        Add a job at the end of the queue.
+
+        Args:
+            estimate (int): The memory estimate of the job, in bytes.
+
+        Returns:
+            tuple: The ticket of the job, (ticket number, estimate).
+        """
+        with self.condition:
+            ticket = (next(self.tickets), estimate)
+            self.waiting.append(ticket)
+            self.admit()
+            return ticket
+
+    def admit(self):
+        """Start the jobs at the head of the queue that fit, the lock being held."""
+        admitted = False
+        while self.waiting and self.can_start(self.waiting[0][1]):
+            number, estimate = self.waiting.pop(0)
+            self.running[number] = estimate
+            admitted = True
+        if admitted:
+            self.condition.notify_all()
+
+    def wait(self, ticket, timeout=None):
+        """
+        Wait until a job is admitted.
+
+        Args:
+            ticket (tuple): The ticket returned by ``enter``.
+            timeout (float): The maximum number of seconds to wait, None to wait until
+                admitted.
+
+        Returns:
+            int: 0 once the job is admitted, otherwise its position in the queue (1 for
+                the next job to start).
+        """
+        with self.condition:
+            self.admit()
+            self.condition.wait_for(lambda: ticket[0] in self.running, timeout)
+            return self.get_position(ticket)
+
+    def get_position(self, ticket):
+        """
+        Return the position of a job in the queue, the lock being held.
+
+        Args:
+            ticket (tuple): The ticket returned by ``enter``.
+
+        Returns:
+            int: 0 if the job is running, otherwise its position (1 for the next job).
+        """
+        if ticket[0] in self.running:
+            return 0
+        return self.waiting.index(ticket) + 1
+
+    def leave(self, ticket):
+        """
+        Remove a job from the queue or free its slot, and start the next jobs.
+
+        Args:
+            ticket (tuple): The ticket returned by ``enter``.
+        """
+        with self.condition:
+            if self.running.pop(ticket[0], None) is None and ticket in self.waiting:
+                self.waiting.remove(ticket)
+            self.admit()
+
+    def get_load(self):
+        """
+        Return the current load of the queue.
+
+        Returns:
+            dict: The number of running and waiting jobs and the memory estimate of the
+                running jobs, in bytes.
+        """
+        with self.condition:
+            return {
+                "running": len(self.running),
+                "waiting": len(self.waiting),
+                "memory": sum(self.running.values()),
+            }
+
+    def get_worker_share(self):
+        """
+        Return the number of worker processes each running job may use, so that the
+        running jobs share the CPUs instead of each using all of them.
+
+        Returns:
+            int: The number of workers per job, at least 1.
+        """
+        return max(1, (os.cpu_count() or 1) // self.max_running)
+
+
+def get_admission_queue():
+    """
+    Return the admission queue shared by all the consolidations of the process, those
+    of the app sessions and those of the HTTP API.
+
+    Returns:
+        AdmissionQueue: The queue, created on the first call.
+    """
+    global _admission_queue
+    with _admission_queue_lock:
+        if _admission_queue is None:
+            _admission_queue = AdmissionQueue()
+        return _admission_queue
+
+
+@contextmanager
+def admitted(admission_queue, estimate, on_wait=None):
+    """
+    Hold a place in an admission queue for the duration of a ``with`` block.
+
+    The block starts once the job is admitted. The place is given up when the block
+    ends, also when it ends with an exception or while still waiting (e.g. when the
+    Streamlit session reruns).
+
+    Args:
+        admission_queue (AdmissionQueue): The shared queue.
+        estimate (int): The memory estimate of the job, in bytes.
+        on_wait (callable): Called with the queue position and the seconds waited so
+            far, while the job waits.
+    """
+    ticket = admission_queue.enter(estimate)
+    started = time.time()
+    try:
+        position = admission_queue.wait(ticket, timeout=0)
+        while position:
+            if on_wait is not None:
+                on_wait(position, time.time() - started)
+            position = admission_queue.wait(ticket, ADMISSION_POLL_INTERVAL)
+        yield
+    finally:
+        admission_queue.leave(ticket)
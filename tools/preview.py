@@ -0,0 +1,61 @@
+import pyarrow as pa
+
+from tools.consolidation import sheet_to_dataframe, to_single_type_columns
+
+# Number of rows per record batch of the preview files
+PREVIEW_BATCH_SIZE = 1000
+
+
+def write_sheet_preview(sheet, path, batch_size=PREVIEW_BATCH_SIZE):
+    """
+    Write the values of a sheet to an Arrow IPC file for the in-app preview.
+
+    Args:
+        sheet (openpyxl.Worksheet): The sheet to write.
+        path (str): The path of the Arrow file.
+        batch_size (int): The number of rows per record batch.
+
+    Returns:
+        int: The number of rows written.
+    """
+    df = to_single_type_columns(sheet_to_dataframe(sheet))
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with pa.OSFile(path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table, max_chunksize=batch_size)
+    return table.num_rows
+
+
+def open_preview(path):
+    """
+    Open a preview file without reading it into memory.
+
+    The file is memory-mapped, so only the record batches of the rows and columns that
+    are shown are read from disk.
+
+    Args:
+        path (str): The path of the Arrow file.
+
+    Returns:
+        pyarrow.Table: The table backed by the memory-mapped file.
+    """
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+
+def read_preview_page(path, page, page_size, columns=None):
+    """
+    Read one page of rows of a preview file.
+
+    Args:
+        path (str): The path of the Arrow file.
+        page (int): The page number, starting at 1.
+        page_size (int): The number of rows per page.
+        columns (list): The columns to read, None for all columns.
+
+    Returns:
+        pyarrow.Table: The rows of the page.
+    """
+    table = open_preview(path)
+    if columns is not None:
+        table = table.select(columns)
+    return table.slice((page - 1) * page_size, page_size)
@@ -0,0 +1,338 @@
+import math
+import re
+
+import numpy as np
+from openpyxl.cell.rich_text import CellRichText
+from openpyxl.styles import Font, PatternFill
+
+from tools.consolidation import (
+    get_side_by_side_columns,
+    get_unique_sheet_title,
+    parse_price,
+)
+
+# A bid is an outlier when its z-score exceeds Z_THRESHOLD or when it lies more than
+# IQR_FACTOR interquartile ranges outside the quartiles of its line
+Z_THRESHOLD = 3.0
+IQR_FACTOR = 1.5
+# Lines with fewer bids are not checked for outliers
+OUTLIER_MIN_BIDS = 4
+
+# Headers of the supplier fields holding prices, and of fields holding other numbers
+# (quantities, percentages, item numbers...) that are never prices
+PRICE_HEADER_RE = re.compile(
+    r"price|cost|rate|fee|charge|amount|total|bid|\b(?:usd|eur|gbp)\b|[$€£¥]", re.I
+)
+NON_PRICE_HEADER_RE = re.compile(
+    r"\b(?:qty|quantit(?:y|ies)|volumes?|percent(?:age)?|uom|sku|lead[\s-]?time|"
+    r"(?:item|part|line)[\s-]?(?:no|number|#))\b|%",
+    re.I,
+)
+# Number formats of currency amounts
+CURRENCY_FORMAT_RE = re.compile(r"[$€£¥]|\[\$|\b(?:usd|eur|gbp)\b", re.I)
+HEADER_FILL = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
+HEADER_FONT = Font(b=True, color="FFFFFF")
+LOWEST_FILL = PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid")
+OUTLIER_FILL = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")
+
+
+def is_price_field(header, number_format):
+    """
+    Tell whether a supplier field holds prices, from its header and number format.
+
+    Args:
+        header (str): The header of the field, or None if it has none.
+        number_format (str): The number format of the first bid of the field.
+
+    Returns:
+        bool: True for prices, False for percentages, quantities, item numbers and
+            fields that do not look like prices.
+    """
+    if "%" in number_format:
+        return False
+    if header and NON_PRICE_HEADER_RE.search(header):
+        return False
+    return bool(
+        (header and PRICE_HEADER_RE.search(header))
+        or CURRENCY_FORMAT_RE.search(number_format)
+    )
+
+
+def get_price_matrix(sheet, supplier_names, total_rows=None):
+    """
+    Build the supplier x line item price matrices of a side-by-side combined sheet.
+
+    The k-th column of each supplier holds the same price field (unit price, total...)
+    (see ``get_side_by_side_columns``). Line items are the rows with at least one price
+    in the field. Only the fields whose header or number format looks like a price
+    are kept (see ``is_price_field``).
+
+    Args:
+        sheet (openpyxl.Worksheet): The combined sheet.
+        supplier_names (list): The supplier names, in the order of the matrix columns.
+        total_rows (list): The subtotal and grand total rows of the template, left out
+            of the line items, or None.
+
+    Returns:
+        list: A list of dictionaries, one per price field with at least one price,
+            with the keys field (the header of the field), rows (the sheet rows of the
+            line items), items (the label of each line item) and prices (a 2D array,
+            one row per line item and one column per supplier, NaN for no bid).
+    """
+    rows = list(sheet.iter_rows(values_only=True))
+    if not rows:
+        return []
+    supplier_cols, label_cols = get_side_by_side_columns(rows[0], supplier_names)
+    n_fields = max((len(cols) for cols in supplier_cols.values()), default=0)
+    skip_rows = {1} | set(total_rows or ())
+    line_rows = [row for row in range(2, len(rows) + 1) if row not in skip_rows]
+
+    fields = []
+    for field_idx in range(n_fields):
+        columns = [
+            cols[field_idx] if field_idx < len(cols) else None
+            for cols in supplier_cols.values()
+        ]
+        prices = np.array(
+            [
+                [
+                    parse_price(rows[row - 1][col]) if col is not None else math.nan
+                    for col in columns
+                ]
+                for row in line_rows
+            ],
+            dtype=float,
+        ).reshape(len(line_rows), len(columns))
+        has_bid = ~np.isnan(prices).all(axis=1)
+        if not has_bid.any():
+            # Comments or other text fields
+            continue
+        field_rows = [row for row, keep in zip(line_rows, has_bid) if keep]
+        # The header of the field is the text above the first line item, else the
+        # header row without the "<supplier>  " prefix added by side_by_side_combine
+        supplier, first_col = next(
+            (supplier, col)
+            for supplier, col in zip(supplier_cols, columns)
+            if col is not None
+        )
+        header = next(
+            (
+                str(rows[row - 1][first_col])
+                for row in range(2, field_rows[0])
+                if isinstance(rows[row - 1][first_col], (str, CellRichText))
+            ),
+            None,
+        )
+        if header is None:
+            header = str(rows[0][first_col])[len(supplier) :].strip() or None
+        # The number format of the first bid of the field
+        bid_row, bid_idx = np.argwhere(~np.isnan(prices))[0]
+        number_format = sheet.cell(
+            row=line_rows[bid_row], column=columns[bid_idx] + 1
+        ).number_format
+        if not is_price_field(header, number_format):
+            continue
+        field = header or f"Price {field_idx + 1}"
+        items = [
+            next(
+                (
+                    str(rows[row - 1][col])
+                    for col in label_cols
+                    if rows[row - 1][col] not in (None, "")
+                ),
+                "",
+            )
+            for row in field_rows
+        ]
+        fields.append(
+            {
+                "field": field,
+                "rows": field_rows,
+                "items": items,
+                "prices": prices[has_bid],
+            }
+        )
+    return fields
+
+
+def compute_price_statistics(
+    prices,
+    z_threshold=Z_THRESHOLD,
+    iqr_factor=IQR_FACTOR,
+    min_bids=OUTLIER_MIN_BIDS,
+):
+    """
+    Compute the statistics of each line item over the supplier bids, in one pass over
+    the whole price matrix.
+
+    Args:
+        prices (np.ndarray): The price matrix, one row per line item with at least one
+            bid and one column per supplier, NaN for no bid.
+        z_threshold (float): The z-score above which a bid is an outlier.
+        iqr_factor (float): The number of interquartile ranges outside the quartiles
+            beyond which a bid is an outlier.
+        min_bids (int): The minimum number of bids of a line to look for outliers.
+
+    Returns:
+        dict: Arrays with one value per line item (bids, min, max, median, spread, the
+            max - min spread in percent of the median, lowest, the column of the lowest
+            bid) and arrays shaped like ``prices`` (delta, the percent difference from
+            the median, and outliers, the outlier flags).
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        bids = np.count_nonzero(~np.isnan(prices), axis=1)
+        # Sorting puts the missing bids last, the quantiles are read from the sorted
+        # rows instead of calling np.nanpercentile, which loops over the lines
+        sorted_prices = np.sort(prices, axis=1)
+
+        def quantile(q):
+            position = (bids - 1) * q
+            below = np.floor(position).astype(int)
+            above = np.ceil(position).astype(int)
+            low_value = np.take_along_axis(sorted_prices, below[:, None], axis=1)[:, 0]
+            high_value = np.take_along_axis(sorted_prices, above[:, None], axis=1)[:, 0]
+            return low_value + (high_value - low_value) * (position - below)
+
+        low = sorted_prices[:, 0]
+        high = quantile(1.0)
+        median = quantile(0.5)
+        q1, q3 = quantile(0.25), quantile(0.75)
+        iqr = q3 - q1
+        mean = np.nansum(prices, axis=1) / bids
+        std = np.sqrt(np.nansum((prices - mean[:, None]) ** 2, axis=1) / bids)
+        scale = np.where(median != 0, np.abs(median), np.nan)
+        delta = (prices - median[:, None]) / scale[:, None] * 100
+        spread = (high - low) / scale * 100
+        z_scores = np.where(
+            std[:, None] > 0, (prices - mean[:, None]) / std[:, None], 0
+        )
+        outliers = (
+            (np.abs(z_scores) > z_threshold)
+            | (prices < (q1 - iqr_factor * iqr)[:, None])
+            | (prices > (q3 + iqr_factor * iqr)[:, None])
+        ) & (bids >= min_bids)[:, None]
+    return {
+        "bids": bids,
+        "min": low,
+        "max": high,
+        "median": median,
+        "spread": spread,
+        "lowest": np.nanargmin(prices, axis=1),
+        "delta": delta,
+        "outliers": outliers,
+    }
+
+
+def to_cell_values(array, decimals=2):
+    """
+    Round an array and replace NaN with None, for writing to a sheet.
+
+    Args:
+        array (np.ndarray): The values.
+        decimals (int): The number of decimals to keep.
+
+    Returns:
+        list: The values as (nested) lists.
+    """
+    rounded = np.round(array.astype(float), decimals)
+    return np.where(np.isfinite(rounded), rounded, None).tolist()
+
+
+def write_price_statistics(stats_sheet, supplier_names, fields):
+    """
+    Write the line item statistics of the price fields of a combined sheet.
+
+    The lowest bid of each line is filled in green and the outliers in red.
+
+    Args:
+        stats_sheet (openpyxl.Worksheet): The sheet to write to.
+        supplier_names (list): The supplier names, in the order of the matrix columns.
+        fields (list): The price fields returned by ``get_price_matrix``.
+    """
+    header = (
+        ["Row", "Item", "Price"]
+        + list(supplier_names)
+        + ["Bids", "Min", "Max", "Median", "Spread %"]
+        + [f"{supplier} vs Median %" for supplier in supplier_names]
+        + ["Lowest Bidder", "Outliers"]
+    )
+    stats_sheet.append(header)
+    first_price_col = 4
+    for field in fields:
+        prices = field["prices"]
+        stats = compute_price_statistics(prices)
+        first_row = stats_sheet.max_row + 1
+        lines = zip(
+            field["rows"],
+            field["items"],
+            to_cell_values(prices),
+            stats["bids"].tolist(),
+            to_cell_values(stats["min"]),
+            to_cell_values(stats["max"]),
+            to_cell_values(stats["median"]),
+            to_cell_values(stats["spread"], 1),
+            to_cell_values(stats["delta"], 1),
+            stats["lowest"].tolist(),
+            stats["outliers"].tolist(),
+        )
+        for line in lines:
+            row, item, bids, count, low, high, mid, spread, delta, lowest, flags = line
+            stats_sheet.append(
+                [row, item, field["field"]]
+                + bids
+                + [count, low, high, mid, spread]
+                + delta
+                + [
+                    supplier_names[lowest],
+                    ", ".join(
+                        supplier
+                        for supplier, flag in zip(supplier_names, flags)
+                        if flag
+                    ),
+                ]
+            )
+        # Highlight the lowest bids and the outliers
+        for line_idx, lowest in enumerate(stats["lowest"].tolist()):
+            stats_sheet.cell(
+                row=first_row + line_idx, column=first_price_col + lowest
+            ).fill = LOWEST_FILL
+        for line_idx, supplier_idx in np.argwhere(stats["outliers"]).tolist():
+            stats_sheet.cell(
+                row=first_row + line_idx, column=first_price_col + supplier_idx
+            ).fill = OUTLIER_FILL
+
+    for cell in stats_sheet[1]:
+        cell.fill = HEADER_FILL
+        cell.font = HEADER_FONT
+    stats_sheet.freeze_panes = "D2"
+    stats_sheet.column_dimensions["B"].width = 40
+    stats_sheet.column_dimensions["C"].width = 16
+
+
+def add_price_statistics(workbook, supplier_names, total_rows=None):
+    """
+    Add a line item price statistics sheet after each combined sheet of a
+    side-by-side workbook.
+
+    Args:
+        workbook (openpyxl.Workbook): The side-by-side consolidated workbook.
+        supplier_names (list): The supplier names.
+        total_rows (dict): A dictionary mapping the combined sheet titles to the
+            subtotal and grand total rows of their template, or None.
+
+    Returns:
+        openpyxl.Workbook: The workbook with the statistics sheets.
+    """
+    total_rows = total_rows or {}
+    for sheet in list(workbook.worksheets):
+        if not sheet.title.startswith("Combined"):
+            continue
+        fields = get_price_matrix(sheet, supplier_names, total_rows.get(sheet.title))
+        if not fields:
+            continue
+        stats_sheet = workbook.create_sheet(
+            title=get_unique_sheet_title(workbook, f"Price Stats {sheet.title}"),
+            index=workbook.worksheets.index(sheet) + 1,
+        )
+        write_price_statistics(stats_sheet, supplier_names, fields)
+    return workbook
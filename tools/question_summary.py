@@ -0,0 +1,198 @@
+import re
+
+import numpy as np
+import scipy.sparse as sp
+from openpyxl.styles import Alignment, Font, PatternFill
+
+from tools.answer_similarity import build_tfidf_matrix, get_answers
+
+SENTENCE_RE = re.compile(r"(?<=[.!?;])\s+|\n+")
+# Number of sentences kept in the summary of each question
+QUESTION_SUMMARY_SENTENCES = 3
+# A sentence this similar to a sentence already in the summary is left out, so that
+# boilerplate shared by several suppliers appears once
+REDUNDANCY_THRESHOLD = 0.8
+SUMMARY_HEADER = "Question Summary"
+SUMMARY_FILL = PatternFill(fill_type="solid", start_color="BFFFFF")
+
+
+def split_sentences(answers):
+    """
+    Split the answers into sentences.
+
+    Args:
+        answers (iterable): The answers, as tuples (question index, supplier index,
+            text).
+
+    Returns:
+        tuple: The question index (np.ndarray), supplier index (np.ndarray) and text
+            of each sentence.
+    """
+    question_ids = []
+    supplier_ids = []
+    sentences = []
+    for question_id, supplier_id, text in answers:
+        for sentence in SENTENCE_RE.split(text):
+            sentence = sentence.strip()
+            if sentence:
+                question_ids.append(question_id)
+                supplier_ids.append(supplier_id)
+                sentences.append(sentence)
+    return (
+        np.array(question_ids, dtype=np.int64),
+        np.array(supplier_ids, dtype=np.int64),
+        sentences,
+    )
+
+
+def summarize_questions(
+    question_ids,
+    texts,
+    n_questions,
+    sentence_count=QUESTION_SUMMARY_SENTENCES,
+    redundancy_threshold=REDUNDANCY_THRESHOLD,
+):
+    """
+    Pick the most representative sentences of each question, for all the questions at
+    once.
+
+    The sentences of all the questions share one TF-IDF matrix (see
+    ``build_tfidf_matrix``). Each sentence is scored by its cosine similarity to the
+    centroid of the sentences of its question, computed for every question with one
+    sparse product, then the best sentences are kept. The near duplicates of a kept
+    sentence are grouped with it instead of being repeated.
+
+    Args:
+        question_ids (np.ndarray): The question index of each sentence.
+        texts (list): The text of each sentence.
+        n_questions (int): The number of questions.
+        sentence_count (int): The maximum number of sentences per summary.
+        redundancy_threshold (float): The similarity above which a sentence repeats a
+            sentence of the summary.
+
+    Returns:
+        list: The summary of each question, a list of the kept sentences, best first,
+            each a list of the indexes of the sentence and of its near duplicates.
+    """
+    summaries = [[] for _ in range(n_questions)]
+    n_sentences = len(texts)
+    if not n_sentences:
+        return summaries
+    matrix, _ = build_tfidf_matrix(question_ids, texts)
+    membership = sp.csr_matrix(
+        (np.ones(n_sentences), (question_ids, np.arange(n_sentences))),
+        shape=(n_questions, n_sentences),
+    )
+    centroids = membership @ matrix
+    centroid_norms = np.sqrt(
+        np.asarray(centroids.multiply(centroids).sum(axis=1)).ravel()
+    )
+    # Each column belongs to a single question, so the centroids fit in one vector
+    # and a single product scores every sentence against its own question
+    scores = matrix @ np.asarray(centroids.sum(axis=0)).ravel()
+    scores /= np.where(centroid_norms > 0, centroid_norms, 1)[question_ids]
+
+    # Sentences grouped by question, best first, in answer order on ties
+    order = np.lexsort((np.arange(n_sentences), -scores, question_ids))
+    starts = np.flatnonzero(np.r_[True, np.diff(question_ids[order]) != 0])
+    ends = np.r_[starts[1:], n_sentences]
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        candidates = order[start:end]
+        similarity = (matrix[candidates] @ matrix[candidates].T).toarray()
+        picked = []
+        groups = []
+        for position in range(len(candidates)):
+            same = next(
+                (
+                    group
+                    for other, group in zip(picked, groups)
+                    if similarity[position, other] >= redundancy_threshold
+                ),
+                None,
+            )
+            if same is not None:
+                same.append(position)
+            elif len(picked) < sentence_count:
+                picked.append(position)
+                groups.append([position])
+        summaries[question_ids[candidates[0]]] = [
+            candidates[group].tolist() for group in groups
+        ]
+    return summaries
+
+
+def add_question_summaries(
+    workbook,
+    supplier_names,
+    header_rows=None,
+    max_rows=None,
+    sentence_count=QUESTION_SUMMARY_SENTENCES,
+):
+    """
+    Add a column summarizing the answers of all the suppliers to each question of the
+    combined sheets of a side-by-side questionnaire workbook.
+
+    Every answer field of a row is part of the question of the row. The summaries of
+    all the questions of a sheet are computed in one batch.
+
+    Args:
+        workbook (openpyxl.Workbook): The side-by-side consolidated workbook.
+        supplier_names (list): The supplier names.
+        header_rows (dict): A dictionary mapping the combined sheet titles to the header
+            rows of their template, or None.
+        max_rows (dict): A dictionary mapping the combined sheet titles to the last row
+            of their template, or None.
+        sentence_count (int): The maximum number of sentences per summary.
+
+    Returns:
+        openpyxl.Workbook: The workbook with the summary columns.
+    """
+    header_rows = header_rows or {}
+    max_rows = max_rows or {}
+    for sheet in workbook.worksheets:
+        if not sheet.title.startswith("Combined"):
+            continue
+        questions, answers = get_answers(
+            sheet,
+            supplier_names,
+            header_rows.get(sheet.title),
+            max_rows.get(sheet.title),
+        )
+        if not answers:
+            continue
+        # One question per row, whatever the number of answer fields
+        rows = sorted({question["row"] for question in questions})
+        row_ids = {row: row_id for row_id, row in enumerate(rows)}
+        question_ids, supplier_ids, sentences = split_sentences(
+            (row_ids[questions[question_id]["row"]], supplier_id, text)
+            for question_id, supplier_id, text in answers
+        )
+        summaries = summarize_questions(
+            question_ids, sentences, len(rows), sentence_count
+        )
+
+        col_idx = sheet.max_column + 1
+        header_cell = sheet.cell(row=1, column=col_idx, value=SUMMARY_HEADER)
+        header_cell.font = Font(name="Arial", size=15, bold=True)
+        header_cell.alignment = Alignment(horizontal="center", vertical="center")
+        for row, summary in zip(rows, summaries):
+            if not summary:
+                continue
+            cell = sheet.cell(
+                row=row,
+                column=col_idx,
+                value="\n".join(
+                    ", ".join(
+                        dict.fromkeys(
+                            supplier_names[supplier_id]
+                            for supplier_id in supplier_ids[group].tolist()
+                        )
+                    )
+                    + f": {sentences[group[0]]}"
+                    for group in summary
+                ),
+            )
+            cell.fill = SUMMARY_FILL
+            cell.alignment = Alignment(vertical="top", wrap_text=True)
+        sheet.column_dimensions[header_cell.column_letter].width = 80
+    return workbook
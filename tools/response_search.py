@@ -0,0 +1,172 @@
+import math
+import re
+from collections import Counter, defaultdict
+
+from openpyxl.utils import get_column_letter
+
+from tools.cell_text import get_sheet_text
+from tools.consolidation import get_column_owner, get_side_by_side_columns
+
+SEARCH_TOKEN_RE = re.compile(r"[a-z0-9]+")
+# BM25 parameters: term frequency saturation and cell length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Score multiplier of the cells containing the query as typed, e.g. "SOC 2"
+PHRASE_BOOST = 2.0
+SEARCH_MAX_HITS = 50
+
+
+def tokenize(text):
+    """
+    Split a text into lowercase search terms.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        list: The terms, in order.
+    """
+    return SEARCH_TOKEN_RE.findall(text.lower())
+
+
+def new_search_index():
+    """
+    Return an empty search index.
+
+    The index only holds JSON types, so it can be stored next to a cached result:
+        cells: A list of [doc type, supplier, sheet, row, column, text], one per
+            indexed cell. The sheet, row and column locate the cell in the
+            consolidated workbook.
+        lengths: The number of terms of each cell.
+        postings: A dictionary mapping each term to the ids of the cells containing
+            it, once per occurrence.
+
+    Returns:
+        dict: The index.
+    """
+    return {"cells": [], "lengths": [], "postings": {}}
+
+
+def index_sheets(index, doc_type, workbook, supplier_names):
+    """
+    Add the supplier cells of a consolidated workbook to a search index.
+
+    Side-by-side sheets ("Combined ...") hold one column per supplier and field (see
+    ``get_side_by_side_columns``), their header row and the template columns are left
+    out. Separate sheets ("<supplier> ...") are copies of one supplier sheet. The
+    other sheets (template copies, summaries...) are not indexed.
+
+    Args:
+        index (dict): The search index (see ``new_search_index``).
+        doc_type (str): The document type of the workbook.
+        workbook (openpyxl.Workbook): The consolidated workbook, before the summary
+            and statistics sheets are added.
+        supplier_names (list): The supplier names.
+
+    Returns:
+        dict: The index.
+    """
+    names = sorted(supplier_names, key=len, reverse=True)
+    cells = index["cells"]
+    lengths = index["lengths"]
+    postings = defaultdict(list, index["postings"])
+    for sheet in workbook.worksheets:
+        if sheet.title.startswith("Combined "):
+            headers = next(sheet.iter_rows(max_row=1, values_only=True), ())
+            supplier_cols, _ = get_side_by_side_columns(headers, names)
+            # Text columns are 1-based
+            owners = {
+                col_idx + 1: supplier
+                for supplier, cols in supplier_cols.items()
+                for col_idx in cols
+            }
+            min_row = 2
+        else:
+            supplier = get_column_owner(sheet.title, names)
+            if supplier is None:
+                continue
+            owners = None
+            min_row = 1
+        for col_idx, column in get_sheet_text(sheet).items():
+            owner = supplier if owners is None else owners.get(col_idx)
+            if owner is None:
+                continue
+            for row, text in column:
+                if row < min_row:
+                    continue
+                terms = tokenize(text)
+                if not terms:
+                    continue
+                cell_id = len(cells)
+                cells.append([doc_type, owner, sheet.title, row, col_idx, text])
+                lengths.append(len(terms))
+                for term in terms:
+                    postings[term].append(cell_id)
+    index["postings"] = dict(postings)
+    return index
+
+
+def search_index(index, query, max_hits=SEARCH_MAX_HITS):
+    """
+    Find the cells containing every term of a query, ranked by BM25 score.
+
+    Cells containing the query as typed (case and whitespace aside) rank higher.
+
+    Args:
+        index (dict): The search index (see ``new_search_index``).
+        query (str): The search text.
+        max_hits (int): The maximum number of hits returned.
+
+    Returns:
+        list: The hits, best first, as dictionaries with the keys doc_type, supplier,
+            sheet, row, column (the column letter), text and score.
+    """
+    terms = list(dict.fromkeys(tokenize(query)))
+    n_cells = len(index["cells"])
+    if not terms or not n_cells:
+        return []
+    # Term count of each cell containing the term
+    term_counts = [Counter(index["postings"].get(term, ())) for term in terms]
+    if not all(term_counts):
+        return []
+    average_length = sum(index["lengths"]) / n_cells
+    # Intersect from the rarest term, so the score loop only visits the cells that
+    # contain every term
+    term_counts.sort(key=len)
+    matches = set(term_counts[0])
+    for counts in term_counts[1:]:
+        matches.intersection_update(counts)
+        if not matches:
+            return []
+    scores = dict.fromkeys(matches, 0.0)
+    for counts in term_counts:
+        idf = math.log(1 + (n_cells - len(counts) + 0.5) / (len(counts) + 0.5))
+        for cell_id, count in counts.items():
+            if cell_id in scores:
+                length_norm = 1 - BM25_B + BM25_B * (
+                    index["lengths"][cell_id] / average_length
+                )
+                scores[cell_id] += (
+                    idf * count * (BM25_K1 + 1) / (count + BM25_K1 * length_norm)
+                )
+    phrase = " ".join(query.lower().split())
+    if len(terms) > 1 and phrase:
+        for cell_id in scores:
+            if phrase in index["cells"][cell_id][5].lower():
+                scores[cell_id] *= PHRASE_BOOST
+    best = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:max_hits]
+    hits = []
+    for cell_id, score in best:
+        doc_type, supplier, sheet, row, col_idx, text = index["cells"][cell_id]
+        hits.append(
+            {
+                "doc_type": doc_type,
+                "supplier": supplier,
+                "sheet": sheet,
+                "row": row,
+                "column": get_column_letter(col_idx),
+                "text": text,
+                "score": round(score, 2),
+            }
+        )
+    return hits
@@ -0,0 +1,188 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+
+from tools.file_server import get_cache_dir, link_or_copy
+
+# Bump when the consolidation output changes, so that older results are not reused
+RESULT_CACHE_VERSION = 4
+# Total size (in bytes) and age (in seconds) of the cached results
+RESULT_CACHE_MAX_BYTES = int(
+    os.environ.get("RFPDOCSUM_RESULT_CACHE_BYTES", 2 * 1024 * 1024 * 1024)
+)
+RESULT_CACHE_MAX_AGE = 7 * 24 * 60 * 60
+RESULT_FILE_NAME = "result"
+PREVIEW_INDEX_NAME = "preview.json"
+SEARCH_INDEX_NAME = "search.json"
+
+
+def get_result_key(template_hash, supplier_hashes, options):
+    """
+    Return the key of a consolidation request, a hash of everything that determines the
+    consolidated file.
+
+    Args:
+        template_hash (str): The content hash of the template file.
+        supplier_hashes (dict): A dictionary mapping the supplier names, in order, to the
+            content hash of their file.
+        options (dict): The other inputs of the consolidation (sheets, mode,
+            summary_option, threshold, output format...). Values must be JSON types.
+
+    Returns:
+        str: The SHA-256 hex digest of the request.
+    """
+    request = {
+        "version": RESULT_CACHE_VERSION,
+        "template": template_hash,
+        "suppliers": list(supplier_hashes.items()),
+        "options": options,
+    }
+    return hashlib.sha256(
+        json.dumps(request, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def get_result_dir(key):
+    """
+    Return the folder of a cached result. The path only depends on the request key.
+
+    Args:
+        key (str): The key returned by ``get_result_key``.
+
+    Returns:
+        str: The path of the folder (it may not exist).
+    """
+    return os.path.join(get_cache_dir("results"), key)
+
+
+def get_cached_result(key, extension):
+    """
+    Look up the result of an identical consolidation request.
+
+    Args:
+        key (str): The key returned by ``get_result_key``.
+        extension (str): The extension of the consolidated file.
+
+    Returns:
+        dict: A dictionary with the keys path (the consolidated file), preview (a
+            dictionary mapping sheet titles to their preview file path and row count,
+            or None) and search (the search index of the supplier responses, or None),
+            or None if the request was not cached.
+    """
+    result_dir = get_result_dir(key)
+    path = os.path.join(result_dir, f"{RESULT_FILE_NAME}.{extension}")
+    if not os.path.exists(path):
+        return None
+    # Mark the result and its files as recently used
+    os.utime(result_dir)
+    os.utime(path)
+    preview = None
+    try:
+        with open(os.path.join(result_dir, PREVIEW_INDEX_NAME), encoding="utf-8") as file:
+            preview = {
+                title: {"path": os.path.join(result_dir, name), "rows": rows}
+                for title, name, rows in json.load(file)
+            }
+        for sheet_preview in preview.values():
+            os.utime(sheet_preview["path"])
+    except (OSError, ValueError):
+        pass
+    search = None
+    try:
+        with open(os.path.join(result_dir, SEARCH_INDEX_NAME), encoding="utf-8") as file:
+            search = json.load(file)
+    except (OSError, ValueError):
+        pass
+    return {"path": path, "preview": preview, "search": search}
+
+
+def store_result(key, extension, path, preview=None, search=None):
+    """
+    Add a consolidated file (with its preview files and search index) to the result
+    cache.
+
+    The files are hard linked into the cache when possible, so the download folder and
+    the cache share the same data.
+
+    Args:
+        key (str): The key returned by ``get_result_key``.
+        extension (str): The extension of the consolidated file.
+        path (str): The path of the consolidated file.
+        preview (dict): The preview files (see ``save_preview``), or None.
+        search (dict): The search index of the supplier responses (see
+            ``new_search_index``), or None.
+    """
+    result_dir = get_result_dir(key)
+    temp_dir = f"{result_dir}.{os.getpid()}.tmp"
+    try:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        os.makedirs(temp_dir)
+        link_or_copy(path, os.path.join(temp_dir, f"{RESULT_FILE_NAME}.{extension}"))
+        if preview:
+            index = []
+            for idx, (title, sheet_preview) in enumerate(preview.items()):
+                name = f"preview_{idx}.arrow"
+                link_or_copy(sheet_preview["path"], os.path.join(temp_dir, name))
+                index.append((title, name, sheet_preview["rows"]))
+            with open(
+                os.path.join(temp_dir, PREVIEW_INDEX_NAME), "w", encoding="utf-8"
+            ) as file:
+                json.dump(index, file)
+        if search:
+            with open(
+                os.path.join(temp_dir, SEARCH_INDEX_NAME), "w", encoding="utf-8"
+            ) as file:
+                json.dump(search, file)
+        shutil.rmtree(result_dir, ignore_errors=True)
+        os.replace(temp_dir, result_dir)
+    except OSError as e:
+        print(f"Could not cache the consolidated file: {e}")
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    evict_results()
+
+
+def get_dir_size(path):
+    """
+    Return the total size of the files of a folder.
+
+    Args:
+        path (str): The folder.
+
+    Returns:
+        int: The size in bytes.
+    """
+    return sum(
+        entry.stat().st_size for entry in os.scandir(path) if entry.is_file()
+    )
+
+
+def evict_results(max_bytes=RESULT_CACHE_MAX_BYTES, max_age=RESULT_CACHE_MAX_AGE):
+    """
+    Delete the cached results older than ``max_age`` seconds, then the least recently
+    used ones until the cache is smaller than ``max_bytes``.
+
+    Args:
+        max_bytes (int): The maximum total size of the cache, in bytes.
+        max_age (int): The maximum age of a cached result, in seconds.
+    """
+    now = time.time()
+    results = []
+    for entry in os.scandir(get_cache_dir("results")):
+        if not entry.is_dir() or entry.name.endswith(".tmp"):
+            continue
+        try:
+            mtime = entry.stat().st_mtime
+            if now - mtime > max_age:
+                shutil.rmtree(entry.path, ignore_errors=True)
+            else:
+                results.append((mtime, get_dir_size(entry.path), entry.path))
+        except OSError:
+            pass
+    total = sum(size for _, size, _ in results)
+    for _, size, path in sorted(results):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
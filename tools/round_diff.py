@@ -0,0 +1,199 @@
+import hashlib
+from copy import copy
+
+import streamlit as st
+from openpyxl.comments import Comment
+from openpyxl.styles import Alignment, Font, PatternFill
+from openpyxl.utils import get_column_letter
+
+from tools.consolidation import get_unique_sheet_title
+
+# Fill of the cells that changed since the previous round, as for mismatched rows
+CHANGE_COLOR = "FAA0A0"
+
+
+def get_style_key(cell):
+    """
+    Return the parts of a cell style that matter when reviewing a re-bid.
+
+    Style ids are only meaningful within one workbook, so the style is described by
+    its values instead.
+
+    Args:
+        cell: The cell.
+
+    Returns:
+        tuple: The bold, italic and strike flags, the font color, the fill color and the
+            number format of the cell.
+    """
+    if not cell.has_style:
+        return None
+    font = cell.font
+    fill = cell.fill
+    return (
+        font.b,
+        font.i,
+        font.strike,
+        font.color.rgb if font.color is not None else None,
+        fill.start_color.rgb if fill.fill_type else None,
+        cell.number_format,
+    )
+
+
+def hash_sheet_cells(sheet):
+    """
+    Hash the value and relevant style of every non-empty or styled cell of a sheet.
+
+    Args:
+        sheet (openpyxl.Worksheet): The sheet to hash.
+
+    Returns:
+        dict: A dictionary mapping (row, column) tuples to the hash of the cell.
+    """
+    hashes = {}
+    for (row, col), cell in sheet._cells.items():
+        style_key = get_style_key(cell)
+        if cell.value is None and style_key is None:
+            continue
+        hashes[(row, col)] = hashlib.blake2b(
+            repr((cell.value, style_key)).encode(), digest_size=8
+        ).digest()
+    return hashes
+
+
+def diff_sheets(previous_sheet, current_sheet):
+    """
+    List the cells that changed between two rounds of the same supplier sheet.
+
+    Both sheets are hashed in one pass, then only the cells whose hash differs are read
+    again.
+
+    Args:
+        previous_sheet (openpyxl.Worksheet): The sheet of the previous round.
+        current_sheet (openpyxl.Worksheet): The sheet of the current round.
+
+    Returns:
+        list: A list of dictionaries with the keys row, column, previous and current
+            (the cell values), sorted by row and column.
+    """
+    previous_hashes = hash_sheet_cells(previous_sheet)
+    current_hashes = hash_sheet_cells(current_sheet)
+    changes = []
+    for coordinate in sorted(previous_hashes.keys() | current_hashes.keys()):
+        if previous_hashes.get(coordinate) == current_hashes.get(coordinate):
+            continue
+        previous_cell = previous_sheet._cells.get(coordinate)
+        current_cell = current_sheet._cells.get(coordinate)
+        changes.append(
+            {
+                "row": coordinate[0],
+                "column": coordinate[1],
+                "previous": previous_cell.value if previous_cell is not None else None,
+                "current": current_cell.value if current_cell is not None else None,
+            }
+        )
+    return changes
+
+
+def write_changed_rows(target_sheet, current_sheet, changes):
+    """
+    Copy the header row and the rows with changes of a supplier sheet, highlighting the
+    changed cells and noting their previous value in a comment.
+
+    Rows keep their position, so cell references match the supplier file.
+
+    Args:
+        target_sheet (openpyxl.Worksheet): The sheet to write to.
+        current_sheet (openpyxl.Worksheet): The sheet of the current round.
+        changes (list): The changes returned by ``diff_sheets``.
+    """
+    rows = {1} | {change["row"] for change in changes}
+    for (row, col), cell in current_sheet._cells.items():
+        if row not in rows or (cell.value is None and not cell.has_style):
+            continue
+        target_cell = target_sheet.cell(row=row, column=col, value=cell.value)
+        if cell.has_style:
+            target_cell.font = copy(cell.font)
+            target_cell.border = copy(cell.border)
+            target_cell.fill = copy(cell.fill)
+            target_cell.number_format = cell.number_format
+            target_cell.alignment = copy(cell.alignment)
+
+    for change in changes:
+        target_cell = target_sheet.cell(row=change["row"], column=change["column"])
+        target_cell.fill = PatternFill(
+            start_color=CHANGE_COLOR, end_color=CHANGE_COLOR, fill_type="solid"
+        )
+        target_cell.comment = Comment(f"Previous round: {change['previous']}", "RFP")
+
+    for col_idx in range(1, current_sheet.max_column + 1):
+        col_letter = get_column_letter(col_idx)
+        if col_letter in current_sheet.column_dimensions:
+            target_sheet.column_dimensions[col_letter].width = (
+                current_sheet.column_dimensions[col_letter].width
+            )
+
+
+def round_diff_combine(workbook, previous_sheets_dict, current_sheets_dict):
+    """
+    Compare the supplier sheets of the current round with the previous round and write
+    a changes-only workbook.
+
+    The workbook gets a "Round Changes" sheet listing every changed cell, and one sheet
+    per supplier sheet with changes holding the changed rows only.
+
+    Args:
+        workbook (openpyxl.Workbook): The workbook to write the changes to.
+        previous_sheets_dict (dict): A dictionary mapping supplier names to their sheets
+            of the previous round.
+        current_sheets_dict (dict): A dictionary mapping supplier names to their sheets
+            of the current round, in the same order.
+
+    Returns:
+        tuple: The workbook and the total number of changed cells.
+    """
+    st.toast("Comparing rounds in progress...", icon="⏳")
+    index_sheet = workbook.create_sheet("Round Changes")
+    index_sheet.append(["Supplier", "Sheet", "Cell", "Previous value", "New value"])
+    for cell in index_sheet[1]:
+        cell.font = Font(bold=True)
+        cell.alignment = Alignment(horizontal="center", vertical="center")
+
+    total_changes = 0
+    for supplier, current_sheets in current_sheets_dict.items():
+        previous_sheets = previous_sheets_dict.get(supplier)
+        if not previous_sheets:
+            continue
+        for previous_sheet, current_sheet in zip(previous_sheets, current_sheets):
+            changes = diff_sheets(previous_sheet, current_sheet)
+            print(
+                f"{len(changes)} changes for supplier {supplier} in sheet {current_sheet.title}"
+            )
+            if not changes:
+                continue
+            total_changes += len(changes)
+            target_sheet = workbook.create_sheet(
+                get_unique_sheet_title(
+                    workbook, f"{supplier} {current_sheet.title}"
+                )
+            )
+            write_changed_rows(target_sheet, current_sheet, changes)
+            for change in changes:
+                index_sheet.append(
+                    [
+                        supplier,
+                        current_sheet.title,
+                        f"{get_column_letter(change['column'])}{change['row']}",
+                        str(change["previous"]) if change["previous"] is not None else "",
+                        str(change["current"]) if change["current"] is not None else "",
+                    ]
+                )
+        st.toast(f"{supplier} compared!", icon="✔️")
+
+    for col_letter, width in zip("ABCDE", (20, 30, 10, 50, 50)):
+        index_sheet.column_dimensions[col_letter].width = width
+    # Remove the default sheet if it exists
+    if "Sheet" in workbook.sheetnames:
+        workbook.remove(workbook["Sheet"])
+
+    return workbook, total_changes
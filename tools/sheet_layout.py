@@ -0,0 +1,69 @@
+import weakref
+
+from openpyxl.utils import column_index_from_string
+
+# Row and column layout of the sheets already read, dropped with the sheets themselves
+_sheet_layout_cache = weakref.WeakKeyDictionary()
+
+
+def get_sheet_layout(sheet):
+    """
+    Return the hidden rows and columns of a sheet with its row heights and column widths.
+
+    The row and column dimensions are read once per sheet and cached for as long as the
+    sheet exists. Only the existing dimensions are read, indexing ``row_dimensions`` or
+    ``column_dimensions`` would create an empty dimension for every row or column looked
+    up. Column dimensions spanning several columns (min/max) apply to all of them.
+
+    Args:
+        sheet: The worksheet to read. Read-only worksheets have no dimensions.
+
+    Returns:
+        dict: A dictionary with the keys:
+            hidden_rows: A bitset (int) where bit n is set if row n is hidden.
+            hidden_columns: A bitset (int) where bit n is set if column n is hidden.
+            row_heights: A dictionary mapping row indexes to their height, for the rows
+                with a height.
+            column_widths: A dictionary mapping column indexes to their width, for the
+                columns with a dimension.
+    """
+    if sheet in _sheet_layout_cache:
+        return _sheet_layout_cache[sheet]
+    hidden_rows = 0
+    hidden_columns = 0
+    row_heights = {}
+    column_widths = {}
+    for idx, dim in getattr(sheet, "row_dimensions", {}).items():
+        if dim.hidden:
+            hidden_rows |= 1 << idx
+        if dim.ht is not None:
+            row_heights[idx] = dim.ht
+    for letter, dim in getattr(sheet, "column_dimensions", {}).items():
+        first = dim.min or column_index_from_string(letter)
+        last = max(dim.max or first, first)
+        for col_idx in range(first, last + 1):
+            if dim.hidden:
+                hidden_columns |= 1 << col_idx
+            column_widths[col_idx] = dim.width
+    layout = {
+        "hidden_rows": hidden_rows,
+        "hidden_columns": hidden_columns,
+        "row_heights": row_heights,
+        "column_widths": column_widths,
+    }
+    _sheet_layout_cache[sheet] = layout
+    return layout
+
+
+def is_hidden(bitset, idx):
+    """
+    Check whether a row or column is set in a bitset of ``get_sheet_layout``.
+
+    Args:
+        bitset (int): The hidden_rows or hidden_columns bitset.
+        idx (int): The row or column index.
+
+    Returns:
+        bool: True if the row or column is hidden.
+    """
+    return bool(bitset >> idx & 1)
@@ -0,0 +1,173 @@
+from copy import copy
+
+from openpyxl.cell.cell import MergedCell
+
+
+def snapshot_sheet(sheet):
+    """
+    Capture the content of a worksheet as plain, picklable data.
+
+    The snapshot can be sent to a worker process and turned back into a worksheet with
+    ``restore_sheet``. Cell styles are stored once per distinct style in a style table.
+
+    Args:
+        sheet (openpyxl.Worksheet): The sheet to capture.
+
+    Returns:
+        dict: The snapshot of the sheet with the keys title, cells, styles, merged_cells,
+            conditional_formatting, row_dimensions, column_dimensions and attributes.
+    """
+    style_ids = {}
+    styles = []
+    cells = []
+    for (row, col), cell in sheet._cells.items():
+        style_id = None
+        if cell.has_style:
+            style_key = tuple(cell._style)
+            if style_key not in style_ids:
+                style_ids[style_key] = len(styles)
+                styles.append(
+                    (
+                        copy(cell.font),
+                        copy(cell.border),
+                        copy(cell.fill),
+                        cell.number_format,
+                        copy(cell.protection),
+                        copy(cell.alignment),
+                    )
+                )
+            style_id = style_ids[style_key]
+        if isinstance(cell, MergedCell):
+            cells.append((row, col, True, None, None, style_id, None, None))
+        else:
+            cells.append(
+                (
+                    row,
+                    col,
+                    False,
+                    cell.value,
+                    cell.data_type,
+                    style_id,
+                    copy(cell.hyperlink) if cell.hyperlink else None,
+                    copy(cell.comment) if cell.comment else None,
+                )
+            )
+
+    page_setup = copy(sheet.page_setup)
+    page_setup._parent = None  # do not drag the source worksheet along
+
+    return {
+        "title": sheet.title,
+        "cells": cells,
+        "styles": styles,
+        "merged_cells": [str(merged_range) for merged_range in sheet.merged_cells.ranges],
+        "conditional_formatting": [
+            (str(formatting.sqref), [copy(rule) for rule in formatting.rules])
+            for formatting in sheet.conditional_formatting
+        ],
+        "row_dimensions": {
+            idx: (dim.ht, dim.hidden, dim.outlineLevel)
+            for idx, dim in sheet.row_dimensions.items()
+        },
+        "column_dimensions": {
+            letter: (dim.width, dim.hidden, dim.outlineLevel)
+            for letter, dim in sheet.column_dimensions.items()
+        },
+        "attributes": {
+            "sheet_format": copy(sheet.sheet_format),
+            "sheet_properties": copy(sheet.sheet_properties),
+            "page_margins": copy(sheet.page_margins),
+            "page_setup": page_setup,
+            "print_options": copy(sheet.print_options),
+            "auto_filter": copy(sheet.auto_filter),
+            "print_area": sheet.print_area,
+            "freeze_panes": sheet.freeze_panes,
+            "protection": copy(sheet.protection),
+            "sheet_state": sheet.sheet_state,
+        },
+    }
+
+
+def restore_sheet(snapshot, target_sheet):
+    """
+    Write a sheet snapshot (see ``snapshot_sheet``) into an empty worksheet.
+
+    Args:
+        snapshot (dict): The snapshot to restore.
+        target_sheet (openpyxl.Worksheet): The empty sheet to write to.
+
+    Returns:
+        openpyxl.Worksheet: The restored sheet.
+    """
+    # Merge first, so that the merged cells get their own styles restored below
+    for merged_range in snapshot["merged_cells"]:
+        target_sheet.merge_cells(merged_range)
+
+    target_styles = {}
+    for (
+        row,
+        col,
+        is_merged,
+        value,
+        data_type,
+        style_id,
+        hyperlink,
+        comment,
+    ) in snapshot["cells"]:
+        cell = target_sheet._cells.get((row, col))
+        if cell is None:
+            cell = target_sheet.cell(row=row, column=col)
+        if not is_merged and not isinstance(cell, MergedCell):
+            cell.value = value
+            cell.data_type = data_type
+            if hyperlink:
+                cell.hyperlink = hyperlink
+            if comment:
+                cell.comment = comment
+        if style_id is None:
+            continue
+        if style_id in target_styles:
+            cell._style = copy(target_styles[style_id])
+        else:
+            font, border, fill, number_format, protection, alignment = snapshot[
+                "styles"
+            ][style_id]
+            cell.font = copy(font)
+            cell.border = copy(border)
+            cell.fill = copy(fill)
+            cell.number_format = number_format
+            cell.protection = copy(protection)
+            cell.alignment = copy(alignment)
+            target_styles[style_id] = copy(cell._style)
+
+    for sqref, rules in snapshot["conditional_formatting"]:
+        for rule in rules:
+            target_sheet.conditional_formatting.add(sqref, copy(rule))
+
+    for idx, (height, hidden, outline_level) in snapshot["row_dimensions"].items():
+        row_dim = target_sheet.row_dimensions[idx]
+        row_dim.ht = height
+        row_dim.hidden = hidden
+        row_dim.outlineLevel = outline_level
+    for letter, (width, hidden, outline_level) in snapshot[
+        "column_dimensions"
+    ].items():
+        col_dim = target_sheet.column_dimensions[letter]
+        col_dim.width = width
+        col_dim.hidden = hidden
+        col_dim.outlineLevel = outline_level
+
+    attributes = snapshot["attributes"]
+    target_sheet.sheet_format = copy(attributes["sheet_format"])
+    target_sheet.sheet_properties = copy(attributes["sheet_properties"])
+    target_sheet.page_margins = copy(attributes["page_margins"])
+    target_sheet.page_setup = copy(attributes["page_setup"])
+    target_sheet.page_setup._parent = target_sheet
+    target_sheet.print_options = copy(attributes["print_options"])
+    target_sheet.auto_filter = copy(attributes["auto_filter"])
+    target_sheet.print_area = attributes["print_area"]
+    target_sheet.freeze_panes = attributes["freeze_panes"]
+    target_sheet.protection = copy(attributes["protection"])
+    target_sheet.sheet_state = attributes["sheet_state"]
+
+    return target_sheet
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+import re
+
+from tools.cell_text import get_sheet_text
+from tools.file_server import get_cache_dir
+
+# Bump when the analysis changes, so that schemas stored by older versions are redone
+SCHEMA_VERSION = 1
+
+SUBTOTAL_RE = re.compile(r"\bsub[\s-]?total\b", re.I)
+GRAND_TOTAL_RE = re.compile(r"\bgrand[\s-]?total\b", re.I)
+
+
+def get_schema_dir():
+    """
+    Return the folder where template schemas are stored.
+
+    Returns:
+        str: The path of the schema folder (see ``get_cache_dir``).
+    """
+    return get_cache_dir("template_schemas")
+
+
+def get_template_fingerprint(file):
+    """
+    Return the fingerprint of a template file, a hash of its content.
+
+    Args:
+        file: A file-like object of the template.
+
+    Returns:
+        str: The SHA-256 hex digest of the file.
+    """
+    if hasattr(file, "getvalue"):
+        return hashlib.sha256(file.getvalue()).hexdigest()
+    file.seek(0)
+    digest = hashlib.sha256(file.read()).hexdigest()
+    file.seek(0)
+    return digest
+
+
+def analyze_template_sheet(sheet):
+    """
+    Describe the structure of a template sheet.
+
+    Args:
+        sheet (openpyxl.Worksheet): The template sheet.
+
+    Returns:
+        dict: The schema of the sheet with the keys:
+            max_row, max_column: The size of the sheet.
+            header_rows: The rows holding at least one bold cell.
+            subtotal_rows, grand_total_rows: The rows labelled as (grand) totals.
+            column_text: A dictionary mapping column indexes to the plain text of
+                their non-empty cells, as read by ``get_sheet_text``.
+    """
+    header_rows = sorted(
+        {
+            row
+            for (row, _), cell in sheet._cells.items()
+            if cell.has_style and cell.font.bold
+        }
+    )
+
+    column_text = get_sheet_text(sheet)
+    subtotal_rows = set()
+    grand_total_rows = set()
+    for cells in column_text.values():
+        for row, text in cells:
+            if GRAND_TOTAL_RE.search(text):
+                grand_total_rows.add(row)
+            elif SUBTOTAL_RE.search(text):
+                subtotal_rows.add(row)
+
+    return {
+        "max_row": sheet.max_row,
+        "max_column": sheet.max_column,
+        "header_rows": header_rows,
+        "subtotal_rows": sorted(subtotal_rows),
+        "grand_total_rows": sorted(grand_total_rows),
+        "column_text": {
+            col: [text for _, text in cells] for col, cells in column_text.items()
+        },
+    }
+
+
+def load_template_schema(fingerprint):
+    """
+    Read the stored schemas of a template.
+
+    Args:
+        fingerprint (str): The fingerprint of the template (see ``get_template_fingerprint``).
+
+    Returns:
+        dict: A dictionary mapping sheet names to their schema, empty if the template
+            was never analyzed or was analyzed by an older version.
+    """
+    path = os.path.join(get_schema_dir(), f"{fingerprint}.json")
+    try:
+        with open(path, encoding="utf-8") as file:
+            stored = json.load(file)
+    except (OSError, ValueError):
+        return {}
+    if stored.get("version") != SCHEMA_VERSION:
+        return {}
+    sheets = stored.get("sheets", {})
+    # JSON object keys are strings, restore the column indexes
+    for schema in sheets.values():
+        schema["column_text"] = {
+            int(col): texts for col, texts in schema["column_text"].items()
+        }
+    return sheets
+
+
+def save_template_schema(fingerprint, sheets):
+    """
+    Store the schemas of a template, replacing the stored ones.
+
+    Args:
+        fingerprint (str): The fingerprint of the template.
+        sheets (dict): A dictionary mapping sheet names to their schema.
+    """
+    path = os.path.join(get_schema_dir(), f"{fingerprint}.json")
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump({"version": SCHEMA_VERSION, "sheets": sheets}, file)
+        os.replace(temp_path, path)
+    except OSError as e:
+        print(f"Could not store the template schema: {e}")
+
+
+def get_template_schemas(template_file, template_sheets):
+    """
+    Return the schema of each template sheet, analyzing only the sheets of templates
+    that were not seen before.
+
+    Args:
+        template_file: The template file the sheets were loaded from.
+        template_sheets (list): The template sheets.
+
+    Returns:
+        dict: A dictionary mapping the sheet names to their schema.
+    """
+    fingerprint = get_template_fingerprint(template_file)
+    stored = load_template_schema(fingerprint)
+    missing = [sheet for sheet in template_sheets if sheet.title not in stored]
+    if missing:
+        for sheet in missing:
+            print(f"Analyzing template sheet: {sheet.title}")
+            stored[sheet.title] = analyze_template_sheet(sheet)
+        save_template_schema(fingerprint, stored)
+    return {sheet.title: stored[sheet.title] for sheet in template_sheets}
@@ -0,0 +1,185 @@
+import hashlib
+import os
+import re
+
+# Size of the chunks read when hashing a file
+HASH_CHUNK_SIZE = 1024 * 1024
+# Words of response file names that are not part of the supplier name
+NAME_NOISE_RE = re.compile(
+    r"\b(rfp|rfq|rfi|response|responses|reply|answer|answers|pricing|price|prices|"
+    r"questionnaire|questions|combined|final|draft|round|bafo|copy|v\d+|r\d+|\d+)\b",
+    re.I,
+)
+
+
+def get_watch_root():
+    """
+    Return the folder that watch folders must be inside.
+
+    The folder is set with the ``RFPDOCSUM_WATCH_ROOT`` environment variable, so that
+    the browser cannot make the server scan any of its folders.
+
+    Returns:
+        str: The real path of the root folder, or None if watch folders are disabled.
+    """
+    root = os.environ.get("RFPDOCSUM_WATCH_ROOT")
+    return os.path.realpath(root) if root else None
+
+
+def resolve_watch_folder(folder, root=None):
+    """
+    Check that a watch folder is a folder inside the watch root.
+
+    Args:
+        folder (str): The folder, absolute or relative to the root.
+        root (str): The root folder, ``get_watch_root()`` by default.
+
+    Returns:
+        str: The real path of the folder, or None if it is empty, outside the root,
+            not a folder, or if watch folders are disabled.
+    """
+    root = root or get_watch_root()
+    if not folder or not root:
+        return None
+    path = os.path.realpath(os.path.join(root, folder))
+    if os.path.commonpath([root, path]) != root or not os.path.isdir(path):
+        return None
+    return path
+
+
+def hash_file(path, chunk_size=HASH_CHUNK_SIZE):
+    """
+    Return the SHA-256 hex digest of a file, reading it in chunks.
+
+    Args:
+        path (str): The path of the file.
+        chunk_size (int): The number of bytes read at a time.
+
+    Returns:
+        str: The hex digest of the file content.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def is_response_file(file_name):
+    """
+    Check whether a file of the watch folder is a supplier response.
+
+    Excel lock files (``~$...``) and templates are skipped.
+
+    Args:
+        file_name (str): The file name.
+
+    Returns:
+        bool: True if the file should be consolidated.
+    """
+    return (
+        file_name.lower().endswith(".xlsx")
+        and not file_name.startswith("~$")
+        and "template" not in file_name.lower()
+    )
+
+
+def scan_watch_folder(folder, previous=None):
+    """
+    List the response files of a folder with the hash of their content.
+
+    Files whose size and modification time did not change since the previous scan keep
+    their hash, so unchanged files are not read again. Symbolic links are skipped, so
+    that only files inside the folder are read.
+
+    Args:
+        folder (str): The folder to scan.
+        previous (dict): The result of the previous scan, or None.
+
+    Returns:
+        dict: A dictionary mapping the file paths to dictionaries with the keys hash,
+            size and mtime.
+    """
+    previous = previous or {}
+    files = {}
+    for entry in os.scandir(folder):
+        if not entry.is_file(follow_symlinks=False) or not is_response_file(entry.name):
+            continue
+        try:
+            stat = entry.stat()
+            known = previous.get(entry.path)
+            if known and (known["size"], known["mtime"]) == (stat.st_size, stat.st_mtime):
+                files[entry.path] = known
+            else:
+                files[entry.path] = {
+                    "hash": hash_file(entry.path),
+                    "size": stat.st_size,
+                    "mtime": stat.st_mtime,
+                }
+        except OSError as e:
+            # The file may still be copied or have been removed in the meantime
+            print(f"Could not read {entry.path}: {e}")
+    return files
+
+
+def get_changed_files(previous, current):
+    """
+    Compare two scans of the watch folder.
+
+    Args:
+        previous (dict): The previous result of ``scan_watch_folder``.
+        current (dict): The current result of ``scan_watch_folder``.
+
+    Returns:
+        list: The paths of the files that are new or whose content changed.
+    """
+    return [
+        path
+        for path, info in current.items()
+        if previous.get(path, {}).get("hash") != info["hash"]
+    ]
+
+
+def infer_supplier_name(file_name, known_names=()):
+    """
+    Guess the supplier name from the name of a response file.
+
+    A known supplier whose name appears in the file name is preferred, otherwise the
+    file name without the usual RFP words, numbers and separators is used.
+
+    Args:
+        file_name (str): The file name, e.g. "Acme_RFP_Pricing_v2.xlsx".
+        known_names (list): The names of the suppliers already configured.
+
+    Returns:
+        str: The supplier name, e.g. "Acme".
+    """
+    stem = os.path.splitext(os.path.basename(file_name))[0]
+    words = re.sub(r"[_\-.()\[\]]+", " ", stem)
+    lowered = f" {words.lower()} "
+    # Try the longest names first, so that "Acme Corp" is not taken for "Acme"
+    for name in sorted((name for name in known_names if name), key=len, reverse=True):
+        if f" {name.lower()} " in lowered:
+            return name
+    name = " ".join(NAME_NOISE_RE.sub(" ", words).split())
+    return name or stem
+
+
+def infer_doc_type(file_name, doc_types=("Pricing", "Questionnaire")):
+    """
+    Guess the document type of a response file from its name.
+
+    Args:
+        file_name (str): The file name.
+        doc_types (tuple): The pricing and questionnaire document types.
+
+    Returns:
+        str: The document type, or None if the file name does not tell (combined file).
+    """
+    lowered = os.path.basename(file_name).lower()
+    if "pric" in lowered:
+        return doc_types[0]
+    if "question" in lowered:
+        return doc_types[1]
+    return None
+
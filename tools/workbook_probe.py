@@ -0,0 +1,448 @@
+import hashlib
+import posixpath
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+
+from fuzzywuzzy import fuzz
+from openpyxl.utils.cell import range_boundaries
+
+MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+DIMENSION_RE = re.compile(rb"<(?:\w+:)?dimension\s+ref=\"([^\"]+)\"")
+SHEET_DATA_RE = re.compile(rb"<(?:\w+:)?sheetData[\s/>]")
+SHARED_STRINGS_PATH = "xl/sharedStrings.xml"
+# Number of rows at the top of each sheet whose text is fingerprinted
+HEADER_SCAN_ROWS = 10
+# Weights of the name, header and dimension similarities in the score of a sheet pair
+SHEET_NAME_WEIGHT = 0.5
+SHEET_HEADER_WEIGHT = 0.35
+SHEET_DIMENSION_WEIGHT = 0.15
+# Minimum score for a supplier sheet to be mapped to a template sheet
+MIN_SHEET_SCORE = 0.5
+
+
+def read_sheet_dimension(archive, sheet_path, chunk_size=4096, max_bytes=65536):
+    """
+    Read the ``<dimension>`` reference of a worksheet without parsing its cells.
+
+    The dimension element is written before the cell data, so only the head of the
+    sheet XML is read.
+
+    Args:
+        archive (zipfile.ZipFile): The opened xlsx archive.
+        sheet_path (str): The path of the worksheet XML inside the archive.
+        chunk_size (int): The number of bytes read at a time.
+        max_bytes (int): The maximum number of bytes read before giving up.
+
+    Returns:
+        str: The dimension reference (e.g. 'A1:D30'), or None if not found.
+    """
+    head = b""
+    with archive.open(sheet_path) as sheet_xml:
+        while len(head) < max_bytes:
+            chunk = sheet_xml.read(chunk_size)
+            if not chunk:
+                break
+            head += chunk
+            match = DIMENSION_RE.search(head)
+            if match:
+                return match.group(1).decode()
+            if SHEET_DATA_RE.search(head):
+                break
+    return None
+
+
+def read_sheet_head(archive, sheet_path, max_rows=HEADER_SCAN_ROWS):
+    """
+    Read the text cells of the first rows of a worksheet.
+
+    The sheet XML is parsed as a stream and the parsing stops after ``max_rows`` rows,
+    so the rest of the cell data is never read.
+
+    Args:
+        archive (zipfile.ZipFile): The opened xlsx archive.
+        sheet_path (str): The path of the worksheet XML inside the archive.
+        max_rows (int): The number of rows to read.
+
+    Returns:
+        list: The text cells of each row read, as lists of strings or shared string
+            indexes (int).
+    """
+    rows = []
+    cells = []
+    with archive.open(sheet_path) as sheet_xml:
+        for _, element in ET.iterparse(sheet_xml):
+            tag = element.tag.rsplit("}", 1)[-1]
+            if tag == "c":
+                cell_type = element.get("t")
+                value = element.find(f"{{{MAIN_NS}}}v")
+                if cell_type == "s" and value is not None and value.text:
+                    cells.append(int(value.text))
+                elif cell_type == "str" and value is not None and value.text:
+                    cells.append(value.text)
+                elif cell_type == "inlineStr":
+                    cells.append(
+                        "".join(
+                            text.text or ""
+                            for text in element.iter(f"{{{MAIN_NS}}}t")
+                        )
+                    )
+                element.clear()
+            elif tag == "row":
+                rows.append(cells)
+                cells = []
+                element.clear()
+                if len(rows) >= max_rows:
+                    break
+            elif tag == "sheetData":
+                break
+    return rows
+
+
+def read_shared_strings(archive, indexes):
+    """
+    Read some entries of the shared strings table of an xlsx archive.
+
+    The table is parsed as a stream up to the largest index needed.
+
+    Args:
+        archive (zipfile.ZipFile): The opened xlsx archive.
+        indexes (set): The indexes of the shared strings to read.
+
+    Returns:
+        dict: A dictionary mapping the indexes to their text.
+    """
+    strings = {}
+    if not indexes or SHARED_STRINGS_PATH not in archive.namelist():
+        return strings
+    last = max(indexes)
+    position = 0
+    with archive.open(SHARED_STRINGS_PATH) as strings_xml:
+        for _, element in ET.iterparse(strings_xml):
+            if element.tag != f"{{{MAIN_NS}}}si":
+                continue
+            if position in indexes:
+                # Phonetic runs are not part of the text
+                strings[position] = "".join(
+                    text.text or ""
+                    for child in element
+                    if child.tag != f"{{{MAIN_NS}}}rPh"
+                    for text in child.iter(f"{{{MAIN_NS}}}t")
+                )
+            element.clear()
+            position += 1
+            if position > last:
+                break
+    return strings
+
+
+def hash_header_rows(rows):
+    """
+    Fingerprint the text rows at the top of a sheet.
+
+    Args:
+        rows (list): The text cells of each row (see ``read_sheet_head``).
+
+    Returns:
+        list: A short hash of each row holding some text, in row order.
+    """
+    hashes = []
+    for cells in rows:
+        texts = [" ".join(text.lower().split()) for text in cells]
+        texts = [text for text in texts if text]
+        if texts:
+            digest = hashlib.sha1("\x1f".join(texts).encode("utf-8"))
+            hashes.append(digest.hexdigest()[:16])
+    return hashes
+
+
+def get_sheet_paths(archive):
+    """
+    List the sheets of an opened xlsx archive with their state and XML path.
+
+    Args:
+        archive (zipfile.ZipFile): The opened xlsx archive.
+
+    Returns:
+        list: A list of (name, state, path) tuples in workbook order. The path is None
+            if the sheet XML cannot be found.
+    """
+    workbook_xml = ET.fromstring(archive.read("xl/workbook.xml"))
+    rels_xml = ET.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+    targets = {}
+    for rel in rels_xml.iter(f"{{{PKG_REL_NS}}}Relationship"):
+        target = rel.get("Target")
+        if target.startswith("/"):
+            target = target[1:]
+        else:
+            target = posixpath.normpath(posixpath.join("xl", target))
+        targets[rel.get("Id")] = target
+
+    names = set(archive.namelist())
+    sheets = []
+    for sheet in workbook_xml.iter(f"{{{MAIN_NS}}}sheet"):
+        sheet_path = targets.get(sheet.get(f"{{{REL_NS}}}id"))
+        sheets.append(
+            (
+                sheet.get("name"),
+                sheet.get("state", "visible"),
+                sheet_path if sheet_path in names else None,
+            )
+        )
+    return sheets
+
+
+def probe_workbook(file):
+    """
+    List the sheets of an xlsx file with their state and dimensions.
+
+    Only ``xl/workbook.xml``, its relationships and the head of each worksheet XML are
+    read, no cell data is parsed.
+
+    Args:
+        file: A path or file-like object of the xlsx file.
+
+    Returns:
+        list: A list of dictionaries, one per sheet in workbook order, with the keys
+            name, state ('visible', 'hidden' or 'veryHidden'), dimension, max_row,
+            max_column and header (the hashes of the text rows at the top of the
+            sheet, see ``hash_header_rows``).
+    """
+    if hasattr(file, "seek"):
+        file.seek(0)
+    sheets = []
+    with zipfile.ZipFile(file) as archive:
+        heads = []
+        for name, state, sheet_path in get_sheet_paths(archive):
+            dimension = None
+            head = []
+            if sheet_path:
+                dimension = read_sheet_dimension(archive, sheet_path)
+                head = read_sheet_head(archive, sheet_path)
+            heads.append(head)
+            max_row, max_column = None, None
+            if dimension:
+                try:
+                    _, _, max_column, max_row = range_boundaries(dimension)
+                except ValueError:
+                    pass
+            sheets.append(
+                {
+                    "name": name,
+                    "state": state,
+                    "dimension": dimension,
+                    "max_row": max_row,
+                    "max_column": max_column,
+                }
+            )
+        # The shared strings of all the sheet heads are read in one pass
+        strings = read_shared_strings(
+            archive,
+            {
+                cell
+                for head in heads
+                for cells in head
+                for cell in cells
+                if isinstance(cell, int)
+            },
+        )
+        for sheet, head in zip(sheets, heads):
+            sheet["header"] = hash_header_rows(
+                [
+                    [
+                        strings.get(cell, "") if isinstance(cell, int) else cell
+                        for cell in cells
+                    ]
+                    for cells in head
+                ]
+            )
+    if hasattr(file, "seek"):
+        file.seek(0)
+    return sheets
+
+
+def get_sheet_name_key(name):
+    """
+    Normalize a sheet name for comparison.
+
+    Args:
+        name (str): The sheet name.
+
+    Returns:
+        str: The lowercase name with single spaces.
+    """
+    return " ".join(name.lower().split())
+
+
+def score_sheet_pair(template_sheet, supplier_sheet):
+    """
+    Score how likely a supplier sheet is the answer to a template sheet.
+
+    The score combines the similarity of the names, the share of the header row hashes
+    they have in common and the ratio of their dimensions. A signal that is unknown for
+    either sheet (no text rows, no dimension) is left out and the weights of the others
+    are scaled up.
+
+    Args:
+        template_sheet (dict): The probed template sheet (see ``probe_workbook``).
+        supplier_sheet (dict): The probed supplier sheet.
+
+    Returns:
+        float: The score, from 0 to 1.
+    """
+    scores = [
+        (
+            SHEET_NAME_WEIGHT,
+            fuzz.ratio(
+                get_sheet_name_key(template_sheet["name"]),
+                get_sheet_name_key(supplier_sheet["name"]),
+            )
+            / 100,
+        )
+    ]
+    template_header = set(template_sheet.get("header") or [])
+    supplier_header = set(supplier_sheet.get("header") or [])
+    if template_header and supplier_header:
+        scores.append(
+            (
+                SHEET_HEADER_WEIGHT,
+                len(template_header & supplier_header)
+                / len(template_header | supplier_header),
+            )
+        )
+    dimensions = [
+        (template_sheet.get(key), supplier_sheet.get(key))
+        for key in ("max_row", "max_column")
+    ]
+    if all(all(sizes) for sizes in dimensions):
+        scores.append(
+            (
+                SHEET_DIMENSION_WEIGHT,
+                sum(min(sizes) / max(sizes) for sizes in dimensions) / 2,
+            )
+        )
+    return sum(weight * score for weight, score in scores) / sum(
+        weight for weight, _ in scores
+    )
+
+
+def map_supplier_sheets(template_probe, supplier_probe, sheet_names):
+    """
+    Pick the supplier sheet answering each selected template sheet.
+
+    Only the visible supplier sheets are candidates. Sheets with the same name (ignoring
+    case and spaces) are paired first, then the remaining sheets are paired by best
+    score (see ``score_sheet_pair``), each supplier sheet being used once. The position
+    of the sheets only breaks ties, so hidden, extra and reordered tabs do not change
+    the mapping. Template sheets still without a match, e.g. renamed tabs with new
+    headers, take the visible supplier sheets left over, in order.
+
+    Args:
+        template_probe (list): The result of ``probe_workbook`` for the template.
+        supplier_probe (list): The result of ``probe_workbook`` for the supplier file.
+        sheet_names (list): The template sheet names selected for consolidation.
+
+    Returns:
+        tuple: A dictionary mapping the selected template sheet names to the name of
+            their supplier sheet, or None if no supplier sheet is left, and the list of
+            the template sheet names paired by position only.
+    """
+    template_sheets = {sheet["name"]: sheet for sheet in template_probe}
+    template_positions = {
+        sheet["name"]: idx
+        for idx, sheet in enumerate(
+            sheet for sheet in template_probe if sheet["state"] == "visible"
+        )
+    }
+    candidates = [sheet for sheet in supplier_probe if sheet["state"] == "visible"]
+    mapping = dict.fromkeys(sheet_names)
+    used = set()
+    by_name = {}
+    for idx, sheet in enumerate(candidates):
+        by_name.setdefault(get_sheet_name_key(sheet["name"]), idx)
+    for name in sheet_names:
+        idx = by_name.get(get_sheet_name_key(name))
+        if idx is not None and idx not in used:
+            mapping[name] = candidates[idx]["name"]
+            used.add(idx)
+
+    pairs = []
+    for name in sheet_names:
+        if mapping[name] is not None:
+            continue
+        position = template_positions.get(name, len(candidates))
+        for idx, sheet in enumerate(candidates):
+            if idx not in used:
+                score = score_sheet_pair(template_sheets[name], sheet)
+                if score >= MIN_SHEET_SCORE:
+                    pairs.append((-score, abs(idx - position), name, idx))
+    for _, _, name, idx in sorted(pairs):
+        if mapping[name] is None and idx not in used:
+            mapping[name] = candidates[idx]["name"]
+            used.add(idx)
+
+    # Pair the rest by position among the sheets left, as before the scoring
+    unmatched = [
+        name
+        for name in sorted(
+            sheet_names, key=lambda name: template_positions.get(name, len(candidates))
+        )
+        if mapping[name] is None
+    ]
+    left = [idx for idx in range(len(candidates)) if idx not in used]
+    by_position = []
+    for name, idx in zip(unmatched, left):
+        mapping[name] = candidates[idx]["name"]
+        by_position.append(name)
+    return mapping, by_position
+
+
+def check_supplier_sheets(template_probe, supplier_probe, sheet_names):
+    """
+    Compare the sheets of a supplier file with the selected template sheets.
+
+    Args:
+        template_probe (list): The result of ``probe_workbook`` for the template.
+        supplier_probe (list): The result of ``probe_workbook`` for the supplier file.
+        sheet_names (list): The template sheet names selected for consolidation.
+
+    Returns:
+        dict: A dictionary with the keys:
+            missing: Selected template sheets that are not in the supplier file.
+            hidden: Selected template sheets that are hidden in the supplier file.
+            extra: Visible supplier sheets that are not in the template.
+            misaligned: (template sheet, supplier sheet or None) pairs where the
+                mapping (see ``map_supplier_sheets``) picks a differently named sheet
+                or no sheet at all.
+            by_position: Selected template sheets matched by position only.
+    """
+    template_names = [sheet["name"] for sheet in template_probe]
+    supplier_states = {sheet["name"]: sheet["state"] for sheet in supplier_probe}
+    supplier_visible = [
+        sheet["name"] for sheet in supplier_probe if sheet["state"] == "visible"
+    ]
+
+    missing = [name for name in sheet_names if name not in supplier_states]
+    hidden = [
+        name
+        for name in sheet_names
+        if supplier_states.get(name, "visible") != "visible"
+    ]
+    extra = [name for name in supplier_visible if name not in template_names]
+    mapping, by_position = map_supplier_sheets(
+        template_probe, supplier_probe, sheet_names
+    )
+    misaligned = [
+        (name, mapped) for name, mapped in mapping.items() if mapped != name
+    ]
+
+    return {
+        "missing": missing,
+        "hidden": hidden,
+        "extra": extra,
+        "misaligned": misaligned,
+        "by_position": by_position,
+    }
@@ -0,0 +1,203 @@
+import hashlib
+import io
+
+import streamlit as st
+from openpyxl import load_workbook
+
+from tools.column_filter import filter_workbook
+from tools.workbook_probe import probe_workbook
+
+# Column-filtered workbooks kept per file, one per document type of a single file event
+FILTERED_WORKBOOKS_PER_FILE = 2
+
+
+def get_file_key(uploaded_file):
+    """
+    Return a key identifying the content of an uploaded workbook.
+
+    Streamlit uploads carry a ``file_id`` that stays the same across reruns, so it is
+    used when available. Other file-like objects are identified by a hash of their bytes.
+
+    Args:
+        uploaded_file: The uploaded file (or any file-like object with ``getvalue``/``read``).
+
+    Returns:
+        str: The key of the file.
+    """
+    file_id = getattr(uploaded_file, "file_id", None)
+    if file_id:
+        return str(file_id)
+    if hasattr(uploaded_file, "getvalue"):
+        data = uploaded_file.getvalue()
+    else:
+        uploaded_file.seek(0)
+        data = uploaded_file.read()
+        uploaded_file.seek(0)
+    return hashlib.sha256(data).hexdigest()
+
+
+def get_content_hash(uploaded_file):
+    """
+    Return the SHA-256 hex digest of the content of an upload, hashing it only once.
+
+    Args:
+        uploaded_file: The uploaded file.
+
+    Returns:
+        str: The hex digest of the file content.
+    """
+    content_hash = getattr(uploaded_file, "content_hash", None)
+    if content_hash:
+        # Spooled event files are hashed when spooled
+        return content_hash
+    registry = get_workbook_registry()
+    key = (get_file_key(uploaded_file), "hash")
+    if key not in registry:
+        if hasattr(uploaded_file, "getvalue"):
+            data = uploaded_file.getvalue()
+        else:
+            uploaded_file.seek(0)
+            data = uploaded_file.read()
+            uploaded_file.seek(0)
+        registry[key] = hashlib.sha256(data).hexdigest()
+    return registry[key]
+
+
+def get_workbook_registry():
+    """
+    Return the per-session workbook registry, creating it if needed.
+
+    The registry maps ``(file_key, rich_text, data_only)`` to the parsed workbook, so
+    that an upload used for both Pricing and Questionnaire (single file events) is
+    parsed once. Sheet metadata probes are stored under ``(file_key, "probe")``, content
+    hashes under ``(file_key, "hash")`` and the column-filtered workbooks under
+    ``(file_key, "filtered", sheet names)``. Read-only workbooks are not kept.
+
+    Returns:
+        dict: The workbook registry.
+    """
+    if "workbook_registry" not in st.session_state:
+        st.session_state.workbook_registry = {}
+    return st.session_state.workbook_registry
+
+
+def get_workbook(uploaded_file, rich_text=True, data_only=True, read_only=False):
+    """
+    Load a workbook through the registry, parsing each distinct upload only once.
+
+    Read-only workbooks are only used to match the columns, so they are loaded from a
+    copy of the file each time instead of being kept with their copy in the session.
+
+    Args:
+        uploaded_file: The uploaded file to load.
+        rich_text (bool): Whether to keep the rich text formatting of the cells.
+        data_only (bool): Whether to read the cached values instead of the formulas.
+        read_only (bool): Whether to open the workbook in read-only mode, reading the
+            cell values lazily and skipping styles.
+
+    Returns:
+        openpyxl.Workbook: The parsed workbook.
+    """
+    if read_only:
+        uploaded_file.seek(0)
+        # Read-only sheets read the file lazily, give them their own copy
+        source = io.BytesIO(uploaded_file.read())
+        uploaded_file.seek(0)
+        return load_workbook(
+            source, rich_text=rich_text, data_only=data_only, read_only=True
+        )
+    registry = get_workbook_registry()
+    key = (get_file_key(uploaded_file), rich_text, data_only)
+    if key not in registry:
+        uploaded_file.seek(0)
+        registry[key] = load_workbook(
+            uploaded_file, rich_text=rich_text, data_only=data_only
+        )
+        uploaded_file.seek(0)
+    return registry[key]
+
+
+def get_filtered_workbook(uploaded_file, keep_sheets, rich_text=True, data_only=True):
+    """
+    Load only some sheets and columns of a workbook through the registry.
+
+    The other sheets are kept but empty (see ``filter_workbook``). The kept sheets keep
+    their number of rows, so that columns are copied over the same rows as from the
+    full workbook. One workbook is kept per set of sheets, so the Pricing and
+    Questionnaire sheets of a single file event do not replace each other, and at most
+    ``FILTERED_WORKBOOKS_PER_FILE`` per file, the least recently used being dropped.
+
+    Args:
+        uploaded_file: The uploaded file to load.
+        keep_sheets (dict): A dictionary mapping sheet names to the set of column
+            letters to load, or None to load all the columns of the sheet.
+        rich_text (bool): Whether to keep the rich text formatting of the cells.
+        data_only (bool): Whether to read the cached values instead of the formulas.
+
+    Returns:
+        openpyxl.Workbook: The parsed workbook.
+    """
+    registry = get_workbook_registry()
+    columns = tuple(
+        sorted(
+            (name, None if letters is None else tuple(sorted(letters)))
+            for name, letters in keep_sheets.items()
+        )
+    )
+    file_key = get_file_key(uploaded_file)
+    key = (file_key, "filtered", frozenset(keep_sheets))
+    selection = (rich_text, data_only, columns)
+    # Drop the entry to add it back last, most recently used
+    cached = registry.pop(key, None)
+    if cached is None or cached[0] != selection:
+        # Make room for the new selection, dropping the least recently used first
+        filtered_keys = [
+            other
+            for other in registry
+            if other[0] == file_key and other[1:2] == ("filtered",)
+        ]
+        while len(filtered_keys) >= FILTERED_WORKBOOKS_PER_FILE:
+            del registry[filtered_keys.pop(0)]
+        filtered, max_rows = filter_workbook(uploaded_file, keep_sheets)
+        workbook = load_workbook(filtered, rich_text=rich_text, data_only=data_only)
+        for name, max_row in max_rows.items():
+            sheet = workbook[name]
+            if max_row > sheet.max_row:
+                sheet.cell(row=max_row, column=1)
+        cached = (selection, workbook)
+    registry[key] = cached
+    return cached[1]
+
+
+def get_workbook_probe(uploaded_file):
+    """
+    Return the sheet metadata of an upload (see ``probe_workbook``), probing it once.
+
+    Args:
+        uploaded_file: The uploaded file to probe.
+
+    Returns:
+        list: The sheets of the workbook with their state and dimensions.
+    """
+    registry = get_workbook_registry()
+    key = (get_file_key(uploaded_file), "probe")
+    if key not in registry:
+        # Spooled event files are probed when spooled
+        probe = getattr(uploaded_file, "probe", None)
+        registry[key] = probe if probe is not None else probe_workbook(uploaded_file)
+    return registry[key]
+
+
+def prune_workbook_registry(active_files):
+    """
+    Drop the registry entries of files that are no longer part of the event.
+
+    Args:
+        active_files (list): The uploaded files currently configured for the event.
+            ``None`` entries are ignored.
+    """
+    registry = get_workbook_registry()
+    active_keys = {get_file_key(f) for f in active_files if f is not None}
+    for key in list(registry):
+        if key[0] not in active_keys:
+            del registry[key]